@@ -1,23 +1,47 @@
 #!/usr/bin/env python
 from pymodbus.client.sync import ModbusSerialClient
+from pymodbus.exceptions import ModbusIOException, ConnectionException
 import math
+import threading
 import time
 import serial.tools.list_ports
-import logging
 from hardwareCSV import *
+from myCSV import read_setting
+from units import UnitConverter, turn_arc
+from kinematics import FourDriveBase
+from alarms import describe_alarm
+from breaker import BreakerBoard, DriveQuarantined
+from retry import RetryPolicy, RetryStats, IDEMPOTENT, COMMAND
+from async_log import get_logger
 import keyboard
 
-logging.basicConfig()
-log = logging.getLogger()
-log.setLevel(logging.INFO)
+log = get_logger("pymodbus_drive")
 
 
 # --------------------------
 # Configuration and Constants
 # --------------------------
 
-BAUDRATE = 38400
-TIMEOUT = 1
+BAUDRATE = int(read_setting('BAUDRATE', 'Hardware.csv'))  # baud_upgrade.py --write updates it
+BITS_PER_CHAR = 11  # RTU character: start + 8 data + parity + stop
+DRIVE_TURNAROUND = 0.01  # seconds a drive may take before it starts answering
+TIMEOUT_REGISTERS = 32  # largest register block the timeout has to cover
+
+
+def responseTimeout(baudrate, registers=TIMEOUT_REGISTERS):
+    """
+    Longest a healthy drive can take to answer: largest request and reply on the line (each with
+    the 3.5 character gap) plus the drive turnaround. Replaces the fixed one-second timeout.
+    """
+    chars = (9 + 2 * registers + 3.5) + (5 + 2 * registers + 3.5)
+    return chars * BITS_PER_CHAR / baudrate + DRIVE_TURNAROUND
+
+
+TIMEOUT = responseTimeout(BAUDRATE)
+RECONNECT_TIMEOUT = 120  # seconds to wait for a lost USB adapter to come back
+RECONNECT_POLL = 1.0  # seconds between discovery attempts
+IO_FRESHNESS = 0.005  # seconds an input word read by readInputs() is reused
+BROADCAST_TRIGGER = True  # start grouped moves with one slave-0 frame when every drive on the bus takes part
 
 # Define your register addresses (same as before)
 # Register addresses
@@ -69,7 +93,7 @@ def list_serial_ports():
     ports = serial.tools.list_ports.comports()
     return [port.device for port in ports]
 
-def ping_modbus_on_port(port, baudrate=38400, timeout=1):
+def ping_modbus_on_port(port, baudrate=BAUDRATE, timeout=TIMEOUT):
     client = ModbusSerialClient(method='rtu', port=port, baudrate=baudrate, timeout=timeout)
     if client.connect():
         try:
@@ -78,7 +102,7 @@ def ping_modbus_on_port(port, baudrate=38400, timeout=1):
             if not response.isError():
                 return True
         except Exception as e:
-            print(f"Error on port {port}: {e}")
+            log.warning("Error on port %s: %s", port, e)
         finally:
             client.close()
     return False
@@ -88,7 +112,7 @@ def scanHardwarePort():
     global MODBUS_PORT
     ports = list_serial_ports()
     if not ports:
-        print("No serial ports found.")
+        log.error("No serial ports found.")
         return None
 
     MODBUS_PORT = None
@@ -99,10 +123,10 @@ def scanHardwarePort():
             break
 
     if not MODBUS_PORT:
-        print("No Modbus device responded on any port.")
+        log.error("No Modbus device responded on any port.")
         return None
 
-    client = ModbusSerialClient(method='rtu', port=MODBUS_PORT, baudrate=38400, timeout=1)
+    client = ModbusSerialClient(method='rtu', port=MODBUS_PORT, baudrate=BAUDRATE, timeout=TIMEOUT)
     try:
         if not client.connect():
             raise Exception("Unable to connect to the Modbus device!")
@@ -119,7 +143,7 @@ def scanHardwarePort():
         else:
             raise Exception("Verification data does not match expected value.")
     except Exception as e:
-        print("Error scanning hardware port:", e)
+        log.error("Error scanning hardware port: %s", e)
         MODBUS_PORT = None
         return None
     finally:
@@ -132,13 +156,175 @@ SERIAL_PORT = scanHardwarePort()  # Adjust to your serial port
 # Setup the pymodbus client
 # --------------------------
 if SERIAL_PORT != None:
-    client = ModbusSerialClient(method='rtu', port=SERIAL_PORT, baudrate=BAUDRATE, timeout=TIMEOUT)
+    client = ModbusSerialClient(method='rtu', port=SERIAL_PORT, baudrate=BAUDRATE, timeout=TIMEOUT,
+                                broadcast_enable=True)
     if not client.connect():
         raise Exception("Unable to connect to the Modbus device!")
 else:
-    print("Error connecting to Hardware")
+    log.error("Error connecting to Hardware")
     exit(0)
 
+# One request on the line at a time (the breaker re-probes from its own thread)
+busLock = threading.RLock()
+
+# --------------------------
+# Reconnect after a lost adapter
+# --------------------------
+PORT_ERRORS = (ConnectionException, serial.SerialException)
+COMMAND_REGISTERS = {PR_TRIG, REGISTER_CONTROL_WORD}  # commands are never retried, replayed or repeated
+# Configuration parameters replayed after a reconnect. State registers (encoder reset, PR
+# completion, outputs) and commands are left out: replaying them would act on the drive.
+SHADOW_REGISTERS = (set(range(0x6200, 0x6280))            # PR path table: targets, speeds, ramps
+                    | set(range(0x0145, 0x0155))          # DI function and filter (Pr4.xx)
+                    | {REGISTER_PULSE_PER_REV, REGISTER_CONTROL_MODE, REGISTER_MOTOR_DIRECTION,
+                       REGISTER_MOTOR_INDUCTANCE, REGISTER_MAX_POSITION_ERROR, REGISTER_JOG_VELOCITY,
+                       REGISTER_JOG_ACCELERATION, REGISTER_HOLDING_TORQUE,
+                       0x6000, 0x6006, 0x6007, 0x6008, 0x6009, 0x6016, 0x601A})  # PR control, soft limits, trigger mode
+shadowRegisters = {}  # device -> {register: value} of every SHADOW_REGISTERS write
+restoringShadow = False  # set while reconnectClient() replays the shadow; a port error then is not reconnected again
+outages = []  # one entry per lost port: start, duration_s, port, restored
+outageSeconds = 0.0
+
+
+def usbSerialNumber(port):
+    for info in serial.tools.list_ports.comports():
+        if info.device == port:
+            return info.serial_number
+    return None
+
+
+def findPort(serial_number):
+    for info in serial.tools.list_ports.comports():
+        if serial_number and info.serial_number == serial_number:
+            return info.device
+    return None
+
+
+portSerialNumber = usbSerialNumber(SERIAL_PORT)
+
+
+def reconnectClient(error=None, timeout=RECONNECT_TIMEOUT):
+    """
+    Waits for the adapter to re-enumerate (found by USB serial number, the COM name may change),
+    opens a new client on it and restores the shadow registers. Returns True once connected.
+    """
+    global client, SERIAL_PORT, outageSeconds, restoringShadow
+    log.warning("Serial port %s lost (%s), reconnecting...", SERIAL_PORT, error)
+    t0 = time.monotonic()
+    started = time.time()
+    with busLock:
+        while True:
+            try:
+                client.close()
+            except Exception:
+                pass
+            port = findPort(portSerialNumber) if portSerialNumber else SERIAL_PORT
+            if port is not None:
+                client = ModbusSerialClient(method='rtu', port=port, baudrate=BAUDRATE, timeout=TIMEOUT,
+                                            broadcast_enable=True)
+                if client.connect():
+                    SERIAL_PORT = port
+                    break
+            if time.monotonic() - t0 >= timeout:
+                log.error("Serial port did not come back within %s s.", timeout)
+                outages.append({"start": started, "duration_s": time.monotonic() - t0, "port": None, "restored": 0})
+                outageSeconds += time.monotonic() - t0
+                return False
+            time.sleep(RECONNECT_POLL)
+        restoringShadow = True
+        try:
+            restored = restoreShadow()
+        finally:
+            restoringShadow = False
+    outage = time.monotonic() - t0
+    outages.append({"start": started, "duration_s": outage, "port": SERIAL_PORT, "restored": restored})
+    outageSeconds += outage
+    log.warning("Reconnected on %s after %.1f s, %d registers restored.", SERIAL_PORT, outage, restored,
+                extra={"outage_s": outage, "restored": restored})
+    return True
+
+
+def restoreShadow():
+    restored = 0
+    for device_address, registers in shadowRegisters.items():
+        for register_address in sorted(registers):
+            if write_register(device_address, register_address, registers[register_address]):
+                restored += 1
+    return restored
+
+
+def busCall(request, repeat=True):
+    """
+    Runs request() (which uses the global client) under the bus lock. If the port is lost it is
+    reconnected and the request sent once more, unless repeat is False (commands). A port lost
+    while the shadow is being restored is left to the next request, not reconnected from inside.
+    """
+    with busLock:
+        try:
+            return request()
+        except PORT_ERRORS as e:
+            if restoringShadow or not reconnectClient(e) or not repeat:
+                raise
+            return request()
+
+
+def probeDrive(device_address):
+    """
+    One status read that bypasses the breaker; True if the drive answered.
+    """
+    with busLock:
+        response = client.read_holding_registers(REGISTER_MOTION_STATUS, 1, unit=device_address)
+    return not response.isError()
+
+
+# Per-drive circuit breakers: after a few timeouts a drive fails fast until a probe succeeds
+breakers = BreakerBoard(probeDrive)
+
+
+def driveAvailable(device_address):
+    return breakers.available(device_address)
+
+
+def checkResponse(device_address, response):
+    """
+    Feeds one response into the drive's breaker. pymodbus reports a timeout as ModbusIOException.
+    """
+    if response.isError():
+        breakers.failure(device_address, isinstance(response, ModbusIOException))
+        return False
+    breakers.success(device_address)
+    return True
+
+# --------------------------
+# Retries
+# --------------------------
+# PR path table, PPR and control mode are read back after every write
+CRITICAL_REGISTERS = set(range(0x6200, 0x6280)) | {REGISTER_PULSE_PER_REV, REGISTER_CONTROL_MODE}
+verifyWrites = True
+retryPolicy = RetryPolicy()
+retryStats = RetryStats()  # per drive, see retryStats.summary()
+
+
+def requestWithRetry(device_address, request, op_class=IDEMPOTENT):
+    """
+    Sends request() and retries idempotent requests on timeouts/CRC errors (ModbusIOException)
+    with jittered backoff. Exception replies and commands are not retried.
+    The caller feeds the final response to checkResponse(), so the breaker counts one failure
+    per failed request however many frames it took.
+    """
+    attempts = retryPolicy.attempts_for(op_class)
+    attempt = 0
+    while True:
+        attempt += 1
+        response = busCall(request, repeat=op_class != COMMAND)
+        if not isinstance(response, ModbusIOException) or attempt >= attempts:
+            break
+        if not breakers.available(device_address):
+            break
+        retryPolicy.sleep(attempt)
+    retryStats.record(device_address, attempt, not response.isError(), op_class)
+    return response
+
 # --------------------------
 # Helper Functions (read/write)
 # --------------------------
@@ -146,25 +332,99 @@ def read_register(device_address, register_address, count=1):
     """
     Read a register using pymodbus.
     """
-    response = client.read_holding_registers(register_address, count, unit=device_address)
-    if response.isError():
-        print(f"Error reading from register 0x{register_address:04X}: {response}")
+    try:
+        breakers.check(device_address)
+    except DriveQuarantined:
+        return None
+    try:
+        response = requestWithRetry(device_address,
+                                    lambda: client.read_holding_registers(register_address, count, unit=device_address))
+    except PORT_ERRORS as e:
+        log.error("Error reading from register 0x%04X: %s", register_address, e,
+                  extra={"motor": device_address, "reg": register_address})
+        return None
+    if not checkResponse(device_address, response):
+        log.error("Error reading from register 0x%04X: %s", register_address, response,
+                  extra={"motor": device_address, "reg": register_address})
         return None
     return response.registers[0] if count == 1 else response.registers
 
-def write_register(device_address, register_address, value):
+def write_register(device_address, register_address, value, verify=None):
     global readFlag
     """
-    Write a register using pymodbus.
+    Write a register using pymodbus. Critical parameters are read back and rewritten on a
+    mismatch (verify=None: CRITICAL_REGISTERS while verifyWrites is on).
     """
     readFlag = False
-    response = client.write_register(register_address, value, unit=device_address)
-    if response.isError():
-        print(f"Error writing value {value} to register 0x{register_address:04X}: {response}")
+    ioCache.pop(device_address, None)
+    try:
+        breakers.check(device_address)
+    except DriveQuarantined:
         return False
+    op_class = COMMAND if register_address in COMMAND_REGISTERS else IDEMPOTENT
+    if verify is None:
+        verify = verifyWrites and register_address in CRITICAL_REGISTERS
+    for _ in range(retryPolicy.attempts_for(op_class) if verify else 1):
+        try:
+            response = requestWithRetry(device_address,
+                                        lambda: client.write_register(register_address, value, unit=device_address),
+                                        op_class)
+        except PORT_ERRORS as e:
+            log.error("Error writing value %s to register 0x%04X: %s", value, register_address, e,
+                      extra={"motor": device_address, "reg": register_address})
+            return False
+        if not checkResponse(device_address, response):
+            log.error("Error writing value %s to register 0x%04X: %s", value, register_address, response,
+                      extra={"motor": device_address, "reg": register_address})
+            return False
+        if not verify or read_register(device_address, register_address) == value & 0xFFFF:
+            break
+        retryStats.verify_failed(device_address)
+    else:
+        log.error("Register 0x%04X does not read back %s.", register_address, value,
+                  extra={"motor": device_address, "reg": register_address})
+        return False
+    if register_address in SHADOW_REGISTERS:
+        shadowRegisters.setdefault(device_address, {})[register_address] = value
     readFlag = True
     return True
 
+def bus_devices():
+    """
+    Every drive address that listens on the shared RS-485 line.
+    """
+    return {RIGHT_MOTOR, LEFT_MOTOR, RIGHT_TURN, LEFT_TURN}
+
+def triggerGroup(devices, trigger_val):
+    """
+    Start the already loaded PR path on all devices at once.
+
+    If every drive on the bus takes part a single broadcast (unit 0) frame is sent, so all axes
+    start in the same frame. Otherwise a drive that was not loaded would re-run its old path, so
+    the triggers are sent back to back with nothing in between. Returns the measured skew in
+    seconds between the first and the last trigger (0 for broadcast), or None on failure.
+    """
+    global lastTriggerSkew
+    devices = list(devices)
+    if BROADCAST_TRIGGER and set(devices) >= bus_devices():
+        try:
+            # pymodbus returns a plain message for broadcasts, there is no response to check
+            ioCache.clear()
+            with busLock:
+                client.write_register(PR_TRIG, trigger_val, unit=0)
+            lastTriggerSkew = 0.0
+            return lastTriggerSkew
+        except Exception as e:
+            log.warning("Broadcast trigger failed, falling back to burst: %s", e)
+
+    sent_at = []
+    ok = True
+    for dev in devices:
+        ok = write_register(dev, PR_TRIG, trigger_val) and ok
+        sent_at.append(time.perf_counter())
+    lastTriggerSkew = sent_at[-1] - sent_at[0] if sent_at else 0.0
+    return lastTriggerSkew if ok else None
+
 # --------------------------
 # Example Conversion of Some Functions
 # --------------------------
@@ -186,7 +446,7 @@ def jogMotor(devAddr, direction):
         # For counter-clockwise
         return write_register(devAddr, REGISTER_CONTROL_WORD, 0x4001)
     else:
-        print("Invalid direction. Use '+' or '-'")
+        log.error("Invalid direction %r. Use '+' or '-'", direction)
         return False
 
 def readEncoder(device_address):
@@ -236,21 +496,26 @@ def motorMove(Velocity, acc, dcc, LSteps, RSteps, Mode):
     Rmsb, Rlsb = split_value(negLSteps)
     Lmsb, Llsb = split_value(RSteps)
 
+    ok = True
     try:
         # Write incremental target positions
-        write_register(RIGHT_MOTOR, 0x6209, Rmsb)
-        write_register(LEFT_MOTOR,  0x6209, Lmsb)
-        write_register(RIGHT_MOTOR, 0x620A, Rlsb)
-        write_register(LEFT_MOTOR,  0x620A, Llsb)
+        ok = write_register(RIGHT_MOTOR, 0x6209, Rmsb) and ok
+        ok = write_register(LEFT_MOTOR,  0x6209, Lmsb) and ok
+        ok = write_register(RIGHT_MOTOR, 0x620A, Rlsb) and ok
+        ok = write_register(LEFT_MOTOR,  0x620A, Llsb) and ok
         # Write absolute target positions (if needed)
-        write_register(RIGHT_MOTOR, 0x6201, Rmsb)
-        write_register(LEFT_MOTOR,  0x6201, Lmsb)
-        write_register(RIGHT_MOTOR, 0x6202, Rlsb)
-        write_register(LEFT_MOTOR,  0x6202, Llsb)
+        ok = write_register(RIGHT_MOTOR, 0x6201, Rmsb) and ok
+        ok = write_register(LEFT_MOTOR,  0x6201, Lmsb) and ok
+        ok = write_register(RIGHT_MOTOR, 0x6202, Rlsb) and ok
+        ok = write_register(LEFT_MOTOR,  0x6202, Llsb) and ok
         # Write velocity, acceleration, and deceleration
         for reg, value in [(0x620B, Velocity), (0x620C, acc), (0x620D, dcc)]:
-            write_register(RIGHT_MOTOR, reg, value)
-            write_register(LEFT_MOTOR,  reg, value)
+            ok = write_register(RIGHT_MOTOR, reg, value) and ok
+            ok = write_register(LEFT_MOTOR,  reg, value) and ok
+        # A parameter that did not make it after the retries must not produce a wrong move
+        if not ok:
+            log.error("PR parameters not written, move not started.")
+            return False
         # Trigger motion command based on mode
         if Mode == "INC":
             trigger_val = 0x11
@@ -258,12 +523,9 @@ def motorMove(Velocity, acc, dcc, LSteps, RSteps, Mode):
             trigger_val = 0x10
         else:
             trigger_val = 0x11
-        write_register(RIGHT_MOTOR, 0x6002, trigger_val)
-        write_register(LEFT_MOTOR,  0x6002, trigger_val)
-
-        return True
+        return triggerGroup([RIGHT_MOTOR, LEFT_MOTOR], trigger_val) is not None
     except Exception as e:
-        print(f"Error in motorMove: {e}")
+        log.error("Error in motorMove: %s", e)
         return False
 
 
@@ -283,8 +545,22 @@ def updateVelocity(v):
     s4 = write_register(LEFT_MOTOR, PR_VELOCITY, v)
     return s1 and s2 and s3 and s4
 
-def readGPIO(device_address, pin_number):
+def readInputs(device_address, max_age=IO_FRESHNESS):
+    """
+    Whole REGISTER_IO_STATUS word; reused for max_age seconds so reading several pins costs one
+    transaction. Any write to the drive drops the cached word.
+    """
+    cached = ioCache.get(device_address)
+    now = time.monotonic()
+    if cached is not None and now - cached[0] <= max_age:
+        return cached[1]
     input_states = read_register(device_address, REGISTER_IO_STATUS)
+    if input_states is not None:
+        ioCache[device_address] = (now, input_states)
+    return input_states
+
+def readGPIO(device_address, pin_number, max_age=IO_FRESHNESS):
+    input_states = readInputs(device_address, max_age)
     if input_states is None:
         return None
     return bool(input_states & (1 << (pin_number - 1)))
@@ -391,52 +667,8 @@ def close_client():
 
 
 def interpret_alarm(alarm_value):
-    if alarm_value == 0:
-        return "No alarms."
-    alarms = []
-    troubleshooting = []
-    alarm_codes = {
-        0x01: ("Over-current", [
-            "1. Restart the drive",
-            "2. Check motor wiring"
-        ]),
-        0x02: ("Over-voltage", [
-            "1. Restart the drive",
-            "2. Check power supply voltage"
-        ]),
-        0x40: ("Current sampling circuit error", [
-            "1. Restart the drive",
-            "2. Hardware failure"
-        ]),
-        0x80: ("Shaft locking error", [
-            "1. Check motor wiring"
-        ]),
-        0x200: ("EEPROM error", ["Hardware Failure"]),
-        0x100: ("Auto tuning error", [
-            "1. Restart the drive",
-            "2. Contact support if persists"
-        ]),
-        0x20: ("Position following error", [
-            "1. Check encoder resolution",
-            "2. Check encoder cable",
-            "3. Check limit switch",
-            "4. Check acceleration parameters"
-        ]),
-        0x08: ("Encoder cable error", [
-            "1. Check encoder cable",
-            "2. Check for missing extension cable"
-        ])
-    }
-    for code, (desc, steps) in alarm_codes.items():
-        if alarm_value & code:
-            alarms.append(desc)
-            troubleshooting.extend(steps)
-    if not alarms:
-        return "Unknown alarm code."
-    response = "Active Alarms: " + ", ".join(alarms)
-    if troubleshooting:
-        response += "\nTroubleshooting Steps:\n" + "\n".join(troubleshooting)
-    return response
+    # Precomputed in alarms.py; the texts are built once per alarm combination
+    return describe_alarm(alarm_value)
 
 def readAlarm(right_device_address=RIGHT_MOTOR, left_device_address=LEFT_MOTOR):
     right_alarm_value = read_register(right_device_address, REGISTER_CURRENT_ALARM)
@@ -446,23 +678,45 @@ def readAlarm(right_device_address=RIGHT_MOTOR, left_device_address=LEFT_MOTOR):
     return f"Right Motor: {right_alarm_status}\nLeft Motor: {left_alarm_status}"
 
 def angle2Distance(angle, radius=RADIUS):
-    arc = (angle / 360.0) * 2 * math.pi * radius
-    # Adjust with an offset if needed
-    return arc - arc * 0.0655555555555556
+    # Arc length of the turn, minus the legacy slip allowance (units.TURN_SLIP)
+    return turn_arc(angle, radius)
 
 def resetEncoder(device_address):
     write_register(device_address, REGISTER_ENCODER_VALUEL, 0)
     write_register(device_address, REGISTER_ENCODER_VALUEH, 0)
 
+_base = None
+def robotBase():
+    """
+    Kinematics of the base, built once from RADIUS, TOLANG and OMNIRATIO.
+    The right traction drive is mounted mirrored, so it turns against the right wheel's travel.
+    The steering drives are crossed over (RIGHT_TURN follows the left angle), as omniRotate always did.
+    """
+    global _base
+    if _base is None:
+        _base = FourDriveBase(RADIUS, OMNIRATIO, heading_offset=TOLANG,
+                              drive_map={"left": [(LEFT_MOTOR, +1)], "right": [(RIGHT_MOTOR, -1)]},
+                              steer_map={"left": (RIGHT_TURN, +1), "right": (LEFT_TURN, +1)})
+    return _base
+
+_steerConverters = None
+def steerConverters():
+    global _steerConverters
+    if _steerConverters is None:
+        _steerConverters = {RIGHT_TURN: UnitConverter(PPR, LEFT_MOTOR_GEAR),
+                            LEFT_TURN: UnitConverter(PPR, RIGHT_MOTOR_GEAR)}
+    return _steerConverters
+
 def rotate(angle, VEL, ACC, DCC, direction, MODE, shouldStore):
-    angle = angle + TOLANG
-    turn_dist = angle2Distance(abs(angle))
     if direction.lower() == 'l':
-        return motorMoveDistance(VEL, ACC, DCC, turn_dist, -turn_dist, "mm", MODE, shouldStore)
+        heading = abs(angle)
     elif direction.lower() == 'r':
-        return motorMoveDistance(VEL, ACC, DCC, -turn_dist, turn_dist, "mm", MODE, shouldStore)
+        heading = -abs(angle)
     else:
         raise ValueError("Invalid direction! Use 'l' for left or 'r' for right.")
+    # shouldStore is kept for the callers; this module keeps no positions.csv
+    left, right = robotBase().wheel_travel(0, heading)
+    return motorMoveDistance(VEL, ACC, DCC, float(left), float(right), "mm", MODE)
 
 
 # Mapping of output ports to their Modbus register addresses
@@ -493,17 +747,17 @@ def set_output_state_manual(device_address, output_port, state, manual_on_value=
         bool: True if the write was successful, False otherwise.
     """
     if output_port not in OUTPUT_REGISTERS:
-        print(f"Output port {output_port} is not recognized.")
+        log.error("Output port %s is not recognized.", output_port)
         return False
 
     register = OUTPUT_REGISTERS[output_port]
     # Use manual_on_value for ON and 0 for OFF
     value = manual_on_value if state else 0x00
     if write_register(device_address, register, value):
-        print(f"{output_port} manually set to {'ON' if state else 'OFF'} on device {device_address}.")
+        log.info("%s manually set to %s on device %s.", output_port, "ON" if state else "OFF", device_address)
         return True
     else:
-        print(f"Failed to set {output_port} manually on device {device_address}.")
+        log.error("Failed to set %s manually on device %s.", output_port, device_address)
         return False
 
 def releaseMotors(MOTOR_ADDR):
@@ -533,7 +787,7 @@ def check_pr_completion(MOTOR_ADDR):
         pr_complete = bool(status & (1 << 5)) if status is not None else False
         return pr_complete
     except Exception as e:
-        print("Error reading PR completion status:", e)
+        log.error("Error reading PR completion status: %s", e)
         return False
 
 def split_value(val):
@@ -557,17 +811,17 @@ def disable_soft_limits(device_address):
     """
     current_control = read_register(device_address, 0x6000)
     if current_control is None:
-        print("Error reading PR control setting from register 0x6000.")
+        log.error("Error reading PR control setting from register 0x6000.")
         return False
 
     # Example assumes bit1 is used for soft limit; change mask if your code sets bit0 instead
     new_control = current_control & ~0x0002
 
     if not write_register(device_address, 0x6000, new_control):
-        print("Failed to update PR control setting to disable soft limit.")
+        log.error("Failed to update PR control setting to disable soft limit.")
         return False
 
-    print("Soft limits have been disabled.")
+    log.info("Soft limits have been disabled.")
     return True
 
 
@@ -594,13 +848,13 @@ def set_soft_limits(device_address, pos_limit, neg_limit, quick_stop_time=100):
     # Step 1: Enable soft limit function in PR control setting (register 0x6000)
     current_control = read_register(device_address, 0x6000)
     if current_control is None:
-        print("Error reading PR control setting from register 0x6000.")
+        log.error("Error reading PR control setting from register 0x6000.")
         return False
 
     # Enable soft limit by setting bit1 (mask 0x0002)
     new_control = current_control | 0x0001
     if not write_register(device_address, 0x6000, new_control):
-        print("Failed to update PR control setting to enable soft limit.")
+        log.error("Failed to update PR control setting to enable soft limit.")
         return False
 
     # Step 2: Split the 32-bit soft limit values into high and low 16-bit parts.
@@ -619,11 +873,11 @@ def set_soft_limits(device_address, pos_limit, neg_limit, quick_stop_time=100):
     success_qs = write_register(device_address, 0x6016, quick_stop_time)
 
     if success_pos_h and success_pos_l and success_neg_h and success_neg_l and success_qs:
-        print(
-            f"Soft limits set successfully: +{pos_limit} pulses, {neg_limit} pulses with quick stop time {quick_stop_time} ms.")
+        log.info("Soft limits set successfully: +%s pulses, %s pulses with quick stop time %s ms.",
+                 pos_limit, neg_limit, quick_stop_time)
         return True
     else:
-        print("Failed to set one or more soft limit registers.")
+        log.error("Failed to set one or more soft limit registers.")
         return False
 
 
@@ -634,73 +888,85 @@ def set_soft_limits(device_address, pos_limit, neg_limit, quick_stop_time=100):
 
 def wheel_circumference():
     return math.pi * WHEEL_DIA
+
+_wheelConverter = None
+def wheelConverter():
+    """
+    Wheel step converter (gear 1, the motor gear is applied by the callers), rebuilt only when
+    PPR or WHEEL_DIA change after a reloadCSV().
+    """
+    global _wheelConverter
+    if _wheelConverter is None or _wheelConverter.ppr != PPR or _wheelConverter.wheel_dia != WHEEL_DIA:
+        _wheelConverter = UnitConverter(PPR, 1, WHEEL_DIA)
+    return _wheelConverter
 def wheelRatio(UNIT):
-    ppr = 4000
-    unit = UNIT.lower()
-    if unit == "mm":
-        return ppr / wheel_circumference()
-    elif unit == "cm":
-        return ppr / (wheel_circumference()/10)
-    elif unit == "inch":
-        return ppr / (wheel_circumference()/25.4)
-    elif unit == "feet":
-        return ppr / (wheel_circumference()/304.8)
-    elif unit == "m":
-        return ppr / (wheel_circumference()/1000)
-    else:
-        raise ValueError("Unsupported unit. Choose from 'mm', 'cm', 'm', 'inch', 'feet'.")
+    return wheelConverter().factor(UNIT)
 def toSteps(Distance, UNIT):
-    return int(Distance * wheelRatio(UNIT))
+    return wheelConverter().to_steps(Distance, UNIT)
 
-def motorMoveDistance(Velocity, acc, dcc, LDistance, RDistance, UNIT, Mode):
-    LSteps = int(toSteps(LDistance, UNIT) * LEFT_MOTOR_GEAR)
-    negLSteps = -1 * LSteps
-    RSteps = int(toSteps(RDistance, UNIT) * RIGHT_MOTOR_GEAR)
+_tractionConverters = None
+def tractionConverters():
+    """
+    Step converters of the traction drives, each with its own gear; rebuilt like wheelConverter().
+    """
+    global _tractionConverters
+    left = None if _tractionConverters is None else _tractionConverters[LEFT_MOTOR]
+    if left is None or left.ppr != PPR or left.wheel_dia != WHEEL_DIA:
+        _tractionConverters = {LEFT_MOTOR: UnitConverter(PPR, LEFT_MOTOR_GEAR, WHEEL_DIA),
+                               RIGHT_MOTOR: UnitConverter(PPR, RIGHT_MOTOR_GEAR, WHEEL_DIA)}
+    return _tractionConverters
 
-    Rval = (negLSteps + (1 << 32)) % (1 << 32)
+def motorMoveDistance(Velocity, acc, dcc, LDistance, RDistance, UNIT, Mode):
+    """
+    Moves the left wheel by LDistance and the right wheel by RDistance (in UNIT).
+    Steps come from each drive's converter and the mounting signs of robotBase().
+    """
+    converters = tractionConverters()
+    travel = {"left": LDistance, "right": RDistance}
+    steps = {}
+    for side, drives in robotBase().drive_map.items():
+        for drive, sign in drives:
+            steps[drive] = converters[drive].to_steps(sign * travel[side], UNIT)
+
+    Rval = (steps[RIGHT_MOTOR] + (1 << 32)) % (1 << 32)
     Rmsb = (Rval >> 16)
     Rlsb = (Rval & 65535)
-    Lval = (RSteps + (1 << 32)) % (1 << 32)
+    Lval = (steps[LEFT_MOTOR] + (1 << 32)) % (1 << 32)
     Lmsb = (Lval >> 16)
     Llsb = (Lval & 65535)
-    # print(negLSteps)
-    # print(RSteps)
+    ok = True
     try:
-        write_register(RIGHT_MOTOR,INCREMENTAL_PR_HIGHBIT, Rmsb)
-        write_register(LEFT_MOTOR,INCREMENTAL_PR_HIGHBIT, Lmsb)
-        write_register(RIGHT_MOTOR,INCREMENTAL_PR_LOWBIT, Rlsb)
-        write_register(LEFT_MOTOR,INCREMENTAL_PR_LOWBIT, Llsb)
-
-        write_register(RIGHT_MOTOR,ABS_PR_HIGHBIT, Rmsb)
-        write_register(LEFT_MOTOR,ABS_PR_HIGHBIT, Lmsb)
-        write_register(RIGHT_MOTOR,ABS_PR_LOWBIT, Rlsb)
-        write_register(LEFT_MOTOR,ABS_PR_LOWBIT, Llsb)
-
-        write_register(RIGHT_MOTOR,INCREMENTAL_VELOCITY, Velocity)
-        write_register(LEFT_MOTOR,INCREMENTAL_VELOCITY, Velocity)
-        write_register(RIGHT_MOTOR,INCREMENTAL_ACCELERATION, acc)
-        write_register(LEFT_MOTOR,INCREMENTAL_ACCELERATION, acc)
-        write_register(RIGHT_MOTOR,INCREMENTAL_DECCELERATION, dcc)
-        write_register(LEFT_MOTOR,INCREMENTAL_DECCELERATION, dcc)
-
-        write_register(RIGHT_MOTOR,PR_VELOCITY, Velocity)
-        write_register(LEFT_MOTOR,PR_VELOCITY, Velocity)
-        write_register(RIGHT_MOTOR,PR_ACCELERATION, acc)
-        write_register(LEFT_MOTOR,PR_ACCELERATION, acc)
-        write_register(RIGHT_MOTOR,PR_DECELERATION, dcc)
-        write_register(LEFT_MOTOR,PR_DECELERATION, dcc)
-        if Mode == "INC":
-            write_register(RIGHT_MOTOR,PR_TRIG, 0x11)
-            write_register(LEFT_MOTOR,PR_TRIG, 0x11)
-
-        elif Mode == "ABS":
-            write_register(RIGHT_MOTOR,PR_TRIG, 0x10)
-            write_register(LEFT_MOTOR,PR_TRIG, 0x10)
-        else:
-            write_register(RIGHT_MOTOR,PR_TRIG, 0x11)
-            write_register(LEFT_MOTOR,PR_TRIG, 0x11)
+        ok = write_register(RIGHT_MOTOR,INCREMENTAL_PR_HIGHBIT, Rmsb) and ok
+        ok = write_register(LEFT_MOTOR,INCREMENTAL_PR_HIGHBIT, Lmsb) and ok
+        ok = write_register(RIGHT_MOTOR,INCREMENTAL_PR_LOWBIT, Rlsb) and ok
+        ok = write_register(LEFT_MOTOR,INCREMENTAL_PR_LOWBIT, Llsb) and ok
+
+        ok = write_register(RIGHT_MOTOR,ABS_PR_HIGHBIT, Rmsb) and ok
+        ok = write_register(LEFT_MOTOR,ABS_PR_HIGHBIT, Lmsb) and ok
+        ok = write_register(RIGHT_MOTOR,ABS_PR_LOWBIT, Rlsb) and ok
+        ok = write_register(LEFT_MOTOR,ABS_PR_LOWBIT, Llsb) and ok
+
+        ok = write_register(RIGHT_MOTOR,INCREMENTAL_VELOCITY, Velocity) and ok
+        ok = write_register(LEFT_MOTOR,INCREMENTAL_VELOCITY, Velocity) and ok
+        ok = write_register(RIGHT_MOTOR,INCREMENTAL_ACCELERATION, acc) and ok
+        ok = write_register(LEFT_MOTOR,INCREMENTAL_ACCELERATION, acc) and ok
+        ok = write_register(RIGHT_MOTOR,INCREMENTAL_DECCELERATION, dcc) and ok
+        ok = write_register(LEFT_MOTOR,INCREMENTAL_DECCELERATION, dcc) and ok
+
+        ok = write_register(RIGHT_MOTOR,PR_VELOCITY, Velocity) and ok
+        ok = write_register(LEFT_MOTOR,PR_VELOCITY, Velocity) and ok
+        ok = write_register(RIGHT_MOTOR,PR_ACCELERATION, acc) and ok
+        ok = write_register(LEFT_MOTOR,PR_ACCELERATION, acc) and ok
+        ok = write_register(RIGHT_MOTOR,PR_DECELERATION, dcc) and ok
+        ok = write_register(LEFT_MOTOR,PR_DECELERATION, dcc) and ok
+        # A parameter that did not make it after the retries must not produce a wrong move
+        if not ok:
+            log.error("PR parameters not written, move not started.")
+            return False
+        trigger_val = 0x10 if Mode == "ABS" else 0x11
+        return triggerGroup([RIGHT_MOTOR, LEFT_MOTOR], trigger_val) is not None
     except Exception as e:
-        print("Error in motorMoveDistance:", e)
+        log.error("Error in motorMoveDistance: %s", e)
         return False
 
 def omniRotate(Velocity, acc, dcc, LAngle, RAngle, Mode):
@@ -708,18 +974,11 @@ def omniRotate(Velocity, acc, dcc, LAngle, RAngle, Mode):
     Example conversion for a motor move function.
     This function writes to both motors.
     """
-    # Convert steps to proper 32-bit representation
-
-
-    #(multiply PPR x Gear box ratio x OMNIRATIO and total should be divided by 360 and convert them to int) x angle to be given
-
-
-    LSteps = int(4000*LEFT_MOTOR_GEAR*OMNIRATIO)/360*LAngle
-    RSteps = int(4000*RIGHT_MOTOR_GEAR*OMNIRATIO)/360*RAngle
-    LSteps = int(LSteps)
-    RSteps = int(RSteps)
-    print(f"LSteps : {LSteps} , OmniRatio : {OMNIRATIO}, LEFT_GEAR : {LEFT_MOTOR_GEAR}")
-    negLSteps = LSteps
+    # PPR x gear box ratio x OMNIRATIO / 360 steps per degree of module angle
+    steps = robotBase().steer(steerConverters(), LAngle, RAngle)
+    negLSteps = steps[RIGHT_TURN]
+    RSteps = steps[LEFT_TURN]
+    log.info("LSteps : %s , OmniRatio : %s, LEFT_GEAR : %s", negLSteps, OMNIRATIO, LEFT_MOTOR_GEAR)
 
     # Prepare 32-bit values (split into two 16-bit registers)
     def split_value(val):
@@ -765,13 +1024,10 @@ def omniRotate(Velocity, acc, dcc, LAngle, RAngle, Mode):
             trigger_val = 0x10
         else:
             trigger_val = 0x11
-        write_register(RIGHT_TURN, 0x6002, trigger_val)
-        write_register(LEFT_TURN,  0x6002, trigger_val)
-
-        return True
+        return triggerGroup([RIGHT_TURN, LEFT_TURN], trigger_val) is not None
     except Exception as e:
-        print(f"Error in motorMove: {e}")
-        return Falser
+        log.error("Error in motorMove: %s", e)
+        return False
 
 def enable_drive(device_address):
     """
@@ -780,10 +1036,10 @@ def enable_drive(device_address):
     For example, writing 0x0088 to the control word register may be required.
     """
     if write_register(device_address, REGISTER_CONTROL_WORD, 0x0088):
-        print(f"Drive {device_address} enabled.")
+        log.info("Drive %s enabled.", device_address)
         return True
     else:
-        print(f"Failed to enable drive {device_address}.")
+        log.error("Failed to enable drive %s.", device_address)
         return False
 
 
@@ -803,14 +1059,16 @@ def set_software_zero(device_address):
     global encoder_offset
     current = readEncoder(device_address)
     if current is None:
-        print(f"Failed to read encoder for device {device_address}.")
+        log.error("Failed to read encoder for device %s.", device_address)
         return False
     encoder_offset = current
-    print(f"Software zero set. Encoder offset for device {device_address}: {encoder_offset}")
+    log.info("Software zero set. Encoder offset for device %s: %s", device_address, encoder_offset)
     return True
 
 reloadCSV()
 readFlag = True
+lastTriggerSkew = None
+ioCache = {}
 
 # --------------------------
 # Example Usage
@@ -843,19 +1101,13 @@ setJogVelAcc(LEFT_TURN, JOG_VEL,JOG_ACC) #to set velocity of Right motor to 3000
     #     print("Jog command failed.")
 
 
-def readGPIO(device_address, pin_number):
-    input_states = read_register(device_address, REGISTER_IO_STATUS)
-    if input_states is None:
-        return None
-    return bool(input_states & (1 << (pin_number - 1)))
-
 def clearAlarm(device_address):
     write_register(device_address, REGISTER_CONTROL_WORD, 0x1111)
 
 def readAlarm(device_address):
     alarmValue = read_register(device_address, 0x2203)
     status = interpret_alarm(alarmValue)
-    print(status)
+    log.info("Alarm status of device %s: %s", device_address, status)
     return status
 
 def pauseMotor(device_address):
@@ -866,69 +1118,6 @@ def pauseAll():
     write_register(LEFT_MOTOR, PR_TRIG, 0x040)
     write_register(LEFT_TURN, PR_TRIG, 0x040)
 
-def interpret_alarm(alarm_value):
-    if alarm_value == 0:
-        return "No alarms."
-
-    alarms = []
-    troubleshooting = []
-
-    # Define alarm codes and their troubleshooting steps
-    alarm_codes = {
-        0x01: ("Over-current", [
-            "1. Restart the drive",
-            "2. If it still exists, check whether the motor is short-circuited or not connected to the motor"
-        ]),
-        0x02: ("Over-voltage", [
-            "1. Restart the drive",
-            "2. If it still exists, check the voltage of power supply"
-        ]),
-        0x40: ("Current sampling circuit error", [
-            "1. Restart the drive",
-            "2. If it still exists, the hardware failure"
-        ]),
-        0x80: ("Shaft locking error", [
-            "1. Check whether the motor wire is broken"
-        ]),
-        0x200: ("EEPROM error", [
-            "Harware Failure"
-        ]),
-        0x100: ("Auto tuning error", [
-            "1. Restart the drive",
-            "2. If it still exists, or Contact Ignomagine Team"
-        ]),
-        0x20: ("Position following error", [
-            "1. Check if the value of encoder resolution or Contact Ignomagine Team",
-            "2. Check if the encoder cable is broken",
-            "3. Check if the limit switch is damaged",
-            "4. Check if the acceleration time is too small, or the starting speed is too large"
-        ]),
-        0x08: ("Encoder cable error", [
-            "1. Check if the encoder cable is damaged",
-            "2. Whether no encoder extension cable is used"
-        ])
-    }
-
-    # Check each alarm code bit
-    for code, (desc, steps) in alarm_codes.items():
-        if alarm_value & code:
-            alarms.append(desc)
-            troubleshooting.extend(steps)
-
-    if not alarms:
-        return "Unknown alarm code."
-
-    # Format the response
-    response = "Active Alarms: " + ", ".join(alarms)
-    if troubleshooting:
-        response += "\nTroubleshooting Steps:\n" + "\n".join(troubleshooting)
-
-    return response
-
-
-
-
-
 # while (Rgpio7 == True) and (Lgpiqo7 == True):
 #     Rgpio7 = readGPIO(RIGHT_TURN, 7)
 #     Rgpio6 = readGPIO(RIGHT_TURN, 6)
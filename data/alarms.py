@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Drive Alarm Decoder
+-------------------
+Precomputed decoding of the 16-bit current-alarm word of the drives.
+
+ALARM_TABLE maps every possible register value (0-65535) to a frozenset of alarm names, so
+decoding is one list index. Only the 256 combinations of the known bits exist as distinct sets;
+the table entries share them. Descriptions with troubleshooting steps are built once per
+distinct set and cached.
+"""
+
+# bit: (alarm, troubleshooting steps)
+ALARM_CODES = {
+    0x01: ("Over-current", (
+        "1. Restart the drive",
+        "2. If it still exists, check whether the motor is short-circuited or not connected to the motor",
+    )),
+    0x02: ("Over-voltage", (
+        "1. Restart the drive",
+        "2. If it still exists, check the voltage of power supply",
+    )),
+    0x08: ("Encoder cable error", (
+        "1. Check if the encoder cable is damaged",
+        "2. Whether no encoder extension cable is used",
+    )),
+    0x20: ("Position following error", (
+        "1. Check if the value of encoder resolution or Contact Ignomagine Team",
+        "2. Check if the encoder cable is broken",
+        "3. Check if the limit switch is damaged",
+        "4. Check if the acceleration time is too small, or the starting speed is too large",
+    )),
+    0x40: ("Current sampling circuit error", (
+        "1. Restart the drive",
+        "2. If it still exists, the hardware failure",
+    )),
+    0x80: ("Shaft locking error", (
+        "1. Check whether the motor wire is broken",
+    )),
+    0x100: ("Auto tuning error", (
+        "1. Restart the drive",
+        "2. If it still exists, or Contact Ignomagine Team",
+    )),
+    0x200: ("EEPROM error", (
+        "Hardware Failure",
+    )),
+}
+
+UNKNOWN_ALARM = "Unknown alarm"
+KNOWN_MASK = 0
+for _bit in ALARM_CODES:
+    KNOWN_MASK |= _bit
+
+
+def _build_table():
+    by_mask = {}
+    for mask in range(KNOWN_MASK + 1):
+        if mask & ~KNOWN_MASK:
+            continue
+        by_mask[mask] = frozenset(name for bit, (name, _) in ALARM_CODES.items() if mask & bit)
+    unknown = {mask: s | {UNKNOWN_ALARM} for mask, s in by_mask.items()}
+    return tuple(
+        (unknown if value & ~KNOWN_MASK else by_mask)[value & KNOWN_MASK]
+        for value in range(0x10000)
+    )
+
+
+ALARM_TABLE = _build_table()
+NO_ALARMS = ALARM_TABLE[0]
+_descriptions = {}
+
+
+def decode_alarm(value):
+    """
+    Frozen set of alarm names for a current-alarm register value.
+    """
+    return ALARM_TABLE[value & 0xFFFF]
+
+
+def describe_alarm(value):
+    """
+    Human readable alarms plus troubleshooting steps (the old interpret_alarm text).
+    """
+    value &= 0xFFFF
+    if value == 0:
+        return "No alarms."
+    key = value & KNOWN_MASK
+    text = _descriptions.get(key)
+    if text is None:
+        alarms = []
+        troubleshooting = []
+        for bit, (name, steps) in ALARM_CODES.items():
+            if key & bit:
+                alarms.append(name)
+                troubleshooting.extend(steps)
+        if not alarms:
+            text = "Unknown alarm code."
+        else:
+            text = "Active Alarms: " + ", ".join(alarms)
+            text += "\nTroubleshooting Steps:\n" + "\n".join(troubleshooting)
+        _descriptions[key] = text
+    return text
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Asynchronous Structured Logging
+-------------------------------
+Log records leave the calling thread through a bounded queue; a background listener formats them
+as JSON lines and writes them to the console (and optionally a file). A blocked or slow console
+therefore never stretches a motion cycle.
+
+    caller     logging call -> rate limit -> put_nowait() on the queue (dropped if it is full)
+    listener   getMessage() / JSON formatting -> stdout, log file
+
+Log with %-style arguments (log.error("Error reading 0x%04X", reg)), not f-strings: the message
+is only built on the listener thread, and the template is the key of the rate limit.
+
+Rate limiting: the same message template (per logger, level and extra "motor") is passed
+RATE_BURST times per RATE_WINDOW seconds; the rest is counted and reported as "suppressed" on
+the next record that gets through. Only WARNING and above are limited.
+
+Record format (one JSON object per line):
+    {"ts": 1760900000.123456, "level": "ERROR", "logger": "driver", "msg": "...", "motor": "right", ...}
+Fields passed with extra={...} are added as keys.
+
+Dependencies:
+    - logging, queue, json
+"""
+
+import atexit
+import json
+import logging
+import queue
+import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+LOG_LEVEL       = logging.INFO
+LOG_QUEUE_SIZE  = 10000        # records; beyond this new records are dropped, never waited for
+RATE_BURST      = 5            # records of one template per window
+RATE_WINDOW     = 10.0         # s
+
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_FIELDS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RateLimitFilter(logging.Filter):
+    def __init__(self, burst=RATE_BURST, window=RATE_WINDOW, min_level=logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.min_level = min_level
+        self.windows = {}            # (logger, level, template, motor) -> [start, count, suppressed]
+        self.suppressed = 0
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.min_level:
+            return True
+        key = (record.name, record.levelno, record.msg, getattr(record, "motor", None))
+        with self.lock:
+            w = self.windows.get(key)
+            if w is None or record.created - w[0] >= self.window:
+                if w is not None and w[2]:
+                    record.suppressed = w[2]
+                self.windows[key] = [record.created, 1, 0]
+                return True
+            w[1] += 1
+            if w[1] <= self.burst:
+                return True
+            w[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class DroppingQueueHandler(QueueHandler):
+    """
+    QueueHandler that never blocks and never formats: a full queue drops the record.
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # The stock handler formats here, on the caller's thread; the listener does it instead
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler = None
+_listener = None
+_limiter = None
+_setup_lock = threading.Lock()
+
+
+def setup_logging(level=LOG_LEVEL, stream=None, path=None, queue_size=LOG_QUEUE_SIZE,
+                  burst=RATE_BURST, window=RATE_WINDOW):
+    """
+    Routes the root logger through the queue. Safe to call more than once, only the first call
+    configures anything. path: optional JSON-lines log file next to the console output.
+    """
+    global _handler, _listener, _limiter
+    with _setup_lock:
+        if _handler is not None:
+            return _handler
+        outputs = [logging.StreamHandler(stream or sys.stdout)]
+        if path:
+            outputs.append(logging.FileHandler(path, encoding="utf-8"))
+        for output in outputs:
+            output.setFormatter(JsonFormatter())
+        log_queue = queue.Queue(queue_size)
+        _limiter = RateLimitFilter(burst, window)
+        _handler = DroppingQueueHandler(log_queue)
+        _handler.addFilter(_limiter)
+        root = logging.getLogger()
+        root.addHandler(_handler)
+        root.setLevel(level)
+        _listener = QueueListener(log_queue, *outputs, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown_logging)
+        return _handler
+
+
+def shutdown_logging():
+    """
+    Writes out what is still queued and stops the listener thread.
+    """
+    global _listener
+    if _listener is not None:
+        try:
+            _listener.stop()
+        except queue.Full:
+            pass
+        _listener = None
+
+
+def get_logger(name):
+    setup_logging()
+    return logging.getLogger(name)
+
+
+def log_stats():
+    """
+    Records dropped on a full queue, suppressed by the rate limit, and currently queued.
+    """
+    if _handler is None:
+        return {"dropped": 0, "suppressed": 0, "queued": 0}
+    return {"dropped": _handler.dropped, "suppressed": _limiter.suppressed, "queued": _handler.queue.qsize()}
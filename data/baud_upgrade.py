@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Baud-Rate Upgrade
+-----------------
+Moves the drives of one RS-485 line from the configured BAUDRATE to a faster rate (e.g. 115200)
+without touching the drive panels. Every command and poll is bound by the line rate, so a faster
+line shortens every cycle.
+
+Sequence (the controller's bus lock is held throughout, nothing else uses the line):
+    1. check      every drive answers, is an EL7-RS (REG_SLAVE_ID echoes its address) and
+                  reports the current rate in Pr5.30 (REG_BAUD_RATE); the target has a code
+    2. benchmark  round-robin status reads at the old rate
+    3. switch     one drive at a time, in address order: write the new code at the old rate,
+                  move the host to the new rate and confirm that drive answers with the new
+                  code, then back to the old rate for the next drive
+    4. verify     benchmark at the new rate; every frame must be answered and throughput must
+                  improve
+    5. persist    optional (--write), once every line succeeded: store the parameters in the
+                  drives' EEPROM and BAUDRATE in Hardware.csv
+
+If any drive fails to answer, every drive touched so far is switched back (the old code is sent
+at both rates, so a drive that only stored the value in RAM is reset as well) and the host stays
+at the old rate. Until step 5 the new rate lives in RAM only, a power cycle also reverts it.
+
+Usage:
+    python baud_upgrade.py [baudrate] [--write]
+
+Dependencies:
+    - driver (ServoController, register map)
+    - bus_manager (drive/port map)
+    - myCSV (write_settings)
+    - async_log
+"""
+
+import sys
+import time
+
+from driver import *
+from bus_manager import bus_map_from_settings
+from async_log import get_logger
+
+log = get_logger("baud_upgrade")
+
+TARGET_BAUDRATE = 115200
+BAUD_SETTLE     = 0.05         # s a drive may need to reconfigure its UART after the write
+CONFIRM_TRIES   = 3            # reads at the new rate before a drive counts as lost
+BENCH_FRAMES    = 200          # status reads per benchmark, spread over the drives
+
+
+class BaudUpgrade:
+    def __init__(self, controller, target=TARGET_BAUDRATE, frames=BENCH_FRAMES, settle=BAUD_SETTLE):
+        self.controller = controller
+        self.old = controller.baudrate
+        self.target = target
+        self.frames = frames
+        self.settle = settle
+        self.switched = []
+        self.before = None
+        self.after = None
+
+    @property
+    def order(self):
+        """
+        Drives in address order.
+        """
+        addresses = self.controller.motor_addresses
+        return sorted(addresses, key=addresses.get)
+
+    # --- Raw Frames ---
+    # The breakers and retries of the controller are bypassed on purpose: a drive that is
+    # briefly silent while it changes rate must not be quarantined, and a baud write is never
+    # repeated at a rate the drive may no longer listen to.
+    def _read(self, motor_key, reg_addr):
+        try:
+            return self.controller.motors[motor_key].read_register(reg_addr)
+        except Exception:
+            return None
+
+    def _write_code(self, motor_key, code):
+        """
+        Sends the baud code once. The drive may switch before its reply is out, so a missing or
+        corrupted reply is expected; the new rate is confirmed by reading it back.
+        """
+        try:
+            self.controller.motors[motor_key].write_register(REG_BAUD_RATE, code, functioncode=6)
+        except Exception:
+            pass
+        time.sleep(self.settle)
+
+    def _answers(self, motor_key, baudrate):
+        self.controller.set_line_rate(baudrate)
+        for _ in range(CONFIRM_TRIES):
+            if self._read(motor_key, REG_BAUD_RATE) == BAUD_CODES[baudrate]:
+                return True
+        return False
+
+    # --- Steps ---
+    def check(self):
+        """
+        List of reasons the upgrade cannot run; empty if it can.
+        """
+        problems = []
+        if self.controller.instrument_factory is not None:
+            return ["the controller does not own a serial line"]
+        if self.target not in BAUD_CODES:
+            problems.append(f"{self.target} baud has no Pr5.30 code (supported: {sorted(BAUD_CODES)})")
+        elif self.target <= self.old:
+            problems.append(f"{self.target} baud is not faster than the current {self.old} baud")
+        if self.old not in BAUD_CODES:
+            problems.append(f"the current {self.old} baud has no Pr5.30 code")
+        for key in self.order:
+            address = self.controller.motor_addresses[key]
+            slave_id = self._read(key, REG_SLAVE_ID)
+            if slave_id is None:
+                problems.append(f"{key} (ID {address}) does not answer")
+            elif slave_id != address:
+                problems.append(f"{key} (ID {address}) is not an EL7-RS drive, Pr5.30 is unknown there")
+            elif self._read(key, REG_BAUD_RATE) != BAUD_CODES.get(self.old):
+                problems.append(f"{key} (ID {address}) does not report {self.old} baud in Pr5.30")
+        return problems
+
+    def benchmark(self, frames=None):
+        """
+        Round-robin single-register status reads at the current host rate.
+        """
+        frames = self.frames if frames is None else frames
+        keys = self.order
+        errors = 0
+        t0 = time.perf_counter()
+        for i in range(frames):
+            if self._read(keys[i % len(keys)], REG_MOTION_STATUS) is None:
+                errors += 1
+        seconds = time.perf_counter() - t0
+        return {"baudrate": self.controller.baudrate, "frames": frames, "errors": errors,
+                "seconds": seconds, "frames_per_s": frames / seconds if seconds else 0.0}
+
+    def rollback(self, keys=None):
+        """
+        Switches `keys` (default: every drive switched so far) back to the old rate and leaves
+        the host there. Returns the drives that still do not answer at the old rate.
+        """
+        keys = list(self.switched if keys is None else keys)
+        lost = []
+        with self.controller.bus_lock:
+            for key in keys:
+                for baudrate in (self.target, self.old):
+                    self.controller.set_line_rate(baudrate)
+                    self._write_code(key, BAUD_CODES[self.old])
+                if not self._answers(key, self.old):
+                    lost.append(key)
+            self.controller.set_line_rate(self.old)
+        self.switched = [key for key in self.switched if key not in keys]
+        if lost:
+            log.error("Rollback: %s do not answer at %s baud, check the drive panel (Pr5.30).", ", ".join(lost), self.old)
+        else:
+            log.warning("Rolled back to %s baud.", self.old)
+        return lost
+
+    def run(self):
+        """
+        Runs steps 1-4. True if every drive now runs at the target rate.
+        """
+        code = BAUD_CODES.get(self.target)
+        with self.controller.bus_lock:
+            problems = self.check()
+            if problems:
+                log.error("Baud upgrade on %s not possible: %s", self.controller.serial_port, "; ".join(problems))
+                return False
+            self.before = self.benchmark()
+            for key in self.order:
+                self.controller.set_line_rate(self.old)
+                self._write_code(key, code)
+                if not self._answers(key, self.target):
+                    log.error("%s does not answer at %s baud.", key, self.target, extra={"motor": key})
+                    self.rollback(self.switched + [key])
+                    return False
+                self.switched.append(key)
+            self.controller.set_line_rate(self.target)
+            self.after = self.benchmark()
+            if self.after["errors"] or self.after["frames_per_s"] <= self.before["frames_per_s"]:
+                log.error("Verification failed at %s baud: %s", self.target, self.after)
+                self.rollback()
+                return False
+        log.info("%s: %s -> %s baud, %.0f -> %.0f frames/s", self.controller.serial_port, self.old,
+                 self.target, self.before["frames_per_s"], self.after["frames_per_s"])
+        return True
+
+    def save(self):
+        """
+        Stores the drive parameters (and so the new rate) in EEPROM. Call once every line of the
+        rig is upgraded; Hardware.csv is written by the caller.
+        """
+        ok = True
+        with self.controller.bus_lock:
+            for key in self.order:
+                try:
+                    self.controller.motors[key].write_register(REG_SAVE_PARAMS, SAVE_PARAMS_ALL, functioncode=6)
+                except Exception as e:
+                    log.error("[%s] Could not save the parameters: %s", key, e, extra={"motor": key})
+                    ok = False
+        return ok
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    target = next((int(a) for a in args if a.isdigit()), TARGET_BAUDRATE)
+    write = "--write" in args
+    upgrades = []
+    ok = True
+    for port, addresses in bus_map_from_settings().items():
+        upgrade = BaudUpgrade(ServoController(port, BAUDRATE, addresses, broadcast=False), target)
+        if not upgrade.run():
+            ok = False
+            break
+        upgrades.append(upgrade)
+    if not ok:
+        # Hardware.csv holds one BAUDRATE for every line, so all lines go back together
+        for upgrade in upgrades:
+            upgrade.rollback()
+    elif write and all([upgrade.save() for upgrade in upgrades]):
+        write_settings({"BAUDRATE": target}, 'Hardware.csv')
+        print(f"BAUDRATE {target} written to Hardware.csv")
@@ -0,0 +1,194 @@
+#!/usr/bin/env python3
+"""
+Drive Circuit Breakers
+----------------------
+Per-drive health tracking for the Modbus transport, so one unplugged drive does not stall every
+loop that touches it for a full response timeout per register.
+
+    closed  normal operation; BREAKER_THRESHOLD consecutive timed-out operations open the
+            breaker (an operation counts once, however many retried frames it sent)
+    open    the drive is quarantined, calls fail at once without a frame; a background thread
+            re-probes it after PROBE_BACKOFF_MIN s, doubling up to PROBE_BACKOFF_MAX s
+    closed  again after the first successful probe (or any successful call)
+
+Only timeouts count. A drive that answers with an exception or a bad CRC is alive and is
+left to the normal error handling.
+
+Used by driver.ServoController and PYMODBUSCODE; the transport supplies probe(key) -> bool.
+
+Dependencies:
+    - threading, time
+    - async_log
+"""
+
+import threading
+import time
+from collections import namedtuple
+
+from async_log import get_logger
+
+log = get_logger("breaker")
+
+BREAKER_THRESHOLD   = 3          # consecutive timed-out operations before a drive is quarantined
+PROBE_BACKOFF_MIN   = 0.5        # s to the first re-probe
+PROBE_BACKOFF_MAX   = 30.0       # s, upper bound of the doubling backoff
+
+CLOSED = "closed"
+OPEN   = "open"
+
+BreakerEvent = namedtuple("BreakerEvent", "time_ns key state timeouts")
+
+
+class DriveQuarantined(IOError):
+    """
+    Raised instead of sending a frame to a drive whose breaker is open.
+    """
+
+
+class DriveBreaker:
+    def __init__(self, key):
+        self.key = key
+        self.state = CLOSED
+        self.timeouts = 0             # consecutive
+        self.trips = 0
+        self.backoff = PROBE_BACKOFF_MIN
+        self.next_probe = 0.0
+        self.opened_at = None
+        self.quarantined_s = 0.0      # total time spent open
+        self.rejected = 0             # calls failed fast while open
+
+
+class BreakerBoard:
+    def __init__(self, probe, threshold=BREAKER_THRESHOLD, backoff_min=PROBE_BACKOFF_MIN,
+                 backoff_max=PROBE_BACKOFF_MAX):
+        """
+        probe(key) sends one cheap request to the drive, bypassing the breaker, and returns True
+        if it answered.
+        """
+        self.probe = probe
+        self.threshold = threshold
+        self.backoff_min = backoff_min
+        self.backoff_max = backoff_max
+        self.breakers = {}
+        self.subscribers = []
+        self.lock = threading.RLock()
+        self._prober = None
+        self._wake = threading.Event()
+
+    def subscribe(self, callback):
+        """
+        callback(BreakerEvent) is called when a drive is quarantined or released.
+        """
+        self.subscribers.append(callback)
+
+    def breaker(self, key):
+        b = self.breakers.get(key)
+        if b is None:
+            b = self.breakers.setdefault(key, DriveBreaker(key))
+        return b
+
+    # --- Call Path ---
+    def check(self, key):
+        """
+        Raises DriveQuarantined if the drive's breaker is open.
+        """
+        b = self.breaker(key)
+        if b.state == OPEN:
+            b.rejected += 1
+            raise DriveQuarantined(f"Drive {key} is quarantined after {b.timeouts} timeouts")
+
+    def available(self, key):
+        return self.breaker(key).state == CLOSED
+
+    def success(self, key):
+        b = self.breaker(key)
+        if b.timeouts or b.state == OPEN:
+            with self.lock:
+                b.timeouts = 0
+                if b.state == OPEN:
+                    self._close(b)
+
+    def failure(self, key, timeout=True):
+        if not timeout:
+            return
+        b = self.breaker(key)
+        with self.lock:
+            b.timeouts += 1
+            if b.state == CLOSED and b.timeouts >= self.threshold:
+                b.state = OPEN
+                b.trips += 1
+                b.opened_at = time.monotonic()
+                b.backoff = self.backoff_min
+                b.next_probe = b.opened_at + b.backoff
+                event = BreakerEvent(time.monotonic_ns(), key, OPEN, b.timeouts)
+            else:
+                event = None
+        if event is not None:
+            log.warning("[%s] No response %d times in a row, drive quarantined.", key, b.timeouts,
+                        extra={"motor": key})
+            self._notify(event)
+            self._start_prober()
+
+    def _close(self, b):
+        b.state = CLOSED
+        b.quarantined_s += time.monotonic() - b.opened_at
+        b.opened_at = None
+        log.warning("[%s] Drive answers again, quarantine lifted.", b.key, extra={"motor": b.key})
+        self._notify(BreakerEvent(time.monotonic_ns(), b.key, CLOSED, 0))
+
+    def _notify(self, event):
+        for callback in self.subscribers:
+            callback(event)
+
+    # --- Background Re-probe ---
+    def _start_prober(self):
+        with self.lock:
+            if self._prober is None or not self._prober.is_alive():
+                self._prober = threading.Thread(target=self._probe_loop, name="breaker-probe", daemon=True)
+                self._prober.start()
+        self._wake.set()
+
+    def _probe_loop(self):
+        while True:
+            with self.lock:
+                open_breakers = [b for b in self.breakers.values() if b.state == OPEN]
+                if not open_breakers:
+                    self._prober = None
+                    return
+            now = time.monotonic()
+            for b in open_breakers:
+                if now < b.next_probe:
+                    continue
+                try:
+                    ok = self.probe(b.key)
+                except Exception:
+                    ok = False
+                with self.lock:
+                    if b.state != OPEN:
+                        continue
+                    if ok:
+                        b.timeouts = 0
+                        self._close(b)
+                    else:
+                        b.backoff = min(b.backoff * 2, self.backoff_max)
+                        b.next_probe = time.monotonic() + b.backoff
+            with self.lock:
+                pending = [b.next_probe for b in self.breakers.values() if b.state == OPEN]
+            if pending:
+                self._wake.wait(max(0.0, min(pending) - time.monotonic()))
+                self._wake.clear()
+
+    # --- Reporting ---
+    def status(self):
+        now = time.monotonic()
+        return {
+            key: {
+                "state": b.state,
+                "timeouts": b.timeouts,
+                "trips": b.trips,
+                "rejected": b.rejected,
+                "quarantined_s": b.quarantined_s + (now - b.opened_at if b.opened_at else 0.0),
+                "next_probe_s": max(0.0, b.next_probe - now) if b.state == OPEN else None,
+            }
+            for key, b in self.breakers.items()
+        }
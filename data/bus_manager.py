@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Multi-Bus Manager
+-----------------
+Maps every drive to its own RS-485 line and runs one worker thread per serial port, so drives on
+different lines are served at the same time instead of all frames queueing on one port.
+
+Each port gets its own ServoController (with its own broadcast instrument) and a single-thread
+executor; everything for that port runs on its worker, so frames on one line never interleave,
+while the lines themselves run in parallel. A group operation (stop all, read all encoders,
+grouped move) is split per bus, fanned out and gathered, so with two lines it takes about as long
+as the slower line instead of the sum of both.
+
+Port assignment (Hardware.csv):
+    <DRIVE>_PORT     e.g. LIFT_PORT, per-drive override
+    ACC_PORT         accessory drives (lift, drag)
+    SERIAL_PORT      everything else (right, left)
+
+Once a controller is owned by the manager it should only be used through submit()/call(), or
+from code already running on its worker (submit_bus()). The one exception is stop_all(): a stop
+must not queue behind whatever the workers are busy with, so it is sent on a separate thread per
+bus straight to the controller, whose bus lock lets it in between two frames of the worker.
+
+Usage from the command line (prints the bus map and one encoder read per drive):
+    python bus_manager.py
+
+Dependencies:
+    - driver (ServoController)
+    - myCSV (drive addresses and ports)
+    - async_log
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from driver import *
+from async_log import get_logger
+
+log = get_logger("bus_manager")
+
+DRIVE_ADDRESSES = {
+    "right": RIGHT_MOTOR,
+    "left": LEFT_MOTOR,
+    "lift": LIFT_MOTOR,
+    "drag": DRAG_MOTOR,
+}
+ACCESSORY_DRIVES = ("lift", "drag")
+
+
+def bus_map_from_settings(addresses=None, csv_file='Hardware.csv'):
+    """
+    {port: {motor_key: address}} from Hardware.csv.
+    """
+    addresses = DRIVE_ADDRESSES if addresses is None else addresses
+    buses = {}
+    for key, addr in addresses.items():
+        port = read_setting(f"{key.upper()}_PORT", csv_file)
+        if not port and key in ACCESSORY_DRIVES:
+            port = ACC_PORT
+        port = port or SERIAL_PORT
+        buses.setdefault(port, {})[key] = addr
+    return buses
+
+
+class BusManager:
+    def __init__(self, bus_map, baudrate=BAUDRATE, broadcast=True):
+        """
+        bus_map: {serial_port: {motor_key: address}}, e.g. from bus_map_from_settings()
+        """
+        self.controllers = {}
+        self.workers = {}
+        self.port_of = {}
+        self.busy_s = {}
+        self.calls = {}
+        # Priority path for stops, next to the per-port workers (see stop_all)
+        self.stoppers = ThreadPoolExecutor(max_workers=max(1, len(bus_map)), thread_name_prefix="bus-stop")
+        for port, addresses in bus_map.items():
+            self.controllers[port] = ServoController(port, baudrate, addresses, broadcast)
+            self.workers[port] = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"bus-{port}")
+            self.busy_s[port] = 0.0
+            self.calls[port] = 0
+            for key in addresses:
+                if key in self.port_of:
+                    raise ValueError(f"Drive {key!r} is mapped to both {self.port_of[key]} and {port}.")
+                self.port_of[key] = port
+
+    @classmethod
+    def from_settings(cls, addresses=None, baudrate=BAUDRATE, broadcast=True):
+        return cls(bus_map_from_settings(addresses), baudrate, broadcast)
+
+    @property
+    def motor_keys(self):
+        return list(self.port_of)
+
+    def controller(self, motor_key):
+        return self.controllers[self.port_of[motor_key]]
+
+    def split(self, motor_keys=None):
+        """
+        {port: [motor_key, ...]} for the given drives (default: all), in the given order.
+        """
+        keys = self.motor_keys if motor_keys is None else motor_keys
+        by_port = {}
+        for key in keys:
+            by_port.setdefault(self.port_of[key], []).append(key)
+        return by_port
+
+    # --- Workers ---
+    def _timed(self, port, fn, *args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self.busy_s[port] += time.perf_counter() - t0
+            self.calls[port] += 1
+
+    def submit_bus(self, port, fn, *args, **kwargs):
+        """
+        Runs fn(controller, *args, **kwargs) on the worker of `port`. Returns a Future.
+        """
+        return self.workers[port].submit(self._timed, port, fn, self.controllers[port], *args, **kwargs)
+
+    def submit(self, motor_key, method, *args, **kwargs):
+        """
+        Runs controller.<method>(motor_key, *args, **kwargs) on the drive's bus worker.
+        """
+        port = self.port_of[motor_key]
+        bound = getattr(self.controllers[port], method)
+        return self.workers[port].submit(self._timed, port, bound, motor_key, *args, **kwargs)
+
+    def call(self, motor_key, method, *args, **kwargs):
+        return self.submit(motor_key, method, *args, **kwargs).result()
+
+    # --- Fan-out ---
+    def fan_out(self, method, *args, motor_keys=None, **kwargs):
+        """
+        Calls controller.<method>(key, *args, **kwargs) for every drive. Drives on one bus run
+        one after another on its worker, the buses run in parallel. Returns {motor_key: result}.
+        """
+        def run(controller, keys):
+            fn = getattr(controller, method)
+            return {key: fn(key, *args, **kwargs) for key in keys}
+
+        futures = [self.submit_bus(port, run, keys) for port, keys in self.split(motor_keys).items()]
+        results = {}
+        for future in futures:
+            results.update(future.result())
+        return results
+
+    def fan_out_groups(self, method, *args, motor_keys=None, **kwargs):
+        """
+        Calls a group method controller.<method>(keys_on_bus, *args, **kwargs) once per bus.
+        Returns {port: result}.
+        """
+        futures = {
+            port: self.submit_bus(port, lambda c, k: getattr(c, method)(k, *args, **kwargs), keys)
+            for port, keys in self.split(motor_keys).items()
+        }
+        return {port: future.result() for port, future in futures.items()}
+
+    # --- Group Operations ---
+    def read_all_encoders(self, motor_keys=None):
+        return self.fan_out("read_encoder", motor_keys=motor_keys)
+
+    def stop_all(self, motor_keys=None):
+        """
+        Stops every drive; each bus uses its own broadcast/burst stop. True if all buses succeeded.
+        The stops skip the worker queues: each goes out as soon as its line is between two frames.
+        """
+        futures = [self.stoppers.submit(self.controllers[port].stop_group, keys)
+                   for port, keys in self.split(motor_keys).items()]
+        return all([future.result() for future in futures])
+
+    def move_group(self, moves, velocity, acceleration, deceleration, mode="INC"):
+        """
+        Coordinated move across buses: moves is {motor_key: target_steps}. Every bus stages its
+        drives in parallel; only when all buses staged successfully are the triggers fired,
+        again one per bus in parallel. The cross-bus start skew is the thread start-up time.
+        """
+        def stage(controller, keys):
+            return all(controller.stage_pr_move(key, velocity, acceleration, deceleration, moves[key], mode)
+                       for key in keys)
+
+        by_port = self.split(list(moves))
+        staged = {port: self.submit_bus(port, stage, keys) for port, keys in by_port.items()}
+        failed = [port for port, future in staged.items() if not future.result()]
+        if failed:
+            log.error("Staging failed on %s, group move aborted.", ", ".join(failed))
+            return False
+        return all(self.fan_out_groups("trigger_group", motor_keys=list(moves)).values())
+
+    # --- Reporting ---
+    def stats(self):
+        return {port: {"drives": [k for k, p in self.port_of.items() if p == port],
+                       "calls": self.calls[port], "busy_s": self.busy_s[port]}
+                for port in self.controllers}
+
+    def close(self):
+        for worker in self.workers.values():
+            worker.shutdown(wait=True)
+        self.stoppers.shutdown(wait=True)
+        for controller in self.controllers.values():
+            for inst in controller.motors.values():
+                try:
+                    inst.serial.close()
+                except Exception:
+                    pass
+
+
+if __name__ == "__main__":
+    manager = BusManager.from_settings()
+    for port, info in manager.stats().items():
+        print(f"{port}: {', '.join(info['drives'])}")
+    t0 = time.perf_counter()
+    print(manager.read_all_encoders())
+    print(f"Read in {(time.perf_counter() - t0) * 1000:.1f} ms")
+    manager.close()
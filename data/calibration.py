@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Fast Limit-Switch Calibration
+-----------------------------
+Finds the travel limits of an axis by driving into the POT/NOT switches in velocity mode
+instead of stepping 100000 pulses at a time with one-second pauses.
+
+For each limit:
+    1. approach at high speed while polling the IO registers (0x0B11-0x0B12) back to back,
+    2. stop on the switch edge and back off a short incremental distance,
+    3. re-approach at creep speed so the edge is latched with little overshoot.
+
+The found limits are cached in a JSON file together with a fingerprint of the drive
+parameters. Later runs only home on the positive switch (which sets the encoder origin the
+cached limits refer to) and skip the sweep to the negative one, unless the drive was changed or
+re-parameterised.
+
+Dependencies:
+    - driver (ServoController)
+    - async_log
+"""
+
+import hashlib
+import json
+import os
+import time
+
+from driver import *
+from myCSV import *
+from async_log import get_logger
+
+log = get_logger("calibration")
+
+# Bits of the IO inputs word (0x0B11) that read 0 while a limit switch is active
+POT_BIT            = IO_POT_BIT
+NOT_BIT            = IO_NOT_BIT
+
+# Velocity PR direction values (see ServoController.move_velocity_test)
+DIR_POSITIVE       = 0
+DIR_NEGATIVE       = 1
+
+FAST_VELOCITY      = 1500
+CREEP_VELOCITY     = 60
+APPROACH_ACC       = 400
+APPROACH_DEC       = 50       # hard stop, the switch already stops the drive
+BACKOFF_STEPS      = 4000
+APPROACH_TIMEOUT   = 60       # seconds per approach
+BACKOFF_TIMEOUT    = 10
+
+CACHE_FILE         = "limits_cache.json"
+
+# Drive parameters that change the meaning of an encoder count
+FINGERPRINT_REGISTERS = (
+    REG_PULSE_PER_REV,
+    REG_CONTROL_MODE,
+    REG_POS_LIM,
+    REG_NEG_LIM,
+    REG_SLAVE_ID,
+)
+
+
+class LimitCalibrator:
+    def __init__(self, controller, motor_key, cache_file=CACHE_FILE):
+        self.controller = controller
+        self.motor_key = motor_key
+        self.cache_file = cache_file
+
+    # --- Fingerprint / Cache ---
+    def fingerprint(self):
+        """
+        Hash of the drive parameters that define the axis. None if any read fails.
+        """
+        values = []
+        for reg in FINGERPRINT_REGISTERS:
+            val = self.controller.read_register(self.motor_key, reg)
+            if val is None:
+                return None
+            values.append(f"{reg:04X}={val}")
+        address = self.controller.motors[self.motor_key].address
+        raw = f"{address}|" + ",".join(values)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except Exception as e:
+            log.warning("Ignoring unreadable calibration cache %s: %s", self.cache_file, e)
+            return {}
+
+    def _save_cache(self, entry):
+        cache = self._load_cache()
+        cache[self.motor_key] = entry
+        tmp = self.cache_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f, indent=2)
+        os.replace(tmp, self.cache_file)
+
+    def cached_limits(self, fingerprint=None):
+        """
+        Returns (start_pos, end_pos) from the cache if the fingerprint still matches, else None.
+        """
+        entry = self._load_cache().get(self.motor_key)
+        if not entry:
+            return None
+        if fingerprint is None:
+            fingerprint = self.fingerprint()
+        if fingerprint is None or entry.get("fingerprint") != fingerprint:
+            return None
+        return entry["start_pos"], entry["end_pos"]
+
+    # --- Motion Helpers ---
+    def _limit_active(self, mask, snap=None):
+        # Always a fresh read: the edge has to be seen one transaction after it happens
+        snap = snap or self.controller.io_snapshot(self.motor_key, max_age=0)
+        if snap is None:
+            return False
+        return (snap.inputs & mask) == 0
+
+    def _start_velocity(self, velocity, direction):
+        ok = self.controller.write_registers(self.motor_key, MOTION_MODE,
+                                             [0x0002, direction, 0, velocity, APPROACH_ACC, APPROACH_DEC])
+        return ok and self.controller.write_register(self.motor_key, PR_TRIGGER, PR_TRIGGER_START)
+
+    def _stop(self):
+        self.controller.write_register(self.motor_key, PR_TRIGGER, PR_TRIGGER_STOP)
+
+    def _approach(self, velocity, direction, mask, timeout=APPROACH_TIMEOUT):
+        """
+        Runs in velocity mode until the limit bit drops. The IO register is polled back to back,
+        so the reaction time is one Modbus transaction. Returns the number of polls, or None.
+        """
+        if not self._start_velocity(velocity, direction):
+            return None
+        polls = 0
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            polls += 1
+            if self._limit_active(mask):
+                self._stop()
+                return polls
+        self._stop()
+        log.error("[%s] Limit not reached within %s s.", self.motor_key, timeout, extra={"motor": self.motor_key})
+        return None
+
+    def _back_off(self, steps, mask):
+        """
+        Moves incrementally away from the switch and waits until it is released.
+        """
+        self.controller.move_incremental(self.motor_key, CREEP_VELOCITY * 4, APPROACH_ACC, APPROACH_ACC, steps)
+        deadline = time.monotonic() + BACKOFF_TIMEOUT
+        while time.monotonic() < deadline:
+            # Switch and PR state come from the same read
+            snap = self.controller.io_snapshot(self.motor_key, max_age=0)
+            if snap is not None and not self._limit_active(mask, snap) and snap.motion & IO_PR_DONE_BIT:
+                return True
+            time.sleep(0.01)
+        log.error("[%s] Switch still active after back-off.", self.motor_key, extra={"motor": self.motor_key})
+        return False
+
+    def find_limit(self, direction, mask):
+        """
+        Fast approach, back off, slow re-approach. Returns the encoder value at the switch edge.
+        """
+        if self._approach(FAST_VELOCITY, direction, mask) is None:
+            return None
+        away = -BACKOFF_STEPS if direction == DIR_POSITIVE else BACKOFF_STEPS
+        if not self._back_off(away, mask):
+            return None
+        if self._approach(CREEP_VELOCITY, direction, mask) is None:
+            return None
+        return self.controller.read_encoder(self.motor_key)
+
+    # --- Calibration ---
+    def home(self):
+        """
+        Finds the positive limit and zeroes the encoder on it. Returns the encoder value read
+        back afterwards (0), None if the switch was not found.
+        """
+        if self.find_limit(DIR_POSITIVE, POT_BIT) is None:
+            return None
+        self.controller.reset_encoder(self.motor_key)
+        return self.controller.read_encoder(self.motor_key)
+
+    def calibrate(self, force=False):
+        """
+        Returns (start_pos, end_pos). The encoder is zeroed on the positive limit, end_pos is the
+        negative limit relative to it, as the old sett() routine stored them.
+        Uses the cached result when the drive fingerprint is unchanged unless force is True; the
+        axis is still homed first, as the cached values only hold relative to that origin.
+        """
+        fingerprint = self.fingerprint()
+        if not force:
+            cached = self.cached_limits(fingerprint)
+            if cached is not None:
+                if self.home() is None:
+                    log.error("[%s] Homing failed, cached limits not used.", self.motor_key, extra={"motor": self.motor_key})
+                    return None
+                log.info("[%s] Homed, using cached limits %s.", self.motor_key, cached, extra={"motor": self.motor_key})
+                return cached
+
+        t0 = time.monotonic()
+        start_pos = self.home()
+        if start_pos is None:
+            return None
+        end_pos = self.find_limit(DIR_NEGATIVE, NOT_BIT)
+        if end_pos is None:
+            return None
+
+        elapsed = time.monotonic() - t0
+        log.info("[%s] Calibrated limits %s..%s in %.1f s.", self.motor_key, start_pos, end_pos, elapsed,
+                 extra={"motor": self.motor_key, "duration_s": elapsed})
+        if fingerprint is not None:
+            self._save_cache({
+                "fingerprint": fingerprint,
+                "start_pos": start_pos,
+                "end_pos": end_pos,
+                "calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "duration_s": round(elapsed, 2),
+            })
+        return start_pos, end_pos
+
+
+def calibrate_limits(controller, motor_key, force=False, csv_file="multix_data.csv"):
+    """
+    Calibrates (or loads) the limits of motor_key and stores them as START_POS / END_POS.
+    """
+    result = LimitCalibrator(controller, motor_key).calibrate(force=force)
+    if result is None:
+        log.error("[%s] Calibration failed.", motor_key, extra={"motor": motor_key})
+        return None
+    start_pos, end_pos = result
+    update_csv("START_POS", start_pos, csv_file)
+    update_csv("END_POS", end_pos, csv_file)
+    return result
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+"""
+Append-Only Cycle Journal
+-------------------------
+Durable per-cycle record of an endurance run, replacing the CC_COMPLETE rewrite of
+multix_data.csv as the source of truth for progress.
+
+File format (one text line per record, each ending in a CRC32 of the rest of the line):
+    H,<task>,<created_ns>,<crc>                        header, first line of the file
+    S,<count>,<time_ns>,<crc>                          snapshot written by compaction
+    R,<index>,<start_ns>,<end_ns>,<enc_start>,<enc_end>,<result>,<crc>
+
+Lines are only ever appended. Writes are flushed per record and fsync'd in batches
+(every FSYNC_EVERY records or FSYNC_INTERVAL seconds), so a crash loses at most one batch
+and a torn last line is detected by its CRC and ignored on recovery.
+
+Compaction rewrites the file as header + snapshot + the last KEEP_RECORDS records through a
+temporary file and os.replace, so the journal stays bounded without a window where the count
+could be lost.
+"""
+
+import os
+import time
+import zlib
+from collections import deque
+
+from async_log import get_logger
+
+log = get_logger("cycle_journal")
+
+JOURNAL_FILE   = "cycle_journal.log"
+FSYNC_EVERY    = 20        # records per fsync batch
+FSYNC_INTERVAL = 2.0       # seconds, upper bound on unsynced data
+MAX_BYTES      = 4 * 1024 * 1024
+KEEP_RECORDS   = 1000      # records kept after compaction
+
+
+def _line(fields):
+    body = ",".join(str(f) for f in fields)
+    return f"{body},{zlib.crc32(body.encode()):08x}\n"
+
+
+def _parse(line):
+    """
+    Returns the list of fields of a valid line, None for a torn or corrupted one.
+    """
+    line = line.rstrip("\r\n")
+    body, sep, crc = line.rpartition(",")
+    if not sep:
+        return None
+    try:
+        if int(crc, 16) != zlib.crc32(body.encode()):
+            return None
+    except ValueError:
+        return None
+    return body.split(",")
+
+
+class CycleJournal:
+    def __init__(self, task, path=JOURNAL_FILE, fsync_every=FSYNC_EVERY,
+                 fsync_interval=FSYNC_INTERVAL, max_bytes=MAX_BYTES):
+        """
+        task: name of the running test; a journal written for another task is rotated away.
+        """
+        self.task = str(task).replace(",", " ")
+        self.path = path
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+
+        self.count = 0             # completed ("ok") cycles
+        self.last_index = 0
+        self.records = deque(maxlen=KEEP_RECORDS)  # tail of recent records, used by compaction
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    # --- Recovery ---
+    def recover(self):
+        """
+        Reads the journal and returns the recovered completed-cycle count. Opens it for append.
+        """
+        header_ok = False
+        valid_bytes = 0
+        if os.path.exists(self.path):
+            with open(self.path, "r", newline="") as f:
+                for raw in f:
+                    fields = _parse(raw)
+                    if fields is None:
+                        # Torn tail from a crash: everything after it is dropped
+                        break
+                    valid_bytes += len(raw.encode())
+                    kind = fields[0]
+                    if kind == "H":
+                        header_ok = fields[1] == self.task
+                        if not header_ok:
+                            break
+                    elif kind == "S":
+                        self.count = int(fields[1])
+                        self.last_index = self.count
+                    elif kind == "R":
+                        index = int(fields[1])
+                        self.last_index = max(self.last_index, index)
+                        if fields[6] == "ok":
+                            self.count = max(self.count, index)
+                        self.records.append(fields[1:7])
+
+        if not header_ok:
+            if valid_bytes:
+                log.warning("Journal belongs to another task.")
+                self.rotate()
+            self.count = 0
+            self.last_index = 0
+            self.records.clear()
+            self._file = open(self.path, "w", newline="")
+            self._file.write(_line(["H", self.task, time.time_ns()]))
+            self.sync()
+        else:
+            # Cut a torn tail so new records are not appended after garbage
+            with open(self.path, "r+b") as f:
+                f.truncate(valid_bytes)
+            self._file = open(self.path, "a", newline="")
+        return self.count
+
+    def rotate(self):
+        """
+        Moves the current journal aside (path.<timestamp>) so the next recover() starts at 0.
+        """
+        if self._file is not None:
+            self.close()
+        if os.path.exists(self.path):
+            rotated = f"{self.path}.{time.strftime('%Y%m%d-%H%M%S')}"
+            os.replace(self.path, rotated)
+            log.info("Journal moved to %s.", rotated)
+
+    def recent(self, seconds):
+        """
+        Completed cycles that ended within `seconds` of the last journaled cycle.
+        """
+        ok = [int(rec[2]) for rec in self.records if rec[5] == "ok"]
+        if not ok:
+            return 0
+        last = max(ok)
+        return sum(1 for end_ns in ok if end_ns >= last - seconds * 1e9)
+
+    # --- Appending ---
+    def append(self, index, start_ns, end_ns, enc_start, enc_end, result="ok"):
+        """
+        Appends one cycle record. Data is flushed immediately and fsync'd in batches.
+        """
+        if self._file is None:
+            self.recover()
+        fields = [index, start_ns, end_ns,
+                  "" if enc_start is None else enc_start,
+                  "" if enc_end is None else enc_end,
+                  result]
+        self._file.write(_line(["R"] + fields))
+        self._file.flush()
+        self.last_index = max(self.last_index, index)
+        if result == "ok":
+            self.count = max(self.count, index)
+        self.records.append([str(f) for f in fields])
+
+        self._unsynced += 1
+        if (self._unsynced >= self.fsync_every or
+                time.monotonic() - self._last_sync >= self.fsync_interval):
+            self.sync()
+            if self._file.tell() > self.max_bytes:
+                self.compact()
+
+    def sync(self):
+        if self._file is None:
+            return
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    # --- Compaction ---
+    def compact(self):
+        """
+        Rewrites the journal as header + snapshot + recent records. Atomic via os.replace.
+        """
+        self.sync()
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", newline="") as f:
+            f.write(_line(["H", self.task, time.time_ns()]))
+            f.write(_line(["S", self.count, time.time_ns()]))
+            for rec in self.records:
+                f.write(_line(["R"] + rec))
+            f.flush()
+            os.fsync(f.fileno())
+        self._file.close()
+        os.replace(tmp, self.path)
+        self._fsync_dir()
+        self._file = open(self.path, "a", newline="")
+
+    def _fsync_dir(self):
+        # Makes the rename durable; not available on Windows, where os.replace is enough
+        try:
+            fd = os.open(os.path.dirname(os.path.abspath(self.path)), os.O_RDONLY)
+        except (OSError, AttributeError):
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+    def close(self):
+        if self._file is not None:
+            self.sync()
+            self._file.close()
+            self._file = None
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Drive Discovery
+---------------
+Finds every drive on the serial ports by sweeping slave IDs 1-247 (optionally at several baud
+rates), identifies the drive family from signature registers and writes the result to
+Hardware.csv, so a new rig does not need its addresses found by trial and error.
+
+Per ID one single-register read of REG_SLAVE_ID (0x053F) is sent with a timeout sized to the
+request, the reply and the drive turnaround (about 16 ms at 38400 baud instead of 1 s), so a
+full sweep of one port takes a few seconds.
+
+Families:
+    EL7-RS   0x053F reads back the drive's own ID, PPR at REG_PULSE_PER_REV (0x0017)
+    CS-RS    answers, but not with its ID at 0x053F; PPR at 0x0001 (PYMODBUSCODE register map)
+    unknown  answers, neither signature matches
+
+Early exits:
+    - IDs 1-16 (factory and usual rig addresses) are tried first; the sweep of a port stops
+      once `expected` drives were found
+    - GARBAGE_LIMIT corrupted replies before any valid one mean the baud rate is wrong, the rest
+      of that rate is skipped
+    - a baud rate that found drives ends the search on that port (one rate per line)
+
+Usage:
+    python discovery.py [port ...] [--all-bauds] [--expect N] [--write]
+
+Dependencies:
+    - minimalmodbus, pyserial
+    - driver (register map, frame_seconds)
+    - myCSV (write_settings)
+    - async_log
+"""
+
+import sys
+import time
+from collections import namedtuple
+
+import minimalmodbus
+import serial.tools.list_ports
+
+from driver import *
+from bus_manager import ACCESSORY_DRIVES
+from async_log import get_logger
+
+log = get_logger("discovery")
+
+DISCOVERY_BAUDRATES = (38400, 9600, 19200, 57600, 115200)
+ID_RANGE        = range(1, 248)
+LIKELY_IDS      = range(1, 17)
+GARBAGE_LIMIT   = 3            # corrupted replies before a baud rate is given up
+CS_PPR_REGISTER = 0x0001       # PPR on the CS-RS register map (PYMODBUSCODE REGISTER_PULSE_PER_REV)
+PPR_RANGE       = (200, 100000)
+
+ROLES = ("right", "left", "lift", "drag")
+
+Drive = namedtuple("Drive", "port baudrate slave_id family ppr")
+
+
+def probe_timeout(baudrate):
+    """
+    Reply time of a one-register read: request (8 bytes), reply (7 bytes) and drive turnaround.
+    """
+    return frame_seconds(8, baudrate) + frame_seconds(7, baudrate) + DRIVE_TURNAROUND
+
+
+def serial_ports():
+    return [info.device for info in serial.tools.list_ports.comports()]
+
+
+class DriveDiscovery:
+    def __init__(self, ports=None, baudrates=(BAUDRATE,), ids=ID_RANGE, expected=None):
+        self.ports = list(ports) if ports else serial_ports()
+        self.baudrates = list(baudrates)
+        self.ids = list(ids)
+        self.expected = expected
+        self.drives = []
+        self.stats = {}              # port -> {"probes", "seconds", "baudrate"}
+
+    def _instrument(self, port, slave_id, baudrate):
+        inst = minimalmodbus.Instrument(port, slave_id)
+        inst.serial.baudrate = baudrate
+        inst.serial.timeout = probe_timeout(baudrate)
+        return inst
+
+    @staticmethod
+    def _read(inst, reg):
+        """
+        ("ok", value), ("exception", None) for an exception reply, ("silent", None) or
+        ("garbage", None) for a corrupted reply.
+        """
+        try:
+            return "ok", inst.read_register(reg)
+        except SLAVE_ERRORS:
+            return "exception", None
+        except NO_RESPONSE_ERRORS:
+            return "silent", None
+        except Exception:
+            return "garbage", None
+
+    def identify(self, inst, slave_id, id_value):
+        if id_value == slave_id:
+            status, ppr = self._read(inst, REG_PULSE_PER_REV)
+            return "EL7-RS", ppr if status == "ok" else None
+        status, ppr = self._read(inst, CS_PPR_REGISTER)
+        if status == "ok" and PPR_RANGE[0] <= ppr <= PPR_RANGE[1]:
+            return "CS-RS", ppr
+        return "unknown", None
+
+    def _order(self):
+        likely = [i for i in LIKELY_IDS if i in self.ids]
+        return likely + [i for i in self.ids if i not in likely]
+
+    def sweep_port(self, port):
+        t0 = time.monotonic()
+        probes = 0
+        found = []
+        used = None
+        for baudrate in self.baudrates:
+            garbage = 0
+            for slave_id in self._order():
+                try:
+                    inst = self._instrument(port, slave_id, baudrate)
+                except Exception as e:
+                    log.error("%s: cannot open (%s)", port, e)
+                    self.stats[port] = {"probes": probes, "seconds": time.monotonic() - t0, "baudrate": None}
+                    return found
+                probes += 1
+                status, value = self._read(inst, REG_SLAVE_ID)
+                if status == "silent":
+                    continue
+                if status == "garbage":
+                    garbage += 1
+                    if garbage >= GARBAGE_LIMIT and not found:
+                        log.warning("%s: corrupted replies at %s baud, trying the next rate.", port, baudrate)
+                        break
+                    continue
+                family, ppr = self.identify(inst, slave_id, value)
+                drive = Drive(port, baudrate, slave_id, family, ppr)
+                log.info("%s: ID %s at %s baud, %s, PPR %s", port, slave_id, baudrate, family, ppr)
+                found.append(drive)
+                if self.expected and len(found) >= self.expected:
+                    break
+            if found:
+                used = baudrate
+                break
+        self.stats[port] = {"probes": probes, "seconds": time.monotonic() - t0, "baudrate": used}
+        return found
+
+    def run(self):
+        self.drives = []
+        for port in self.ports:
+            self.drives.extend(self.sweep_port(port))
+        return self.drives
+
+
+def assign_roles(drives, roles=ROLES):
+    """
+    {role: Drive} in port/ID order: the lowest ID becomes "right", the next "left", ...
+    """
+    ordered = sorted(drives, key=lambda d: (d.port, d.slave_id))
+    return dict(zip(roles, ordered))
+
+
+def write_mapping(drives, roles=ROLES, csv_file='Hardware.csv'):
+    """
+    Writes the discovered addresses, ports and baud rate to the hardware config. Drives on
+    another port than the traction drives get a <ROLE>_PORT entry (see bus_manager).
+    Returns the settings written.
+    """
+    mapping = assign_roles(drives, roles)
+    if not mapping:
+        log.warning("No drives found, hardware config left unchanged.")
+        return {}
+    main = mapping.get("right") or next(iter(mapping.values()))
+    settings = {"SERIAL_PORT": main.port, "BAUDRATE": main.baudrate}
+    accessory = mapping.get("lift") or mapping.get("drag")
+    settings["ACC_PORT"] = accessory.port if accessory else main.port
+    for role, drive in mapping.items():
+        settings[f"{role.upper()}_MOTOR"] = drive.slave_id
+        default = settings["ACC_PORT"] if role in ACCESSORY_DRIVES else settings["SERIAL_PORT"]
+        if drive.port != default:
+            settings[f"{role.upper()}_PORT"] = drive.port
+        elif read_setting(f"{role.upper()}_PORT", csv_file):
+            settings[f"{role.upper()}_PORT"] = ""     # clear an override from an earlier rig
+    if len({d.baudrate for d in mapping.values()}) > 1:
+        log.warning("Drives use different baud rates, only one BAUDRATE can be stored.")
+    if write_settings(settings, csv_file):
+        log.info("Wrote %s to %s", settings, csv_file)
+    return settings
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    bauds = DISCOVERY_BAUDRATES if "--all-bauds" in args else (BAUDRATE,)
+    expected = None
+    if "--expect" in args:
+        expected = int(args[args.index("--expect") + 1])
+    ports = [a for i, a in enumerate(args) if not a.startswith("--") and (i == 0 or args[i - 1] != "--expect")]
+    discovery = DriveDiscovery(ports or None, bauds, expected=expected)
+    drives = discovery.run()
+    for port, info in discovery.stats.items():
+        print(f"{port}: {info['probes']} probes in {info['seconds']:.1f} s")
+    for role, drive in assign_roles(drives).items():
+        print(f"{role}: {drive}")
+    if "--write" in args:
+        write_mapping(drives)
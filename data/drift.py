@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Position Drift and Repeatability Analyzer
+-----------------------------------------
+Tracks where the axis really ends up at both endpoints of every endurance cycle and flags the
+test as degraded as soon as the positioning gets worse, without rescanning history.
+
+Per cycle and endpoint ("out", "back") the analyzer takes the commanded position
+(REG_PROFILE_POSITION, 0x1012) and the encoder feedback (REG_FEEDBACK_POSITION, 0x1014):
+    error     = feedback - commanded      (positioning error at the stop)
+    position  = feedback                  (where the axis actually stops)
+
+For each of these series it keeps exponentially weighted running sums (forgetting factor
+FORGET, about 1/(1-FORGET) cycles of memory), updated in vectorised NumPy blocks. The sums are
+taken relative to the first sample: raw positions around 1e9 steps would cancel the variance
+to zero in double precision.
+    repeatability   3 sigma of the stop position
+    drift           least-squares slope of the error, in steps per 1000 cycles
+    outliers        samples more than OUTLIER_SIGMA from the running mean (checked against the
+                    statistics before the sample is merged)
+
+Dependencies:
+    - numpy
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+FORGET          = 0.999      # weight of history per new cycle
+OUTLIER_SIGMA   = 4.0
+MIN_CYCLES      = 30         # no verdict before this many cycles
+MIN_DRIFT_CYCLES = 200       # a slope over fewer cycles is mostly noise
+REPEAT_LIMIT    = 50.0       # steps, 3 sigma of the stop position
+DRIFT_LIMIT     = 20.0       # steps per 1000 cycles
+OUTLIER_LIMIT   = 0.01       # share of recent cycles that may be outliers
+
+ENDPOINTS = ("out", "back")
+
+DriftStatus = namedtuple("DriftStatus", "cycle degraded reasons")
+
+
+class RunningFit:
+    """
+    Exponentially weighted mean, variance and regression slope of y over x. x and y are
+    summed as offsets from the first sample (x0, y0).
+    """
+
+    def __init__(self, forget=FORGET):
+        self.forget = forget
+        self.x0 = self.y0 = None
+        self.w = 0.0
+        self.sx = self.sy = self.sxx = self.sxy = self.syy = 0.0
+        self.n = 0
+
+    def update(self, x, y):
+        x = np.asarray(x, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        k = len(y)
+        if k == 0:
+            return
+        if self.x0 is None:
+            self.x0, self.y0 = float(x[0]), float(y[0])
+        x = x - self.x0
+        y = y - self.y0
+        # Newest sample gets weight 1, older ones forget^age
+        weights = self.forget ** np.arange(k - 1, -1, -1, dtype=np.float64)
+        decay = self.forget ** k
+        self.w = decay * self.w + weights.sum()
+        self.sx = decay * self.sx + weights @ x
+        self.sy = decay * self.sy + weights @ y
+        self.sxx = decay * self.sxx + weights @ (x * x)
+        self.sxy = decay * self.sxy + weights @ (x * y)
+        self.syy = decay * self.syy + weights @ (y * y)
+        self.n += k
+
+    def mean(self):
+        return float(self.y0 + self.sy / self.w) if self.w else 0.0
+
+    def std(self):
+        if not self.w:
+            return 0.0
+        mean = self.sy / self.w
+        return float(np.sqrt(max(self.syy / self.w - mean * mean, 0.0)))
+
+    def slope(self):
+        if not self.w:
+            return 0.0
+        mx = self.sx / self.w
+        var_x = self.sxx / self.w - mx * mx
+        if var_x <= 0:
+            return 0.0
+        return float((self.sxy / self.w - mx * self.sy / self.w) / var_x)
+
+
+class DriftAnalyzer:
+    def __init__(self, forget=FORGET, repeat_limit=REPEAT_LIMIT, drift_limit=DRIFT_LIMIT,
+                 outlier_limit=OUTLIER_LIMIT, outlier_sigma=OUTLIER_SIGMA, min_cycles=MIN_CYCLES):
+        self.error = {e: RunningFit(forget) for e in ENDPOINTS}
+        self.position = {e: RunningFit(forget) for e in ENDPOINTS}
+        self._outlier_w = {e: 0.0 for e in ENDPOINTS}
+        self._outlier_f = {e: 0.0 for e in ENDPOINTS}
+        self.outliers = {e: 0 for e in ENDPOINTS}
+        self.forget = forget
+        self.repeat_limit = repeat_limit
+        self.drift_limit = drift_limit
+        self.outlier_limit = outlier_limit
+        self.outlier_sigma = outlier_sigma
+        self.min_cycles = min_cycles
+        self.last_cycle = 0
+        self.status = DriftStatus(0, False, ())
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        """
+        callback(DriftStatus) is called whenever the degraded verdict changes.
+        """
+        self.subscribers.append(callback)
+
+    # --- Input ---
+    def add(self, cycle, out=None, back=None):
+        """
+        One cycle: out/back are (commanded, feedback) pairs, None if not read.
+        """
+        pairs = {"out": out, "back": back}
+        for endpoint in ENDPOINTS:
+            if pairs[endpoint] is not None:
+                commanded, feedback = pairs[endpoint]
+                self.add_many(endpoint, [cycle], [commanded], [feedback])
+        return self.check(cycle)
+
+    def add_many(self, endpoint, cycles, commanded, feedback):
+        """
+        Vectorised update of one endpoint with a block of cycles (e.g. a backfill from the
+        metrics store). Returns the cycle numbers flagged as outliers.
+        """
+        cycles = np.asarray(cycles, dtype=np.float64)
+        feedback = np.asarray(feedback, dtype=np.float64)
+        error = feedback - np.asarray(commanded, dtype=np.float64)
+
+        fit = self.position[endpoint]
+        flagged = np.zeros(len(cycles), dtype=bool)
+        if fit.n >= self.min_cycles:
+            sigma = max(fit.std(), 1.0)
+            flagged = np.abs(feedback - fit.mean()) > self.outlier_sigma * sigma
+        # EW share of outlier cycles, same memory as the fits
+        k = len(cycles)
+        weights = self.forget ** np.arange(k - 1, -1, -1, dtype=np.float64)
+        decay = self.forget ** k
+        self._outlier_w[endpoint] = decay * self._outlier_w[endpoint] + weights.sum()
+        self._outlier_f[endpoint] = decay * self._outlier_f[endpoint] + weights @ flagged
+        self.outliers[endpoint] += int(flagged.sum())
+
+        # Outliers are counted but kept out of the fits so one bad stop does not mask drift
+        keep = ~flagged
+        fit.update(cycles[keep], feedback[keep])
+        self.error[endpoint].update(cycles[keep], error[keep])
+        if k:
+            self.last_cycle = max(self.last_cycle, int(cycles.max()))
+        return cycles[flagged].astype(np.int64)
+
+    # --- Verdict ---
+    def outlier_rate(self, endpoint):
+        w = self._outlier_w[endpoint]
+        return self._outlier_f[endpoint] / w if w else 0.0
+
+    def repeatability(self, endpoint):
+        return 3.0 * self.position[endpoint].std()
+
+    def drift(self, endpoint):
+        """
+        Error drift in steps per 1000 cycles.
+        """
+        return self.error[endpoint].slope() * 1000.0
+
+    def check(self, cycle=None):
+        reasons = []
+        for endpoint in ENDPOINTS:
+            if self.position[endpoint].n < self.min_cycles:
+                continue
+            rep = self.repeatability(endpoint)
+            if rep > self.repeat_limit:
+                reasons.append(f"{endpoint} repeatability {rep:.1f} > {self.repeat_limit:g} steps")
+            drift = self.drift(endpoint)
+            if self.error[endpoint].n >= MIN_DRIFT_CYCLES and abs(drift) > self.drift_limit:
+                reasons.append(f"{endpoint} drift {drift:+.1f} steps/1000 cycles")
+            rate = self.outlier_rate(endpoint)
+            if rate > self.outlier_limit:
+                reasons.append(f"{endpoint} outliers {rate:.1%} of recent cycles")
+        degraded = bool(reasons)
+        changed = degraded != self.status.degraded
+        self.status = DriftStatus(cycle if cycle is not None else self.last_cycle, degraded, tuple(reasons))
+        if changed:
+            for callback in self.subscribers:
+                callback(self.status)
+        return self.status
+
+    def summary(self):
+        endpoints = {
+            endpoint: {
+                "cycles": self.position[endpoint].n,
+                "repeatability": self.repeatability(endpoint),
+                "mean_error": self.error[endpoint].mean(),
+                "drift_per_1000": self.drift(endpoint),
+                "outliers": self.outliers[endpoint],
+            }
+            for endpoint in ENDPOINTS
+        }
+        return {"endpoints": endpoints, "degraded": self.status.degraded, "reasons": list(self.status.reasons)}
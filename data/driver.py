@@ -10,14 +10,26 @@ Refer to the datasheet (e.g. :contentReference[oaicite:1]{index=1}) for complete
 
 Dependencies:
     - minimalmodbus
-    - math, time
+    - time
     - myCSV (for CSV update functions; adjust as needed)
+    - units (precomputed step/speed conversion per drive)
+    - async_log (JSON logging off the calling thread)
 """
 
 import minimalmodbus
-import math
+import serial
+import serial.tools.list_ports
+import threading
 import time
+from collections import namedtuple
 from myCSV import *  # Assumes you have a myCSV module for logging positions
+from units import UnitConverter
+from scheduler import sleep_until
+from breaker import BreakerBoard, DriveQuarantined
+from retry import RetryPolicy, RetryStats, IDEMPOTENT, COMMAND
+from async_log import get_logger
+
+log = get_logger("driver")
 
 # --- Register Definitions (Holding Registers as per datasheet) ---
 
@@ -40,6 +52,9 @@ REG_DRIVER_TEMPERATURE =0x0B0B
 REG_POS_LIM            =0x0401
 REG_NEG_LIM            =0X0403
 REG_ALARM_STATUS       =0x041B
+REG_FOLLOWING_ERROR    = 0x1010    # Position following error, low word (high word at +1)
+REG_PROFILE_POSITION   = 0x1012    # Commanded position, low word (high word at +1)
+REG_FEEDBACK_POSITION  = 0x1014    # Encoder position, low word (high word at +1)
 
 
 # Absolute PR Mode Registers
@@ -53,41 +68,532 @@ PR_TRIGGER         = 0x6002    # Write 0x10 for ABS mode trigger
 MOTION_MODE         =0x6200     #WRITE 0X001 FOR ABS, 0X0041 FOR INC, 0X002 FOR VELOCITY
 REG_POT             =0x0401     #POSITIVE LIMIT REGISTER
 REG_NOT             =0x0403     #NEGATIVE LIMIT REGISTER
+
+# Group (synchronised) moves
+BROADCAST_ADDRESS   = 0         # Modbus broadcast slave id, drives execute but never answer
+PR_TRIGGER_START    = 0x10      # Trigger PR0
+PR_TRIGGER_STOP     = 0x40      # Emergency stop of the running PR
+
+
+# Gearbox ratio of each drive (Hardware.csv)
+DRIVE_GEARS = {
+    "right": RIGHT_GEAR,
+    "left": LEFT_GEAR,
+    "lift": LIFT_GEAR,
+    "drag": DRAG_GEAR,
+}
+
+
+# PR path table: path n occupies 0x6200 + 8n .. +7 (control, pos H, pos L, vel, acc, dec, dwell, special)
+PR_PATH_BASE        = 0x6200
+PR_PATH_STRIDE      = 8
+PR_PATH_COUNT       = 16
+PR_CTRL_POSITION    = 0x0001
+PR_CTRL_VELOCITY    = 0x0002
+PR_CTRL_INTERRUPT   = 1 << 4
+PR_CTRL_OVERLAP     = 1 << 5    # start the next path before this one decelerates to zero
+PR_CTRL_RELATIVE    = 1 << 6
+PR_CTRL_JUMP        = 1 << 14   # continue with the path in bits 8-11 when done
+
+# Digital IO: inputs word and motion status word are adjacent, one read covers both
+REG_IO_INPUTS       = 0x0B11    # bit0 POT, bit1 NOT (0 = switch active)
+REG_IO_MOTION       = 0x0B12    # bit1 PR complete
+IO_POT_BIT          = 0x0001
+IO_NOT_BIT          = 0x0002
+IO_PR_DONE_BIT      = 0x0002
+IO_FRESHNESS        = 0.005     # s a snapshot is reused by check_pot/check_not/check_pr
+
+IOSnapshot = namedtuple("IOSnapshot", "time_ns inputs motion")
+
+# Single-flight reads: a read joins an identical one (same drive, function, register range) still
+# on the wire if it started at most READ_TOLERANCE seconds ago, instead of sending its own frame
+READ_TOLERANCE      = 0.01
+
+# Input functions (Pr4.xx): DIn is configured at 0x0401 + 2(n-1); DI1/DI2 are POT/NOT here
+REG_DI_FUNCTION     = 0x0401
+DI_FUNC_CTRG        = 0x20      # PR trigger command
+DI_NORMALLY_CLOSED  = 0x80      # added to a function code for an NC contact
+
+# PR trigger and S-code output
+REG_IO_TRIGGER_MODE = 0x601A    # 2 = PR paths start on the CTRG input edge
+IO_TRIGGER_MODE     = 2
+REG_S_CODE          = 0x601C    # S-code currently output by the drive
+REG_S_CODE_BASE     = 0x6030    # path n: low byte start code, high byte end code
+
+# Setpoint streaming
+STREAM_POSITION     = "position"
+STREAM_VELOCITY     = "velocity"
+STREAM_MAX_RATE     = 200       # Hz, upper bound regardless of bus speed
+BITS_PER_CHAR       = 11        # RTU character: start + 8 data + parity/stop + stop
+
+# Response timeout, derived from the line speed instead of a fixed second
+DRIVE_TURNAROUND    = 0.01      # s the drive may take before it starts answering
+TIMEOUT_REGISTERS   = 32        # largest block the timeout has to cover
+NO_RESPONSE_ERRORS  = (getattr(minimalmodbus, "NoResponseError", IOError),)
+# Exception replies: the drive answered, repeating the frame gives the same answer
+SLAVE_ERRORS        = (minimalmodbus.SlaveReportedException,) if hasattr(minimalmodbus, "SlaveReportedException") else ()
+
+# Lost serial port (USB adapter unplugged or re-enumerated)
+PORT_ERRORS         = (serial.SerialException, FileNotFoundError)
+RECONNECT_TIMEOUT   = 120.0     # s to wait for the adapter to come back
+RECONNECT_POLL      = 1.0       # s between discovery attempts
+# Line speed: Pr5.30 at REG_BAUD_RATE holds a code, not the rate itself
+BAUD_CODES          = {2400: 0, 4800: 1, 9600: 2, 19200: 3, 38400: 4, 57600: 5, 115200: 6}
+REG_SAVE_PARAMS     = 0x1801    # write SAVE_PARAMS_ALL to store all parameters in EEPROM
+SAVE_PARAMS_ALL     = 0x2211
+# Command registers are never retried, repeated after a reconnect or replayed from the shadow cache
+# (a baud-rate write that is repeated at the wrong line speed would be lost or misread)
+COMMAND_REGISTERS   = {PR_TRIGGER, REG_CONTROL_WORD, REG_EMERGENCY_STOP, REG_BAUD_RATE, REG_SAVE_PARAMS}
+# Parameters that are read back after every write (PR path table, PPR, modes)
+CRITICAL_REGISTERS  = (set(range(PR_PATH_BASE, PR_PATH_BASE + PR_PATH_STRIDE * PR_PATH_COUNT))
+                       | {REG_PULSE_PER_REV, REG_CONTROL_MODE, REG_IO_TRIGGER_MODE})
+# Configuration parameters replayed from the shadow cache after a reconnect. State registers
+# (encoder reset, outputs) are left out: replaying them would act on the drive.
+SHADOW_REGISTERS    = (CRITICAL_REGISTERS
+                       | set(range(REG_DI_FUNCTION, REG_DI_FUNCTION + 16))     # DI1..DI8 functions
+                       | set(range(REG_S_CODE_BASE, REG_S_CODE_BASE + PR_PATH_COUNT))
+                       | {REG_JOG_VELOCITY, REG_JOG_ACCELERATION})
+
+
+def frame_seconds(n_bytes, baudrate):
+    """
+    Line time of an RTU frame of n_bytes, including the 3.5 character inter-frame gap.
+    """
+    return (n_bytes + 3.5) * BITS_PER_CHAR / baudrate
+
+
+def response_timeout(baudrate, registers=TIMEOUT_REGISTERS):
+    """
+    Longest a healthy drive can take to answer: the largest request (a write of `registers`
+    registers) and the largest reply (a read of as many) on the line, plus the drive turnaround.
+    """
+    return (frame_seconds(9 + 2 * registers, baudrate) + frame_seconds(5 + 2 * registers, baudrate)
+            + DRIVE_TURNAROUND)
+
+
+def register_class(reg_addr, count=1):
+    """
+    Idempotency class of a write to reg_addr..reg_addr+count-1 (retry.IDEMPOTENT or COMMAND).
+    """
+    return COMMAND if COMMAND_REGISTERS.intersection(range(reg_addr, reg_addr + count)) else IDEMPOTENT
+
+
+def usb_serial_number(port):
+    """
+    USB serial number of the adapter behind `port`, None for non-USB ports.
+    """
+    for info in serial.tools.list_ports.comports():
+        if info.device == port:
+            return info.serial_number
+    return None
+
+
+def find_port(serial_number):
+    """
+    Current device name of the USB adapter with `serial_number`, None while it is absent.
+    """
+    for info in serial.tools.list_ports.comports():
+        if serial_number and info.serial_number == serial_number:
+            return info.device
+    return None
+
+
+def split_steps(value):
+    """
+    Split a signed 32-bit step count into the (msb, lsb) register pair used by the PR registers.
+    """
+    steps = int(value) & 0xFFFFFFFF
+    return (steps >> 16) & 0xFFFF, steps & 0xFFFF
+
+
+def combine_words(low, high):
+    """
+    Signed 32-bit value from a (low, high) register pair, as getPositionError() reads it.
+    """
+    val = ((high & 0xFFFF) << 16) | (low & 0xFFFF)
+    if val & (1 << 31):
+        val -= (1 << 32)
+    return val
+
+class _Flight:
+    """
+    One read on the wire that other callers can wait on.
+    """
+
+    def __init__(self, started_ns, generation):
+        self.started_ns = started_ns
+        self.generation = generation
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
 # --- ServoController Class ---
 
 class ServoController:
-    def __init__(self, serial_port, baudrate, motor_addresses):
+    def __init__(self, serial_port, baudrate, motor_addresses, broadcast=True, instrument_factory=None):
         """
         motor_addresses: dictionary with keys 'right', 'left', 'lift', 'drag'
+        broadcast: allow group moves to fire a single broadcast (slave 0) trigger
+        instrument_factory: optional factory(serial_port, address) returning an object with the
+            minimalmodbus Instrument read/write methods (e.g. a Modbus TCP gateway client)
         """
         self.serial_port = serial_port
         self.baudrate = baudrate
+        self.instrument_factory = instrument_factory
         # Create minimalmodbus.Instrument objects for each motor
         self.motors = {}
         for key, addr in motor_addresses.items():
-            inst = minimalmodbus.Instrument(serial_port, addr)
-            inst.serial.baudrate = baudrate
-            self.motors[key] = inst
+            self.motors[key] = self._instrument(addr)
+        # Broadcast instrument shares the serial port; drives act on it without replying.
+        # Only on a directly owned line, other transports fall back to burst triggers.
+        self.broadcast = None
+        if broadcast and instrument_factory is None:
+            self.broadcast = self._instrument(BROADCAST_ADDRESS)
+        # Result of the most recent trigger_group() call (method, drives, skew)
+        self.last_group_trigger = None
+        # Unit converters, built on first use per drive
+        self.converters = {}
+        # Loop statistics of the most recent stream_setpoints() call
+        self.last_stream_stats = None
+        # Latest IO snapshot per drive and callbacks fed with every fresh one
+        self.io_freshness = IO_FRESHNESS
+        self.io_cache = {}
+        self.io_listeners = []
+        # Callbacks fed with every encoder value read (motor_key, steps)
+        self.encoder_listeners = []
+        # One frame on the line at a time, whichever thread sends it
+        self.bus_lock = threading.RLock()
+        # Single-flight reads; None disables coalescing
+        self.read_tolerance = READ_TOLERANCE
+        self._flights = {}
+        self._flight_lock = threading.Lock()
+        self._write_generation = {}
+        self.read_stats = {"frames": 0, "coalesced": 0}
+        # Per-drive circuit breakers: unresponsive drives fail fast and are re-probed in the background
+        self.breakers = BreakerBoard(self._probe)
+        # Retries of transient failures and read-back of critical parameters
+        self.retry_policy = RetryPolicy()
+        self.retry_stats = RetryStats()
+        self.verify_writes = True
+        # Reconnect: the adapter is found again by its USB serial number, configuration writes
+        # are kept per drive (shadow registers) and replayed once the port is back
+        self.motor_addresses = dict(motor_addresses)
+        self.usb_serial = usb_serial_number(serial_port) if instrument_factory is None else None
+        self.shadow = {key: {} for key in self.motors}
+        self.port_epoch = 0
+        self.outages = []
+        self.outage_s = 0.0
+        self._reconnect_lock = threading.RLock()
+        self._restoring = False          # a port lost during restore_shadow() is not reconnected from inside it
+
+    def _instrument(self, address):
+        if self.instrument_factory is not None:
+            return self.instrument_factory(self.serial_port, address)
+        inst = minimalmodbus.Instrument(self.serial_port, address)
+        inst.serial.baudrate = self.baudrate
+        inst.serial.timeout = response_timeout(self.baudrate)
+        return inst
+
+    def _guarded(self, motor_key, call, op_class=IDEMPOTENT):
+        """
+        Sends one operation through the drive's breaker: fails at once while the drive is
+        quarantined and otherwise counts one failure per failed operation, not per frame.
+
+        Idempotent operations are retried on transient errors (timeout, CRC) per retry_policy;
+        commands are sent once. If the serial port itself is lost the port is reconnected and an
+        idempotent frame is sent again.
+        """
+        self.breakers.check(motor_key)
+        attempts = self.retry_policy.attempts_for(op_class)
+        attempt = 0
+        reconnected = False
+        try:
+            while True:
+                attempt += 1
+                if attempt > 1:
+                    self.breakers.check(motor_key)   # stop retrying once the drive is quarantined
+                epoch = self.port_epoch
+                try:
+                    with self.bus_lock:
+                        result = call()
+                    break
+                except PORT_ERRORS as e:
+                    if reconnected or self._restoring or not self.reconnect(epoch, e) or op_class == COMMAND:
+                        raise
+                    reconnected = True
+                    attempt -= 1                     # the outage is not a line error
+                except SLAVE_ERRORS:
+                    raise
+                except Exception:
+                    if attempt >= attempts:
+                        raise
+                    self.retry_policy.sleep(attempt)
+        except Exception as e:
+            self.retry_stats.record(motor_key, attempt, False, op_class)
+            if not isinstance(e, PORT_ERRORS + (DriveQuarantined,)):
+                self.breakers.failure(motor_key, isinstance(e, NO_RESPONSE_ERRORS))
+            raise
+        self.retry_stats.record(motor_key, attempt, True, op_class)
+        self.breakers.success(motor_key)
+        return result
+
+    def _verified(self, motor_key, reg_addr, values, send):
+        """
+        Runs send() and reads the registers back, rewriting on a mismatch up to the retry
+        policy's attempts. Raises IOError if the drive never holds the written values.
+        """
+        expected = [int(v) & 0xFFFF for v in values]
+        for _ in range(self.retry_policy.attempts_for(IDEMPOTENT)):
+            send()
+            self._invalidate(motor_key)
+            read = self.read_registers(motor_key, reg_addr, len(expected))
+            if read is not None and [v & 0xFFFF for v in read] == expected:
+                return
+            self.retry_stats.verify_failed(motor_key)
+        raise IOError(f"read-back of 0x{reg_addr:04X} does not match {expected}")
+
+    # --- Reconnect ---
+    def reconnect(self, epoch=None, error=None, timeout=RECONNECT_TIMEOUT):
+        """
+        Waits for the serial adapter to come back (found by USB serial number, so a new COM
+        name is fine), reopens it and replays the shadow registers. Blocks the calling thread;
+        other threads that lose the port meanwhile wait for the same reconnect. epoch is
+        self.port_epoch when the failed frame was sent. Returns True once the port is usable.
+        """
+        with self._reconnect_lock:
+            if epoch is not None and epoch != self.port_epoch:
+                return True              # another thread already reconnected
+            log.warning("Serial port %s lost (%s), reconnecting...", self.serial_port, error,
+                        extra={"port": self.serial_port})
+            t0 = time.monotonic()
+            started = time.time()
+            with self.bus_lock:
+                while True:
+                    port = find_port(self.usb_serial) if self.usb_serial else self.serial_port
+                    if port is not None and self._reopen(port):
+                        break
+                    if time.monotonic() - t0 >= timeout:
+                        log.error("Serial port did not come back within %.0f s.", timeout,
+                                  extra={"port": self.serial_port})
+                        self.outages.append({"start": started, "duration_s": time.monotonic() - t0,
+                                             "port": None, "restored": 0})
+                        self.outage_s += time.monotonic() - t0
+                        return False
+                    time.sleep(RECONNECT_POLL)
+                self.port_epoch += 1
+            self._restoring = True
+            try:
+                restored = self.restore_shadow()
+            finally:
+                self._restoring = False
+            outage = time.monotonic() - t0
+            self.outages.append({"start": started, "duration_s": outage, "port": self.serial_port,
+                                 "restored": restored})
+            self.outage_s += outage
+            log.warning("Reconnected on %s after %.1f s, %d registers restored.", self.serial_port, outage,
+                        restored, extra={"port": self.serial_port, "outage_s": outage, "restored": restored})
+            return True
+
+    def _reopen(self, port):
+        """
+        Closes the dead port, opens `port` for every drive and checks that one drive answers.
+        """
+        for inst in list(self.motors.values()) + [self.broadcast]:
+            try:
+                if inst is not None:
+                    inst.serial.close()
+            except Exception:
+                pass
+        try:
+            self.serial_port = port
+            self.motors = {key: self._instrument(addr) for key, addr in self.motor_addresses.items()}
+            if self.broadcast is not None:
+                self.broadcast = self._instrument(BROADCAST_ADDRESS)
+        except Exception:
+            return False
+        for inst in self.motors.values():
+            try:
+                inst.read_register(REG_MOTION_STATUS)
+                return True
+            except NO_RESPONSE_ERRORS:
+                continue                 # drive may be off, the port itself is fine
+            except Exception:
+                return False
+        return True
+
+    def restore_shadow(self):
+        """
+        Re-writes every configuration register written since start-up, in address order.
+        Returns the number of registers restored.
+        """
+        restored = 0
+        for motor_key, registers in self.shadow.items():
+            for reg_addr in sorted(registers):
+                if self.write_register(motor_key, reg_addr, registers[reg_addr]):
+                    restored += 1
+        return restored
+
+    # --- Line Speed ---
+    def set_line_rate(self, baudrate):
+        """
+        Switches the host side of the line to `baudrate` (the drives are switched separately,
+        see baud_upgrade). Response timeouts follow the new rate. False for non-serial transports.
+        """
+        if self.instrument_factory is not None:
+            return False
+        with self.bus_lock:
+            self.baudrate = baudrate
+            for inst in list(self.motors.values()) + [self.broadcast]:
+                if inst is not None:
+                    inst.serial.baudrate = baudrate
+                    inst.serial.timeout = response_timeout(baudrate)
+        return True
+
+    def _probe(self, motor_key):
+        with self.bus_lock:
+            self.motors[motor_key].read_register(REG_MOTION_STATUS)
+        return True
+
+    def drive_available(self, motor_key):
+        return self.breakers.available(motor_key)
 
     # --- Basic Modbus Read/Write Methods ---
 
 
 
+    def _single_flight(self, motor_key, key, read):
+        """
+        Runs read() unless an identical read of motor_key is still in flight, started within
+        read_tolerance and no write to the drive happened since; then that read's result (or
+        error) is shared. Finished reads are never reused, so a lone caller always gets a frame.
+        """
+        with self._flight_lock:
+            generation = self._write_generation.get(motor_key, 0)
+            flight = self._flights.get(key)
+            now = time.monotonic_ns()
+            if (self.read_tolerance is not None and flight is not None
+                    and flight.generation == generation
+                    and not flight.done.is_set()
+                    and now - flight.started_ns <= self.read_tolerance * 1e9):
+                self.read_stats["coalesced"] += 1
+                leader = False
+            else:
+                flight = _Flight(now, generation)
+                self._flights[key] = flight
+                self.read_stats["frames"] += 1
+                leader = True
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = self._guarded(motor_key, read)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            flight.done.set()
+            with self._flight_lock:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+    def _invalidate(self, motor_key):
+        # Any command may change IO/PR state, cached or in-flight reads must not outlive it
+        self.io_cache.pop(motor_key, None)
+        with self._flight_lock:
+            self._write_generation[motor_key] = self._write_generation.get(motor_key, 0) + 1
+
+    def coalescing_stats(self):
+        """
+        Read frames sent vs. reads answered by a frame already in flight (frames saved).
+        """
+        stats = dict(self.read_stats)
+        total = stats["frames"] + stats["coalesced"]
+        stats["saved_fraction"] = stats["coalesced"] / total if total else 0.0
+        return stats
+
     def read_register(self, motor_key, reg_addr, functioncode=3):
         try:
-            value = self.motors[motor_key].read_register(reg_addr, functioncode=functioncode)
-            return value
+            return self._single_flight(motor_key, (motor_key, functioncode, reg_addr, None),
+                                       lambda: self.motors[motor_key].read_register(reg_addr, functioncode=functioncode))
+        except DriveQuarantined:
+            return None
+        except Exception as e:
+            log.error("[%s] Error reading register 0x%04X: %s", motor_key, reg_addr, e,
+                      extra={"motor": motor_key, "reg": reg_addr})
+            return None
+
+    def read_registers(self, motor_key, reg_addr, count, functioncode=3):
+        """
+        Read a block of consecutive registers in one frame. Returns a list or None.
+        """
+        try:
+            values = self._single_flight(motor_key, (motor_key, functioncode, reg_addr, count),
+                                         lambda: self.motors[motor_key].read_registers(reg_addr, count, functioncode=functioncode))
+            # Callers sharing one result each get their own list
+            return list(values)
+        except DriveQuarantined:
+            return None
         except Exception as e:
-            print(f"[{motor_key}] Error reading register 0x{reg_addr:04X}: {e}")
+            log.error("[%s] Error reading %d registers from 0x%04X: %s", motor_key, count, reg_addr, e,
+                      extra={"motor": motor_key, "reg": reg_addr})
             return None
 
-    def write_register(self, motor_key, reg_addr, value, functioncode=6):
+    def write_register(self, motor_key, reg_addr, value, functioncode=6, verify=None):
+        """
+        verify: read the value back (default: for CRITICAL_REGISTERS while verify_writes is on).
+        """
+        self._invalidate(motor_key)
+        if verify is None:
+            verify = self.verify_writes and reg_addr in CRITICAL_REGISTERS
         try:
-            self.motors[motor_key].write_register(reg_addr, value, functioncode=functioncode)
+            def send():
+                self._guarded(motor_key,
+                              lambda: self.motors[motor_key].write_register(reg_addr, value, functioncode=functioncode),
+                              register_class(reg_addr))
+            if verify:
+                self._verified(motor_key, reg_addr, [value], send)
+            else:
+                send()
             # Optionally: print(f"[{motor_key}] Wrote {value} to register 0x{reg_addr:04X}")
+            if reg_addr in SHADOW_REGISTERS:
+                self.shadow[motor_key][reg_addr] = value
+            return True
+        except DriveQuarantined:
+            return False
+        except Exception as e:
+            log.error("[%s] Error writing to register 0x%04X: %s", motor_key, reg_addr, e,
+                      extra={"motor": motor_key, "reg": reg_addr})
+            return False
+
+    def write_registers(self, motor_key, reg_addr, values, verify=None):
+        """
+        Write a block of consecutive registers in one function 0x10 frame.
+        verify: read the block back (default: if it touches CRITICAL_REGISTERS and verify_writes is on).
+        """
+        self._invalidate(motor_key)
+        values = list(values)
+        if verify is None:
+            verify = self.verify_writes and bool(CRITICAL_REGISTERS.intersection(range(reg_addr, reg_addr + len(values))))
+        try:
+            def send():
+                self._guarded(motor_key, lambda: self.motors[motor_key].write_registers(reg_addr, values),
+                              register_class(reg_addr, len(values)))
+            if verify:
+                self._verified(motor_key, reg_addr, values, send)
+            else:
+                send()
+            for i, value in enumerate(values):
+                if reg_addr + i in SHADOW_REGISTERS:
+                    self.shadow[motor_key][reg_addr + i] = value
             return True
+        except DriveQuarantined:
+            return False
         except Exception as e:
-            print(f"[{motor_key}] Error writing to register 0x{reg_addr:04X}: {e}")
+            log.error("[%s] Error writing %d registers from 0x%04X: %s", motor_key, len(values), reg_addr, e,
+                      extra={"motor": motor_key, "reg": reg_addr})
             return False
 
     # --- High-Level Control Methods ---
@@ -99,7 +605,24 @@ class ServoController:
         self.write_register(motor_key, REG_CONTROL_WORD, 0x1122)
 
     def set_pulse_per_revolution(self, motor_key, ppr):
-        self.write_register(motor_key, REG_PULSE_PER_REV, ppr)
+        if self.write_register(motor_key, REG_PULSE_PER_REV, ppr):
+            self.converters.pop(motor_key, None)
+
+    def converter(self, motor_key):
+        """
+        Unit converter for motor_key. The drive PPR is read once (Hardware.csv PPR if the read
+        fails) and the converter is reused for every later move.
+        """
+        conv = self.converters.get(motor_key)
+        if conv is None:
+            ppr = self.read_register(motor_key, REG_PULSE_PER_REV)
+            if ppr is None:
+                log.warning("[%s] Could not read pulse per revolution, using PPR=%s.", motor_key, PPR,
+                            extra={"motor": motor_key})
+                ppr = PPR
+            conv = UnitConverter(ppr, DRIVE_GEARS.get(motor_key, 1), WHEEL_DIA)
+            self.converters[motor_key] = conv
+        return conv
 
     def reset_encoder(self, motor_key):
        self.write_register(motor_key, 0x6002, 0x0020)  # Trigger homing
@@ -113,8 +636,25 @@ class ServoController:
         val = (lsb << 16) | msb
         if val & (1 << 31):
             val -= (1 << 32)
+        for listener in self.encoder_listeners:
+            listener(motor_key, val)
         return val
 
+    def read_following_error(self, motor_key):
+        words = self.read_registers(motor_key, REG_FOLLOWING_ERROR, 2)
+        if words is None:
+            return None
+        return combine_words(words[0], words[1])
+
+    def read_position_pair(self, motor_key):
+        """
+        (commanded, feedback) position from 0x1012-0x1015 in one frame, None on failure.
+        """
+        words = self.read_registers(motor_key, REG_PROFILE_POSITION, 4)
+        if words is None:
+            return None
+        return combine_words(words[0], words[1]), combine_words(words[2], words[3])
+
     def jog(self, motor_key, direction):
         """
         Jog the motor in the specified direction.
@@ -127,7 +667,7 @@ class ServoController:
         elif direction == "-":
             return self.write_register(motor_key, 0x0033, 0x4001)
         else:
-            print("Invalid jog direction. Use '+' or '-'.")
+            log.error("Invalid jog direction %r. Use '+' or '-'.", direction)
             return False
 
 
@@ -269,42 +809,23 @@ class ServoController:
     # --- Example Coordinated Move ---
     def move_distance(self, velocity, acceleration, deceleration, left_distance, right_distance, unit, mode="INC", store_positions=False):
         """
-        Converts given distances to steps and moves left and right motors accordingly.
-        Assumes a function wheel_circumference() and conversion factors (gear ratios) are defined.
+        Converts given distances (in `unit`, see units.UnitConverter) to steps with each drive's
+        cached converter and moves left and right motors together.
         """
-        # Example conversion functions:
-        def wheel_circumference(diameter):
-            return math.pi * diameter
-
-        def distance_to_steps(distance, diameter, ppr, gear_ratio):
-            # Convert distance (in the specified unit, assumed here to be in mm) to steps.
-            circumference = wheel_circumference(diameter)
-            revolutions = distance / circumference
-            return int(revolutions * ppr * gear_ratio)
-
-        # Example parameters (set these based on your hardware):
-        WHEEL_DIA = 100.0        # in mm, adjust as needed
-        RIGHT_GEAR = 1.0
-        LEFT_GEAR = 1.0
-
-        # Read pulse per revolution from one motor (assuming both are same)
-        ppr = self.read_register("right", REG_PULSE_PER_REV)
-        if ppr is None:
-            print("Error: Could not read pulse per revolution.")
+        # The right drive carries the left distance (same wiring convention as motorMove)
+        try:
+            left_steps = self.converter("right").to_steps(left_distance, unit)
+            right_steps = self.converter("left").to_steps(right_distance, unit)
+        except ValueError as e:
+            log.error("Error: %s", e)
             return False
 
-        left_steps = distance_to_steps(left_distance, WHEEL_DIA, ppr, LEFT_GEAR)
-        right_steps = distance_to_steps(right_distance, WHEEL_DIA, ppr, RIGHT_GEAR)
-
-        # For coordinated move, here we use incremental mode for both motors.
-        if mode.upper() == "INC":
-            self.move_incremental("right", velocity, acceleration, deceleration, -left_steps)
-            self.move_incremental("left", velocity, acceleration, deceleration, right_steps)
-        elif mode.upper() == "ABS":
-            self.move_absolute("right", velocity, acceleration, deceleration, -left_steps)
-            self.move_absolute("left", velocity, acceleration, deceleration, right_steps)
-        else:
-            print("Invalid mode specified. Use 'INC' or 'ABS'.")
+        # For coordinated move both wheels are staged first and started together.
+        if mode.upper() not in ("INC", "ABS"):
+            log.error("Invalid mode %r specified. Use 'INC' or 'ABS'.", mode)
+            return False
+        moves = {"right": -left_steps, "left": right_steps}
+        if not self.move_group(moves, velocity, acceleration, deceleration, mode):
             return False
 
         if store_positions:
@@ -313,6 +834,216 @@ class ServoController:
             update_csv("CurMode", mode.upper(), "positions.csv")
         return True
 
+    # --- Group (Synchronised) Moves ---
+    def stage_pr_move(self, motor_key, velocity, acceleration, deceleration, target_steps, mode="INC"):
+        """
+        Loads PR0 (mode, target, velocity, acc, dec) without triggering it.
+        The six parameters are contiguous (0x6200-0x6205) so they go out in a single frame.
+        """
+        motion_mode = 0x0041 if mode.upper() == "INC" else 0x0001
+        msb, lsb = split_steps(target_steps)
+        return self.write_registers(motor_key, MOTION_MODE,
+                                    [motion_mode, msb, lsb, velocity, acceleration, deceleration])
+
+    def trigger_group(self, motor_keys, trigger=PR_TRIGGER_START):
+        """
+        Starts the staged PR on every drive in motor_keys at the same time.
+
+        A broadcast frame reaches all drives on the line in the same frame, so it is only used
+        when every drive on this port takes part; otherwise a drive that was not staged would
+        re-run whatever is left in its PR0. In that case the triggers are sent as a tight
+        back-to-back burst of pre-addressed unicast writes.
+
+        Returns True on success. The method used and the measured host-side skew between the
+        first and the last trigger frame are stored in self.last_group_trigger.
+        """
+        motor_keys = list(motor_keys)
+        for key in motor_keys:
+            self._invalidate(key)
+        if self.broadcast is not None and set(motor_keys) >= set(self.motors):
+            t0 = time.perf_counter_ns()
+            try:
+                with self.bus_lock:
+                    self.broadcast.write_register(PR_TRIGGER, trigger, functioncode=6)
+                ok = True
+            except Exception as e:
+                log.warning("Broadcast trigger failed, falling back to burst: %s", e)
+                ok = False
+            if ok:
+                self.last_group_trigger = {
+                    "method": "broadcast",
+                    "drives": motor_keys,
+                    "skew_ns": 0,
+                    "elapsed_ns": time.perf_counter_ns() - t0,
+                }
+                return True
+
+        sent_at = []
+        ok = True
+        # The burst holds the line so no other thread's frame lands between two triggers
+        with self.bus_lock:
+            for key in motor_keys:
+                inst = self.motors[key]
+                if not self.breakers.available(key):
+                    log.warning("[%s] Drive quarantined, not triggered.", key, extra={"motor": key})
+                    ok = False
+                    continue
+                try:
+                    inst.write_register(PR_TRIGGER, trigger, functioncode=6)
+                    self.breakers.success(key)
+                except Exception as e:
+                    if not isinstance(e, PORT_ERRORS):
+                        self.breakers.failure(key, isinstance(e, NO_RESPONSE_ERRORS))
+                    log.error("Error triggering drive %s: %s", inst.address, e, extra={"motor": key})
+                    ok = False
+                sent_at.append(time.perf_counter_ns())
+        # Each drive starts when its own frame arrives, so the skew is first-to-last completion
+        self.last_group_trigger = {
+            "method": "burst",
+            "drives": motor_keys,
+            "skew_ns": sent_at[-1] - sent_at[0] if sent_at else 0,
+            "elapsed_ns": sent_at[-1] - sent_at[0] if sent_at else 0,
+        }
+        return ok
+
+    def move_group(self, moves, velocity, acceleration, deceleration, mode="INC"):
+        """
+        Coordinated move: moves is a dict {motor_key: target_steps}.
+        All drives are staged first, then started with one trigger_group() call.
+        """
+        for motor_key, steps in moves.items():
+            if not self.stage_pr_move(motor_key, velocity, acceleration, deceleration, steps, mode):
+                log.error("[%s] Staging failed, group move aborted.", motor_key, extra={"motor": motor_key})
+                return False
+        return self.trigger_group(moves.keys())
+
+    def stop_group(self, motor_keys=None):
+        """
+        Stops the given drives (default: all) with the same broadcast/burst trigger path.
+        """
+        keys = list(self.motors) if motor_keys is None else list(motor_keys)
+        return self.trigger_group(keys, PR_TRIGGER_STOP)
+
+    # --- PR Path Table ---
+    def configure_pr_path(self, motor_key, path, steps, velocity, acceleration, deceleration,
+                          relative=True, overlap=False, jump_path=None):
+        """
+        Writes one PR path (control word, target, velocity, acc, dec) in a single frame.
+        overlap/jump_path chain paths so the drive runs them back to back without the host.
+        """
+        if not 0 <= path < PR_PATH_COUNT:
+            raise ValueError(f"PR path {path} out of range 0-{PR_PATH_COUNT - 1}")
+        ctrl = PR_CTRL_POSITION
+        if relative:
+            ctrl |= PR_CTRL_RELATIVE
+        if overlap:
+            ctrl |= PR_CTRL_OVERLAP
+        if jump_path is not None:
+            ctrl |= ((jump_path & 0x0F) << 8) | PR_CTRL_JUMP
+        msb, lsb = split_steps(steps)
+        return self.write_registers(motor_key, PR_PATH_BASE + path * PR_PATH_STRIDE,
+                                    [ctrl, msb, lsb, velocity, acceleration, deceleration])
+
+    # --- Host-Streamed Setpoints ---
+    def stream_budget(self, n_drives, mode=STREAM_POSITION):
+        """
+        Highest frame rate the bus can sustain for n_drives: one 0x10 write per drive
+        (2 registers for position, 3 for velocity) plus the group trigger, each with its reply.
+        """
+        n_regs = 2 if mode == STREAM_POSITION else 3
+        stage = frame_seconds(9 + 2 * n_regs, self.baudrate) + frame_seconds(8, self.baudrate)
+        trigger = frame_seconds(8, self.baudrate)
+        if not (self.broadcast is not None and n_drives >= len(self.motors)):
+            trigger *= 2 * n_drives   # unicast burst, every trigger is answered
+        return 1.0 / (n_drives * stage + trigger)
+
+    def stream_setpoints(self, setpoints, rate_hz=100, mode=STREAM_POSITION,
+                         velocity=1000, acceleration=500, deceleration=500):
+        """
+        Streams setpoints to one or more drives at a fixed rate.
+
+        setpoints: iterable (e.g. a generator) yielding one {motor_key: value} dict per frame;
+                   value is an absolute step target (position) or signed rpm (velocity).
+        rate_hz:   frame rate, clamped to what the bus can carry (stream_budget).
+
+        Frames are paced against absolute monotonic deadlines. When the loop falls a whole
+        frame behind, the stale setpoints are dropped so the trajectory stays on time.
+        Velocity streams stop the drives when the generator ends or the loop is interrupted.
+        Returns the loop statistics (also kept in self.last_stream_stats).
+        """
+        iterator = iter(setpoints)
+        try:
+            first = next(iterator)
+        except StopIteration:
+            return None
+        keys = list(first)
+        budget = self.stream_budget(len(keys), mode)
+        if rate_hz > min(budget, STREAM_MAX_RATE):
+            log.warning("Stream rate %s Hz exceeds the bus budget, using %.0f Hz.", rate_hz, min(budget, STREAM_MAX_RATE))
+            rate_hz = min(budget, STREAM_MAX_RATE)
+        period_ns = int(1e9 / rate_hz)
+
+        # Static PR parameters go out once; per frame only the target (or speed) changes
+        motion_mode = 0x0001 if mode == STREAM_POSITION else 0x0002
+        for key in keys:
+            self.write_registers(key, MOTION_MODE, [motion_mode, 0, 0, velocity, acceleration, deceleration])
+
+        sent = skipped = overruns = errors = 0
+        lateness = []
+        frame = first
+        t0 = time.monotonic_ns()
+        k = 0
+        try:
+            while True:
+                deadline = t0 + k * period_ns
+                late = sleep_until(deadline)
+                if late >= period_ns:
+                    # Behind schedule: drop the setpoints whose slots have already passed
+                    behind = late // period_ns
+                    for _ in range(behind):
+                        frame = next(iterator)
+                    skipped += behind
+                    k += behind
+                    late -= behind * period_ns
+                lateness.append(late)
+
+                ok = True
+                # No read-back: the next frame supersedes the setpoint anyway
+                for key, value in frame.items():
+                    if mode == STREAM_POSITION:
+                        ok = self.write_registers(key, PR_HIGHBIT, split_steps(value), verify=False) and ok
+                    else:
+                        direction = 0 if value >= 0 else 1
+                        ok = self.write_registers(key, PR_HIGHBIT, [direction, 0, int(abs(value))], verify=False) and ok
+                ok = self.trigger_group(frame.keys()) and ok
+                if not ok:
+                    errors += 1
+                sent += 1
+                if time.monotonic_ns() - deadline > period_ns:
+                    overruns += 1
+                k += 1
+                frame = next(iterator)
+        except StopIteration:
+            pass
+        finally:
+            if mode == STREAM_VELOCITY:
+                self.stop_group(keys)
+
+        lateness.sort()
+        n = len(lateness)
+        self.last_stream_stats = {
+            "rate_hz": rate_hz,
+            "frames": sent,
+            "skipped": skipped,
+            "overruns": overruns,
+            "errors": errors,
+            "jitter_mean_us": sum(lateness) / n / 1000 if n else 0.0,
+            "jitter_p99_us": lateness[min(n - 1, int(n * 0.99))] / 1000 if n else 0.0,
+            "jitter_max_us": lateness[-1] / 1000 if n else 0.0,
+            "duration_s": (time.monotonic_ns() - t0) / 1e9,
+        }
+        return self.last_stream_stats
+
     # --- Additional Methods ---
     def check_motion_completion(self, motor_key, status_bit=5):
         """
@@ -324,23 +1055,57 @@ class ServoController:
             return False
         return bool(status & (1 << status_bit))
 
-    def check_pot(self, motor_key):
+    # --- Input Functions / S-code ---
+    def di_function_register(self, input_num):
+        return REG_DI_FUNCTION + 2 * (input_num - 1)
 
-        val1 = self.read_register(motor_key, 0x0B11)
-        plim = val1 & 0x0001
-        return int (plim)
+    def configure_s_code(self, motor_key, path, start_code, end_code):
+        """
+        S-codes the drive outputs when PR path `path` starts and when it completes.
+        """
+        value = (start_code & 0xFF) | ((end_code & 0xFF) << 8)
+        return self.write_register(motor_key, REG_S_CODE_BASE + path, value)
 
-    def check_pr(self, motor_key):
+    def read_s_code(self, motor_key):
+        return self.read_register(motor_key, REG_S_CODE)
 
-        pr = self.read_register(motor_key, 0x0B12)
-        prval = pr & 0x0002
-        return int (prval)
+    # --- Digital IO ---
+    def io_snapshot(self, motor_key, max_age=None):
+        """
+        Inputs and motion status words from one read of 0x0B11-0x0B12. A snapshot younger than
+        max_age seconds (default self.io_freshness, 0 forces a read) is reused. None on failure.
+        """
+        max_age = self.io_freshness if max_age is None else max_age
+        snap = self.io_cache.get(motor_key)
+        now = time.monotonic_ns()
+        if snap is not None and now - snap.time_ns <= max_age * 1e9:
+            return snap
+        words = self.read_registers(motor_key, REG_IO_INPUTS, 2)
+        if words is None:
+            return None
+        snap = IOSnapshot(time.monotonic_ns(), words[0], words[1])
+        self.io_cache[motor_key] = snap
+        for listener in self.io_listeners:
+            listener(motor_key, snap)
+        return snap
 
-    def check_not(self, motor_key):
+    def check_pot(self, motor_key):
+        snap = self.io_snapshot(motor_key)
+        if snap is None:
+            return None
+        return int(snap.inputs & IO_POT_BIT)
 
-        val2 = self.read_register(motor_key, 0x0B11)
-        nlim = val2 & 0x0002
-        return int (nlim)
+    def check_pr(self, motor_key):
+        snap = self.io_snapshot(motor_key)
+        if snap is None:
+            return None
+        return int(snap.motion & IO_PR_DONE_BIT)
+
+    def check_not(self, motor_key):
+        snap = self.io_snapshot(motor_key)
+        if snap is None:
+            return None
+        return int(snap.inputs & IO_NOT_BIT)
 
 # --- Example Usage ---
 
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""
+Drive Health Watchdog
+---------------------
+Watches motor current (REG_MOTOR_CURRENT, 0x0B08) and driver temperature
+(REG_DRIVER_TEMPERATURE, 0x0B0B) so thermal and overload trends show up before the drive trips.
+
+Both values come from one 4-register read (0x0B08-0x0B0B) per drive on the shared PollPlan.
+Per drive the watchdog keeps an EWMA and the peak of current and temperature, plus the RMS
+current and peak current of the running cycle (begin_cycle / end_cycle / cycle_peak).
+
+Levels: "ok" -> "derate" -> "pause". Subscribers get HealthEvent only when a drive changes
+level; a level is left again only once the value is HYSTERESIS below its threshold. The
+runner decides what derating means (e.g. a lower speed).
+
+Bus budget: the poll period is stretched so the watchdog's reads occupy at most
+`bus_budget` of the line (estimated from frame_seconds); the measured fraction is reported by
+bus_fraction().
+
+Dependencies:
+    - driver (register map, frame_seconds)
+    - telemetry (PollPlan)
+    - async_log
+"""
+
+import math
+from collections import namedtuple
+
+from driver import *
+from async_log import get_logger
+
+log = get_logger("health")
+
+HEALTH_PERIOD   = 0.5         # s, wanted poll period per drive
+HEALTH_BUDGET   = 0.02        # max share of the bus the watchdog may use
+EWMA_ALPHA      = 0.2
+CURRENT_SCALE   = 0.1         # A per count of REG_MOTOR_CURRENT
+TEMP_SCALE      = 1.0         # deg C per count of REG_DRIVER_TEMPERATURE
+
+TEMP_DERATE     = 60.0        # deg C, EWMA
+TEMP_PAUSE      = 70.0
+CURRENT_DERATE  = 6.0         # A, EWMA
+CURRENT_PAUSE   = 8.0
+HYSTERESIS      = 0.1         # relative margin below a threshold before a level is cleared
+
+LEVELS = ("ok", "derate", "pause")
+HEALTH_SPAN = REG_DRIVER_TEMPERATURE - REG_MOTOR_CURRENT + 1
+# Request (8 bytes) plus response (5 + 2 per register) of one health read
+HEALTH_FRAME_BYTES = 8 + 5 + 2 * HEALTH_SPAN
+
+HealthEvent = namedtuple("HealthEvent", "time_ns motor_key level previous current_a temperature_c")
+
+
+def _signed(value):
+    return value - 0x10000 if value & 0x8000 else value
+
+
+class DriveHealth:
+    def __init__(self):
+        self.current = None          # EWMA, A
+        self.temperature = None      # EWMA, deg C
+        self.peak_current = 0.0
+        self.peak_temperature = -math.inf
+        self.level = "ok"
+        self.samples = 0
+        self._cycle_sq = 0.0
+        self._cycle_n = 0
+        self._cycle_peak = 0.0
+
+
+class HealthWatchdog:
+    def __init__(self, plan, motor_keys=None, period_s=HEALTH_PERIOD, bus_budget=HEALTH_BUDGET,
+                 temp_derate=TEMP_DERATE, temp_pause=TEMP_PAUSE,
+                 current_derate=CURRENT_DERATE, current_pause=CURRENT_PAUSE, alpha=EWMA_ALPHA):
+        self.plan = plan
+        keys = list(motor_keys if motor_keys is not None else plan.controller.motors.keys())
+        self.thresholds = {
+            "temperature": (temp_derate, temp_pause),
+            "current": (current_derate, current_pause),
+        }
+        self.alpha = alpha
+        self.drives = {key: DriveHealth() for key in keys}
+        self.subscribers = []
+
+        # Stretch the period until all drives' reads fit in the budget
+        cost = frame_seconds(HEALTH_FRAME_BYTES, plan.controller.baudrate) * len(keys)
+        self.period_s = max(period_s, cost / bus_budget) if bus_budget else period_s
+        self.bus_budget = bus_budget
+        if self.period_s > period_s:
+            log.warning("Health poll period raised to %.2f s to stay within %.1f%% of the bus.", self.period_s, bus_budget * 100)
+        plan.add("health", REG_MOTOR_CURRENT, HEALTH_SPAN, self.period_s, keys, self._on_sample)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def level(self, motor_key):
+        return self.drives[motor_key].level
+
+    # --- Sampling ---
+    def _on_sample(self, motor_key, values, time_ns):
+        if values is None:
+            return
+        h = self.drives[motor_key]
+        amps = abs(_signed(values[0])) * CURRENT_SCALE
+        temp = _signed(values[-1]) * TEMP_SCALE
+        if h.samples == 0:
+            h.current, h.temperature = amps, temp
+        else:
+            h.current += self.alpha * (amps - h.current)
+            h.temperature += self.alpha * (temp - h.temperature)
+        h.samples += 1
+        h.peak_current = max(h.peak_current, amps)
+        h.peak_temperature = max(h.peak_temperature, temp)
+        h._cycle_sq += amps * amps
+        h._cycle_n += 1
+        h._cycle_peak = max(h._cycle_peak, amps)
+
+        level = self._classify(h)
+        if level != h.level:
+            previous, h.level = h.level, level
+            event = HealthEvent(time_ns, motor_key, level, previous, h.current, h.temperature)
+            for callback in self.subscribers:
+                callback(event)
+
+    def _classify(self, h):
+        rank = 0
+        current_rank = LEVELS.index(h.level)
+        for name, value in (("temperature", h.temperature), ("current", h.current)):
+            for i, limit in enumerate(self.thresholds[name], start=1):
+                # Stay at an already reached level until the value drops below the margin
+                if i <= current_rank:
+                    limit -= abs(limit) * HYSTERESIS
+                if value >= limit:
+                    rank = max(rank, i)
+        return LEVELS[rank]
+
+    # --- Cycles ---
+    def begin_cycle(self):
+        for h in self.drives.values():
+            h._cycle_sq = 0.0
+            h._cycle_n = 0
+            h._cycle_peak = 0.0
+
+    def end_cycle(self):
+        """
+        RMS current (A) of every drive over the cycle, None for drives without samples.
+        """
+        return {key: math.sqrt(h._cycle_sq / h._cycle_n) if h._cycle_n else None
+                for key, h in self.drives.items()}
+
+    def cycle_peak(self, motor_key):
+        h = self.drives[motor_key]
+        return h._cycle_peak if h._cycle_n else None
+
+    # --- Reporting ---
+    def bus_fraction(self):
+        return self.plan.bus_fraction(["health"])
+
+    def summary(self):
+        drives = {
+            key: {
+                "level": h.level,
+                "current_ewma": h.current,
+                "current_peak": h.peak_current,
+                "temperature_ewma": h.temperature,
+                "temperature_peak": h.peak_temperature if h.samples else None,
+            }
+            for key, h in self.drives.items()
+        }
+        return {"drives": drives, "bus_fraction": self.bus_fraction(), "period_s": self.period_s}
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Hardware-Triggered PR Start
+---------------------------
+Lets PR paths start on a digital input edge (the drive's CTRG input function) instead of a
+host write to PR_TRIGGER, and verifies starts and completions through the S-code the drive
+outputs, so multi-drive starts and fixture handshakes (e.g. a sensor starting the next cycle)
+run with drive-level timing.
+
+Sequence:
+    configure()   DIn -> CTRG and IO trigger mode on every drive, both read back and checked
+    stage moves   e.g. ServoController.stage_pr_move
+    arm()         writes fresh S-codes for the path, so a stale code from the previous cycle
+                  can never be taken for this one
+    wait_done()   polls REG_S_CODE until every drive shows this arm's end code
+    restore()     puts the original input functions back
+
+One wired input can fan out to several drives; they then start on the same electrical edge.
+
+Dependencies:
+    - driver (ServoController, input/S-code registers)
+    - async_log
+"""
+
+import time
+
+from driver import *
+from async_log import get_logger
+
+log = get_logger("hw_trigger")
+
+TRIGGER_INPUT   = 5          # DI used for CTRG (DI1/DI2 are the limit switches)
+S_CODE_POLL     = 0.005      # s between S-code polls
+END_FLAG        = 0x80       # end code = start code | END_FLAG
+
+
+class HardwareTrigger:
+    def __init__(self, controller, motor_keys, input_num=TRIGGER_INPUT, path=0, normally_closed=False):
+        self.controller = controller
+        self.motor_keys = list(motor_keys)
+        self.input_num = input_num
+        self.path = path
+        self.function = DI_FUNC_CTRG | (DI_NORMALLY_CLOSED if normally_closed else 0)
+        self.saved = {}              # motor_key -> (input function, trigger mode) before configure()
+        self.token = 0
+        self.configured = False
+
+    # --- Setup ---
+    def _verify(self, motor_key, reg, value):
+        read = self.controller.read_register(motor_key, reg)
+        if read != value:
+            log.error("[%s] 0x%04X reads %s, expected %s.", motor_key, reg, read, value,
+                      extra={"motor": motor_key, "reg": reg})
+            return False
+        return True
+
+    def configure(self):
+        """
+        Maps the trigger input to CTRG and enables IO trigger mode on every drive.
+        Returns True only if all drives read the new settings back.
+        """
+        di_reg = self.controller.di_function_register(self.input_num)
+        ok = True
+        for key in self.motor_keys:
+            if key not in self.saved:
+                self.saved[key] = (self.controller.read_register(key, di_reg),
+                                   self.controller.read_register(key, REG_IO_TRIGGER_MODE))
+            ok = self.controller.write_register(key, di_reg, self.function) and ok
+            ok = self.controller.write_register(key, REG_IO_TRIGGER_MODE, IO_TRIGGER_MODE) and ok
+            ok = self._verify(key, di_reg, self.function) and ok
+            ok = self._verify(key, REG_IO_TRIGGER_MODE, IO_TRIGGER_MODE) and ok
+        self.configured = ok
+        return ok
+
+    def restore(self):
+        di_reg = self.controller.di_function_register(self.input_num)
+        for key, (function, mode) in self.saved.items():
+            if function is not None:
+                self.controller.write_register(key, di_reg, function)
+            if mode is not None:
+                self.controller.write_register(key, REG_IO_TRIGGER_MODE, mode)
+        self.saved = {}
+        self.configured = False
+
+    # --- Per Move ---
+    def arm(self):
+        """
+        Loads new start/end S-codes for the path. Call after staging the moves and before the
+        input edge. Returns the (start, end) codes or None on a failed write.
+        """
+        self.token = self.token % 0x7F + 1
+        start, end = self.token, self.token | END_FLAG
+        for key in self.motor_keys:
+            if not self.controller.configure_s_code(key, self.path, start, end):
+                return None
+        return start, end
+
+    def codes(self):
+        return {key: self.controller.read_s_code(key) for key in self.motor_keys}
+
+    def wait_code(self, code, timeout, idle=time.sleep):
+        """
+        Waits until every drive outputs `code`. idle(seconds) is called between polls (e.g.
+        PollPlan.wait). Returns the seconds waited, or None on timeout.
+        """
+        t0 = time.monotonic()
+        pending = set(self.motor_keys)
+        while True:
+            for key in list(pending):
+                if self.controller.read_s_code(key) == code:
+                    pending.discard(key)
+            if not pending:
+                return time.monotonic() - t0
+            if time.monotonic() - t0 >= timeout:
+                log.error("S-code 0x%02X not seen on %s within %s s.", code, sorted(pending), timeout)
+                return None
+            idle(S_CODE_POLL)
+
+    def wait_done(self, timeout, idle=time.sleep):
+        return self.wait_code(self.token | END_FLAG, timeout, idle)
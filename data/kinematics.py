@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Mobile Base Kinematics
+----------------------
+Maps body-frame commands to per-drive step and velocity targets for our bases.
+
+A body command is (distance, heading change): distance along the path of the base centre and
+the change of heading (degrees, counter-clockwise positive). With track half-width b:
+
+    left  = distance - heading_rad * b * (1 - slip)
+    right = distance + heading_rad * b * (1 - slip)
+
+which covers straight moves (heading 0), turns on the spot (distance 0) and arcs of radius
+distance / heading_rad in one formula. Everything works on NumPy arrays, so a whole route is
+solved in one call. Wheel travel is converted to steps with each drive's units.UnitConverter
+and drive velocities are scaled so every wheel of a segment finishes at the same time.
+
+Drive mapping: each physical wheel is driven by one or more (drive_key, sign) entries. The
+defaults reproduce the conventions of motorMoveDistance()/ServoController.move_distance, where
+the right drive is mounted mirrored. The four-drive base adds the two steering drives
+(RIGHT_TURN/LEFT_TURN) that omniRotate() turns through OMNIRATIO.
+
+Dependencies:
+    - numpy
+    - units
+"""
+
+import math
+
+import numpy as np
+
+from units import TURN_SLIP
+
+DIFFERENTIAL_MAP = {
+    "left": [("left", +1)],
+    "right": [("right", -1)],
+}
+
+STEER_MAP = {
+    "left": ("left_turn", +1),
+    "right": ("right_turn", +1),
+}
+
+
+class DifferentialBase:
+    def __init__(self, half_track, drive_map=None, slip=TURN_SLIP, heading_offset=0.0):
+        """
+        half_track: distance from the base centre to the wheel contact line (mm, RADIUS)
+        drive_map: {"left"/"right": [(drive_key, sign), ...]}
+        slip: wheel slip compensation applied to the rotational part (units.TURN_SLIP)
+        heading_offset: added to every on-the-spot turn (degrees, TOLANG)
+        """
+        self.half_track = float(half_track)
+        self.drive_map = drive_map or DIFFERENTIAL_MAP
+        self.slip = slip
+        self.heading_offset = heading_offset
+        self._turn_gain = self.half_track * (1.0 - slip) * math.pi / 180.0  # mm per degree
+
+    def drives(self):
+        """
+        Traction drive keys, in left-then-right order.
+        """
+        return [key for side in ("left", "right") for key, _ in self.drive_map[side]]
+
+    # --- Wheel Travel ---
+    def wheel_travel(self, distance, heading_deg):
+        """
+        (left, right) wheel travel in mm. Scalars or arrays of equal shape.
+        """
+        distance = np.asarray(distance, dtype=np.float64)
+        heading = np.asarray(heading_deg, dtype=np.float64)
+        if self.heading_offset:
+            # Tolerance angle of on-the-spot turns, as rotate() always added it
+            heading = heading + np.where(distance == 0, np.sign(heading) * self.heading_offset, 0.0)
+        turn = heading * self._turn_gain
+        return distance - turn, distance + turn
+
+    def arc(self, radius, heading_deg):
+        """
+        Body command for an arc of `radius` (mm, to the base centre) through heading_deg.
+        A negative radius drives the arc backwards.
+        """
+        heading = np.asarray(heading_deg, dtype=np.float64)
+        return np.asarray(radius, dtype=np.float64) * np.abs(np.radians(heading)), heading
+
+    # --- Drive Targets ---
+    def solve(self, converters, distance, heading_deg, speed):
+        """
+        Per-drive steps and rpm for one or many body commands.
+
+        converters: {drive_key: units.UnitConverter}
+        speed: rpm of the fastest drive of each segment (scalar or array)
+        Returns ({drive_key: steps}, {drive_key: rpm}); values are arrays for array input.
+        """
+        left, right = self.wheel_travel(distance, heading_deg)
+        travel = {"left": left, "right": right}
+        steps = {}
+        for side, drives in self.drive_map.items():
+            for key, sign in drives:
+                steps[key] = converters[key].to_steps_array(sign * travel[side], "MM")
+
+        magnitude = np.stack([np.abs(s) for s in steps.values()])
+        peak = magnitude.max(axis=0)
+        peak = np.where(peak == 0, 1, peak)
+        speed = np.asarray(speed, dtype=np.float64)
+        rpm = {key: np.maximum(1, np.rint(speed * np.abs(s) / peak)).astype(np.int64)
+               for key, s in steps.items()}
+        if np.ndim(distance) == 0 and np.ndim(heading_deg) == 0:
+            steps = {k: int(v) for k, v in steps.items()}
+            rpm = {k: int(v) for k, v in rpm.items()}
+        return steps, rpm
+
+    # --- Routes ---
+    def route(self, waypoints, start_heading_deg=0.0):
+        """
+        Turn-then-drive body commands through a list of (x, y) waypoints in mm, starting at the
+        first waypoint. Returns (distance, heading) arrays with two commands per leg.
+        """
+        pts = np.asarray(waypoints, dtype=np.float64)
+        legs = np.diff(pts, axis=0)
+        distance = np.hypot(legs[:, 0], legs[:, 1])
+        bearing = np.degrees(np.arctan2(legs[:, 1], legs[:, 0]))
+        previous = np.concatenate(([start_heading_deg], bearing[:-1]))
+        turn = (bearing - previous + 180.0) % 360.0 - 180.0   # shortest way round
+
+        n = len(legs)
+        dist_cmd = np.zeros(2 * n)
+        head_cmd = np.zeros(2 * n)
+        head_cmd[0::2] = turn
+        dist_cmd[1::2] = distance
+        keep = (dist_cmd != 0) | (head_cmd != 0)
+        return dist_cmd[keep], head_cmd[keep]
+
+
+class FourDriveBase(DifferentialBase):
+    """
+    Two traction drives plus two steering drives. Traction follows DifferentialBase; the
+    steering drives turn their wheel modules through a reduction of steer_ratio (OMNIRATIO).
+    """
+
+    def __init__(self, half_track, steer_ratio, drive_map=None, steer_map=None, **kwargs):
+        super().__init__(half_track, drive_map, **kwargs)
+        self.steer_ratio = float(steer_ratio)
+        self.steer_map = steer_map or STEER_MAP
+
+    def steer_drives(self):
+        return [self.steer_map[side][0] for side in ("left", "right")]
+
+    def steer(self, converters, left_angle, right_angle):
+        """
+        Steering drive steps for module angles in degrees. Scalars or arrays.
+        """
+        angles = {"left": left_angle, "right": right_angle}
+        steps = {}
+        for side, (key, sign) in self.steer_map.items():
+            value = np.asarray(angles[side], dtype=np.float64) * self.steer_ratio * sign
+            steps[key] = converters[key].to_steps_array(value, "DEG")
+        if np.ndim(left_angle) == 0 and np.ndim(right_angle) == 0:
+            steps = {k: int(v) for k, v in steps.items()}
+        return steps
+
+
+def run_segments(controller, steps, rpm, acceleration, deceleration, wait=None):
+    """
+    Executes solved segments one after another: every drive of a segment is staged with its
+    own speed (so the wheels of an arc finish together) and all are started with one
+    ServoController.trigger_group(). wait(controller, drive_keys) is called after each trigger
+    (e.g. a PR completion poll). Returns the number of segments started.
+    """
+    steps = {k: np.atleast_1d(v) for k, v in steps.items()}
+    rpm = {k: np.atleast_1d(v) for k, v in rpm.items()}
+    count = len(next(iter(steps.values())))
+    for i in range(count):
+        moves = {k: int(s[i]) for k, s in steps.items() if s[i]}
+        if not moves:
+            continue
+        for k, target in moves.items():
+            if not controller.stage_pr_move(k, int(rpm[k][i]), acceleration, deceleration, target, "INC"):
+                return i
+        if not controller.trigger_group(list(moves)):
+            return i
+        if wait is not None and not wait(controller, list(moves)):
+            return i + 1
+    return count
+
+
+def run_route(controller, base, waypoints, speed, acceleration, deceleration, wait=None,
+              start_heading_deg=0.0):
+    """
+    Solves a whole waypoint route in one vectorised pass and drives it with run_segments().
+    """
+    converters = {k: controller.converter(k) for k in base.drives()}
+    distance, heading = base.route(waypoints, start_heading_deg)
+    steps, rpm = base.solve(converters, distance, heading, speed)
+    return run_segments(controller, steps, rpm, acceleration, deceleration, wait)
+
+
+def to_queues(queues, steps, rpm, acceleration, deceleration):
+    """
+    Pushes solved segments into motion_queue.MotionQueue objects ({drive_key: queue}).
+    """
+    for key, queue in queues.items():
+        for s, v in zip(np.atleast_1d(steps[key]), np.atleast_1d(rpm[key])):
+            queue.push(int(s), int(v), acceleration, deceleration)
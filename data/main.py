@@ -5,12 +5,12 @@ import time
 from myCSV import *
 # Define your configuration parameters
 SERIAL_PORT =SERIAL_PORT    # Update with your actual serial port
-BAUDRATE =38400             # Update as needed
+BAUDRATE =BAUDRATE          # From Hardware.csv (baud_upgrade.py --write updates it)
 MOTOR_ADDRESSES = {
-    "right": 1,
-    "left": 2,
-    "lift": 3,
-    "drag": 4
+    "right": RIGHT_MOTOR,
+    "left": LEFT_MOTOR,
+    "lift": LIFT_MOTOR,
+    "drag": DRAG_MOTOR
 }
 controller = ServoController(SERIAL_PORT, BAUDRATE, MOTOR_ADDRESSES)
 # controller.write_register("right", 0x0003,0x0006)    #setting in pr mode
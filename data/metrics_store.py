@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Per-Cycle Metrics Store
+-----------------------
+Local SQLite database with one row per endurance cycle, so a test can be charted over its whole
+life instead of only reporting the final CC_COMPLETE.
+
+Columns: task, cycle, ts (cycle start, epoch ns), duration_s, peak/RMS current (A), endpoint
+encoder values, max following error (steps) and the alarms seen during the cycle.
+
+The database runs in WAL mode with synchronous=NORMAL, so the dashboard can read while the
+runner writes. Rows are buffered and inserted in one transaction per batch (every BATCH_SIZE
+rows or FLUSH_INTERVAL seconds). Indexes on (task, cycle) and (task, ts) keep range queries to
+an index range scan.
+
+Each batch also updates a rollup table (count, min, sum, max per ROLLUP_SIZE cycles and numeric
+column). Downsampled queries over more than RAW_LIMIT cycles aggregate the rollup rows instead of every cycle,
+so a chart of a million-cycle test reads about a thousand rows; bucket edges are then aligned
+to ROLLUP_SIZE.
+
+Usage from the command line (prints JSON, e.g. for the dashboard):
+    python metrics_store.py <task> [buckets] [column]
+"""
+
+import json
+import sqlite3
+import sys
+import time
+
+METRICS_DB     = "metrics.db"
+BATCH_SIZE     = 200
+FLUSH_INTERVAL = 5.0      # seconds
+ROLLUP_SIZE    = 1000     # cycles per rollup row
+RAW_LIMIT      = 50000    # longer ranges are downsampled from the rollup table
+
+COLUMNS = ("task", "cycle", "ts", "duration_s", "peak_current", "rms_current",
+           "enc_start", "enc_end", "max_following_error", "alarms", "result")
+NUMERIC = ("duration_s", "peak_current", "rms_current", "enc_start", "enc_end", "max_following_error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cycles (
+    id                  INTEGER PRIMARY KEY,
+    task                TEXT NOT NULL,
+    cycle               INTEGER NOT NULL,
+    ts                  INTEGER NOT NULL,
+    duration_s          REAL,
+    peak_current        REAL,
+    rms_current         REAL,
+    enc_start           INTEGER,
+    enc_end             INTEGER,
+    max_following_error INTEGER,
+    alarms              TEXT,
+    result              TEXT
+);
+CREATE INDEX IF NOT EXISTS cycles_task_cycle ON cycles (task, cycle);
+CREATE INDEX IF NOT EXISTS cycles_task_ts ON cycles (task, ts);
+CREATE TABLE IF NOT EXISTS rollup (
+    task    TEXT NOT NULL,
+    col     TEXT NOT NULL,
+    bucket  INTEGER NOT NULL,
+    n       INTEGER NOT NULL,
+    mn      REAL,
+    total   REAL,
+    mx      REAL,
+    PRIMARY KEY (task, col, bucket)
+) WITHOUT ROWID;
+"""
+
+_INSERT = f"INSERT INTO cycles ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+_ROLLUP = """
+INSERT INTO rollup (task, col, bucket, n, mn, total, mx) VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (task, col, bucket) DO UPDATE SET
+    n = n + excluded.n,
+    mn = MIN(mn, excluded.mn),
+    total = total + excluded.total,
+    mx = MAX(mx, excluded.mx)
+"""
+
+
+class MetricsStore:
+    def __init__(self, path=METRICS_DB, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.pending = []
+        self._last_flush = time.monotonic()
+
+    # --- Writing ---
+    def record(self, task, cycle, ts, duration_s=None, peak_current=None, rms_current=None,
+               enc_start=None, enc_end=None, max_following_error=None, alarms=(), result="ok"):
+        """
+        Buffers one cycle row; alarms is any iterable of alarm names.
+        """
+        self.pending.append((str(task), int(cycle), int(ts), duration_s, peak_current, rms_current,
+                             enc_start, enc_end, max_following_error,
+                             ",".join(sorted(alarms)) or None, result))
+        if (len(self.pending) >= self.batch_size or
+                time.monotonic() - self._last_flush >= self.flush_interval):
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            with self.conn:
+                self.conn.executemany(_INSERT, self.pending)
+                self.conn.executemany(_ROLLUP, self._rollup_rows(self.pending))
+            self.pending = []
+        self._last_flush = time.monotonic()
+
+    @staticmethod
+    def _rollup_rows(rows):
+        acc = {}
+        for row in rows:
+            task, bucket = row[0], row[1] // ROLLUP_SIZE
+            for col in NUMERIC:
+                value = row[COLUMNS.index(col)]
+                if value is None:
+                    continue
+                key = (task, col, bucket)
+                a = acc.get(key)
+                if a is None:
+                    acc[key] = [1, value, value, value]
+                else:
+                    a[0] += 1
+                    a[1] = min(a[1], value)
+                    a[2] += value
+                    a[3] = max(a[3], value)
+        return [(t, c, b, n, mn, total, mx) for (t, c, b), (n, mn, total, mx) in acc.items()]
+
+    def close(self):
+        self.flush()
+        self.conn.close()
+
+    # --- Queries ---
+    def cycles(self, task, first=None, last=None, limit=None):
+        """
+        Rows of cycles first..last (inclusive) as dicts, in cycle order.
+        """
+        sql = f"SELECT {', '.join(COLUMNS)} FROM cycles WHERE task = ?"
+        args = [task]
+        if first is not None:
+            sql += " AND cycle >= ?"
+            args.append(first)
+        if last is not None:
+            sql += " AND cycle <= ?"
+            args.append(last)
+        sql += " ORDER BY cycle"
+        if limit:
+            sql += " LIMIT ?"
+            args.append(limit)
+        return [dict(zip(COLUMNS, row)) for row in self.conn.execute(sql, args)]
+
+    def between(self, task, start_ns, end_ns):
+        sql = f"SELECT {', '.join(COLUMNS)} FROM cycles WHERE task = ? AND ts >= ? AND ts < ? ORDER BY ts"
+        return [dict(zip(COLUMNS, row)) for row in self.conn.execute(sql, (task, start_ns, end_ns))]
+
+    def span(self, task):
+        """
+        (first cycle, last cycle) of a task, (None, None) if it has no rows. Two index seeks.
+        """
+        # Separate sub-selects: SQLite only uses the min/max index shortcut for a lone aggregate
+        return self.conn.execute(
+            "SELECT (SELECT MIN(cycle) FROM cycles WHERE task = ?), "
+            "(SELECT MAX(cycle) FROM cycles WHERE task = ?)", (task, task)).fetchone()
+
+    def downsample(self, task, column="duration_s", buckets=500, first=None, last=None):
+        """
+        At most `buckets` points (cycle, min, avg, max) of a numeric column over a cycle range,
+        aggregated in SQL so a million-cycle test is not pulled into Python.
+        """
+        if column not in NUMERIC:
+            raise ValueError(f"Unsupported column {column!r}. Choose from {NUMERIC}.")
+        lo, hi = self.span(task)
+        if lo is None:
+            return []
+        first = lo if first is None else first
+        last = hi if last is None else last
+        width = max(1, -(-(last - first + 1) // buckets))
+        if last - first + 1 > RAW_LIMIT:
+            # Whole rollup rows per point; the range is widened to rollup boundaries
+            b0, b1 = first // ROLLUP_SIZE, last // ROLLUP_SIZE
+            per_point = -(-(b1 - b0 + 1) // buckets)
+            sql = ("SELECT MIN(bucket), MIN(mn), SUM(total) / SUM(n), MAX(mx) FROM rollup "
+                   "WHERE task = ? AND col = ? AND bucket BETWEEN ? AND ? "
+                   "GROUP BY (bucket - ?) / ? ORDER BY 1")
+            rows = self.conn.execute(sql, (task, column, b0, b1, b0, per_point))
+            return [{"cycle": max(b * ROLLUP_SIZE, first), "min": mn, "avg": avg, "max": mx}
+                    for b, mn, avg, mx in rows]
+        sql = (f"SELECT MIN(cycle), MIN({column}), AVG({column}), MAX({column}) FROM cycles "
+               f"WHERE task = ? AND cycle BETWEEN ? AND ? GROUP BY (cycle - ?) / ? ORDER BY 1")
+        return [
+            {"cycle": c, "min": mn, "avg": avg, "max": mx}
+            for c, mn, avg, mx in self.conn.execute(sql, (task, first, last, first, width))
+        ]
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python metrics_store.py <task> [buckets] [column]")
+        sys.exit(1)
+    store = MetricsStore()
+    points = store.downsample(sys.argv[1],
+                              sys.argv[3] if len(sys.argv) > 3 else "duration_s",
+                              int(sys.argv[2]) if len(sys.argv) > 2 else 500)
+    print(json.dumps(points))
+    store.close()
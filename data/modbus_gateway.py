@@ -0,0 +1,370 @@
+#!/usr/bin/env python3
+"""
+Modbus TCP Gateway
+------------------
+Owns the RTU line(s) and exposes the drives over Modbus TCP on localhost, so the keyboard tool,
+the endurance runner and diagnostics can run side by side although only one process can open
+the serial port.
+
+    TCP clients --> gateway (asyncio) --> BusManager worker per port --> RTU drives
+
+The TCP unit id is the drive's slave address. Supported functions: 0x03/0x04 read, 0x06 write
+single, 0x10 write multiple.
+
+Bus protection:
+    - every frame goes through the port's single BusManager worker, at most MAX_PENDING per
+      port are queued there; further requests wait in the gateway
+    - identical reads (unit, function, address, count) that arrive while one is on the wire share its
+      answer instead of going out again
+    - reads that lie completely inside STATUS_BLOCKS are answered from a cache for CACHE_TTL
+    - a write drops the cache of its drive, and reads already on the wire do not refill it
+
+Ordering: writes of one client run strictly in the order they were sent, and a client's read
+waits for its own earlier writes (read-your-writes). Different clients are not ordered against
+each other.
+
+Tools connect with gateway_controller(), a ServoController whose instruments talk to the
+gateway, so existing scripts only change their constructor.
+
+Usage:
+    python modbus_gateway.py [tcp_port]
+
+Dependencies:
+    - driver (ServoController, register map)
+    - bus_manager (BusManager)
+    - async_log
+"""
+
+import asyncio
+import socket
+import struct
+import sys
+import threading
+import time
+
+from driver import *
+from bus_manager import BusManager
+from async_log import get_logger
+
+log = get_logger("gateway")
+
+GATEWAY_HOST    = "127.0.0.1"
+GATEWAY_PORT    = 5020         # 502 needs root
+CACHE_TTL       = 0.02         # s a status read is served from the cache
+MAX_PENDING     = 4            # queued bus calls per port
+CLIENT_TIMEOUT  = 1.0          # s, gateway_controller socket timeout
+
+# Registers that only report drive state; short-lived cached values are harmless
+STATUS_BLOCKS = (
+    (REG_CURRENT_ALARM, REG_ENCODER_HIGH),          # alarms, motion, current, temperature, IO, encoder
+    (REG_ALARM_STATUS, REG_ALARM_STATUS),
+    (REG_FOLLOWING_ERROR, REG_FEEDBACK_POSITION + 1),
+    (REG_S_CODE, REG_S_CODE),
+)
+
+# Modbus exception codes
+ILLEGAL_FUNCTION    = 0x01
+ILLEGAL_ADDRESS     = 0x02
+ILLEGAL_VALUE       = 0x03
+PATH_UNAVAILABLE    = 0x0A
+TARGET_NO_RESPONSE  = 0x0B
+
+
+def cacheable(address, count):
+    last = address + count - 1
+    return any(lo <= address and last <= hi for lo, hi in STATUS_BLOCKS)
+
+
+class _Client:
+    def __init__(self, peer):
+        self.peer = peer
+        self.last_write = None       # future of this client's most recent write
+
+
+class ModbusGateway:
+    def __init__(self, manager, host=GATEWAY_HOST, port=GATEWAY_PORT, cache_ttl=CACHE_TTL,
+                 max_pending=MAX_PENDING):
+        self.manager = manager
+        self.host = host
+        self.port = port
+        self.cache_ttl = cache_ttl
+        self.max_pending = max_pending
+        self.units = {}
+        for key in manager.port_of:
+            addr = manager.controller(key).motors[key].address
+            if addr in self.units:
+                raise ValueError(f"Unit id {addr} is used by {self.units[addr]!r} and {key!r}.")
+            self.units[addr] = key
+        self.cache = {}              # (unit, function, address, count) -> (time, generation, values)
+        self.inflight = {}           # (unit, function, address, count, generation) -> future
+        self.generation = {unit: 0 for unit in self.units}
+        self.slots = None
+        self.server = None
+        self.clients = 0
+        self.counters = {"requests": 0, "bus_reads": 0, "merged_reads": 0, "cache_hits": 0,
+                         "writes": 0, "errors": 0}
+
+    # --- Bus Access ---
+    async def _bus(self, motor_key, method, *args):
+        port = self.manager.port_of[motor_key]
+        async with self.slots[port]:
+            return await asyncio.wrap_future(self.manager.submit(motor_key, method, *args))
+
+    async def read(self, unit, address, count, function=0x03):
+        key = (unit, function, address, count)
+        status = cacheable(address, count)
+        generation = self.generation[unit]
+        if status:
+            hit = self.cache.get(key)
+            if hit is not None and hit[1] == generation and time.monotonic() - hit[0] <= self.cache_ttl:
+                self.counters["cache_hits"] += 1
+                return hit[2]
+        flight_key = key + (generation,)
+        future = self.inflight.get(flight_key)
+        if future is not None:
+            self.counters["merged_reads"] += 1
+            return await asyncio.shield(future)
+        future = asyncio.ensure_future(self._bus(self.units[unit], "read_registers", address, count, function))
+        self.inflight[flight_key] = future
+        self.counters["bus_reads"] += 1
+        try:
+            values = await asyncio.shield(future)
+        finally:
+            self.inflight.pop(flight_key, None)
+        # A write during the read bumps the generation; the answer may predate it
+        if status and values is not None and self.generation[unit] == generation:
+            self.cache[key] = (time.monotonic(), generation, values)
+        return values
+
+    async def write(self, unit, address, values, single):
+        self.generation[unit] += 1
+        for key in [k for k in self.cache if k[0] == unit]:
+            del self.cache[key]
+        self.counters["writes"] += 1
+        motor_key = self.units[unit]
+        if single:
+            return await self._bus(motor_key, "write_register", address, values[0])
+        return await self._bus(motor_key, "write_registers", address, values)
+
+    # --- Protocol ---
+    @staticmethod
+    def _exception(function, code):
+        return bytes((function | 0x80, code))
+
+    async def handle_pdu(self, client, unit, pdu):
+        """
+        Answers one request PDU, returns the response PDU.
+        """
+        self.counters["requests"] += 1
+        function = pdu[0] if pdu else 0
+        if unit not in self.units:
+            return self._exception(function, PATH_UNAVAILABLE)
+        if function in (0x03, 0x04):
+            if len(pdu) != 5:
+                return self._exception(function, ILLEGAL_VALUE)
+            address, count = struct.unpack(">HH", pdu[1:5])
+            if not 1 <= count <= 125:
+                return self._exception(function, ILLEGAL_VALUE)
+            if client.last_write is not None:
+                await asyncio.shield(client.last_write)
+            values = await self.read(unit, address, count, function)
+            if values is None:
+                self.counters["errors"] += 1
+                return self._exception(function, TARGET_NO_RESPONSE)
+            return struct.pack(f">BB{count}H", function, 2 * count, *values)
+        if function == 0x06:
+            if len(pdu) != 5:
+                return self._exception(function, ILLEGAL_VALUE)
+            address, value = struct.unpack(">HH", pdu[1:5])
+            ok = await self._ordered_write(client, unit, address, [value], True)
+            return pdu if ok else self._exception(function, TARGET_NO_RESPONSE)
+        if function == 0x10:
+            if len(pdu) < 6:
+                return self._exception(function, ILLEGAL_VALUE)
+            address, count, n_bytes = struct.unpack(">HHB", pdu[1:6])
+            if not 1 <= count <= 123 or n_bytes != 2 * count or len(pdu) != 6 + n_bytes:
+                return self._exception(function, ILLEGAL_VALUE)
+            values = list(struct.unpack(f">{count}H", pdu[6:]))
+            ok = await self._ordered_write(client, unit, address, values, False)
+            return pdu[:5] if ok else self._exception(function, TARGET_NO_RESPONSE)
+        return self._exception(function, ILLEGAL_FUNCTION)
+
+    async def _ordered_write(self, client, unit, address, values, single):
+        previous = client.last_write
+        done = asyncio.get_running_loop().create_future()
+        client.last_write = done
+        try:
+            if previous is not None:
+                await asyncio.shield(previous)
+            ok = await self.write(unit, address, values, single)
+        except Exception as e:
+            log.error("Write 0x%04X to unit %s failed: %s", address, unit, e, extra={"unit": unit, "reg": address})
+            ok = False
+        finally:
+            done.set_result(None)
+        if not ok:
+            self.counters["errors"] += 1
+        return ok
+
+    async def _answer(self, client, writer, transaction, unit, pdu):
+        try:
+            response = await self.handle_pdu(client, unit, pdu)
+        except Exception as e:
+            log.error("%s: %s", client.peer, e, extra={"peer": str(client.peer)})
+            self.counters["errors"] += 1
+            response = self._exception(pdu[0] if pdu else 0, TARGET_NO_RESPONSE)
+        if not writer.is_closing():
+            writer.write(struct.pack(">HHHB", transaction, 0, len(response) + 1, unit) + response)
+
+    async def _serve(self, reader, writer):
+        client = _Client(writer.get_extra_info("peername"))
+        self.clients += 1
+        tasks = set()
+        try:
+            while True:
+                header = await reader.readexactly(7)
+                transaction, protocol, length, unit = struct.unpack(">HHHB", header)
+                pdu = await reader.readexactly(length - 1)
+                if protocol != 0:
+                    continue
+                # Requests of one client may be pipelined; writes keep their order via last_write
+                task = asyncio.ensure_future(self._answer(client, writer, transaction, unit, pdu))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+            self.clients -= 1
+            writer.close()
+
+    # --- Lifecycle ---
+    async def start(self):
+        self.slots = {port: asyncio.Semaphore(self.max_pending) for port in self.manager.controllers}
+        self.server = await asyncio.start_server(self._serve, self.host, self.port)
+        log.info("Modbus TCP gateway on %s:%s, units %s", self.host, self.port, sorted(self.units))
+        return self.server
+
+    async def serve_forever(self):
+        await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    def stats(self):
+        return dict(self.counters, clients=self.clients)
+
+
+# --- Client Side ---
+
+class TcpInstrument:
+    """
+    Minimal Modbus TCP client with the minimalmodbus Instrument methods ServoController uses.
+    Errors raise IOError like minimalmodbus, so the controller's error handling is unchanged.
+    """
+
+    def __init__(self, host, port, address, timeout=CLIENT_TIMEOUT):
+        self.host = host
+        self.port = port
+        self.address = address
+        self.timeout = timeout
+        self.sock = None
+        self.transaction = 0
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        self.sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _recv(self, n):
+        data = b""
+        while len(data) < n:
+            chunk = self.sock.recv(n - len(data))
+            if not chunk:
+                raise ConnectionError("Gateway closed the connection")
+            data += chunk
+        return data
+
+    def _request(self, pdu):
+        """
+        Sends one request. A dead connection is replaced only while the request has not been
+        sent; once it is out, a lost answer raises NoResponseError and the controller's retry
+        classes decide whether the request may go out again (commands never do).
+        """
+        with self.lock:
+            for attempt in (0, 1):
+                sent = False
+                try:
+                    if self.sock is None:
+                        self._connect()
+                    self.transaction = (self.transaction + 1) & 0xFFFF
+                    self.sock.sendall(struct.pack(">HHHB", self.transaction, 0, len(pdu) + 1, self.address) + pdu)
+                    sent = True
+                    transaction, _, length, _ = struct.unpack(">HHHB", self._recv(7))
+                    response = self._recv(length - 1)
+                    if transaction != self.transaction:
+                        raise IOError(f"Transaction id mismatch ({transaction} != {self.transaction})")
+                    break
+                except (ConnectionError, socket.timeout, OSError) as e:
+                    if self.sock is not None:
+                        self.sock.close()
+                        self.sock = None
+                    if sent:
+                        raise NO_RESPONSE_ERRORS[0](f"No answer from the gateway: {e}") from e
+                    if attempt:
+                        raise
+        if response[0] & 0x80:
+            message = f"Gateway exception 0x{response[1]:02X} for function 0x{pdu[0]:02X}"
+            # Reported as a timeout so the client's breaker treats the drive like a local one
+            if response[1] == TARGET_NO_RESPONSE:
+                raise NO_RESPONSE_ERRORS[0](message)
+            raise IOError(message)
+        return response
+
+    def read_registers(self, registeraddress, number_of_registers, functioncode=3):
+        response = self._request(struct.pack(">BHH", functioncode, registeraddress, number_of_registers))
+        return list(struct.unpack(f">{number_of_registers}H", response[2:2 + 2 * number_of_registers]))
+
+    def read_register(self, registeraddress, number_of_decimals=0, functioncode=3, signed=False):
+        value = self.read_registers(registeraddress, 1, functioncode)[0]
+        if signed and value & 0x8000:
+            value -= 0x10000
+        return value / 10 ** number_of_decimals if number_of_decimals else value
+
+    def write_register(self, registeraddress, value, number_of_decimals=0, functioncode=16, signed=False):
+        value = int(round(value * 10 ** number_of_decimals)) & 0xFFFF
+        if functioncode == 6:
+            self._request(struct.pack(">BHH", 6, registeraddress, value))
+        else:
+            self.write_registers(registeraddress, [value])
+
+    def write_registers(self, registeraddress, values):
+        values = [int(v) & 0xFFFF for v in values]
+        self._request(struct.pack(f">BHHB{len(values)}H", 0x10, registeraddress, len(values),
+                                  2 * len(values), *values))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+
+def gateway_controller(motor_addresses, host=GATEWAY_HOST, port=GATEWAY_PORT, baudrate=BAUDRATE):
+    """
+    ServoController that reaches the drives through a running gateway instead of the serial port.
+    baudrate is only used for bus-time estimates (frame_seconds) and should match the gateway's.
+    """
+    return ServoController(f"tcp://{host}:{port}", baudrate, motor_addresses,
+                           instrument_factory=lambda _, address: TcpInstrument(host, port, address))
+
+
+if __name__ == "__main__":
+    tcp_port = int(sys.argv[1]) if len(sys.argv) > 1 else GATEWAY_PORT
+    manager = BusManager.from_settings()
+    gateway = ModbusGateway(manager, port=tcp_port)
+    try:
+        asyncio.run(gateway.serve_forever())
+    except KeyboardInterrupt:
+        print(f"Gateway stopped: {gateway.stats()}")
+    finally:
+        manager.close()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Motion Command Queue
+--------------------
+Per-axis queue of incremental moves that are executed by the drive's PR path table instead of
+one host-triggered PR0 move at a time.
+
+The queue looks ahead up to LOOKAHEAD segments and programs them as a chain of PR paths
+(paths 1-15; path 0 stays free for single moves). Each path jumps to the next one, and when
+two consecutive segments move in the same direction the overlap bit is set so the drive blends
+into the next segment without decelerating to zero. A direction reversal still jumps straight
+on, only without overlap. The host only waits once per batch instead of once per segment.
+
+Several queues (e.g. both wheels) are flushed together by flush_group(), which loads every
+axis and starts all chains with one grouped trigger.
+
+Dependencies:
+    - driver (ServoController.configure_pr_path / trigger_group)
+    - async_log
+"""
+
+import time
+from collections import deque, namedtuple
+
+from driver import *
+from async_log import get_logger
+
+log = get_logger("motion_queue")
+
+FIRST_PATH   = 1
+LOOKAHEAD    = PR_PATH_COUNT - FIRST_PATH    # 15 chained segments per batch
+POLL_PERIOD  = 0.005
+BATCH_TIMEOUT = 120
+
+Segment = namedtuple("Segment", "steps velocity acceleration deceleration")
+
+
+class MotionQueue:
+    def __init__(self, controller, motor_key, lookahead=LOOKAHEAD):
+        self.controller = controller
+        self.motor_key = motor_key
+        self.lookahead = min(lookahead, LOOKAHEAD)
+        self.pending = deque()
+        self.segments_done = 0
+        self.blended = 0
+        self.batches = 0
+        self.busy_s = 0.0
+
+    def push(self, steps, velocity, acceleration, deceleration):
+        self.pending.append(Segment(int(steps), velocity, acceleration, deceleration))
+
+    def extend(self, segments):
+        for seg in segments:
+            self.push(*seg)
+
+    def __len__(self):
+        return len(self.pending)
+
+    # --- Batch Loading ---
+    def load_batch(self):
+        """
+        Programs the next lookahead window as a PR chain. Returns the number of segments loaded.
+        If a write fails the chain is cut after the last path that was written, so the drive
+        never jumps on into a path left over from an earlier batch.
+        """
+        batch = [self.pending.popleft() for _ in range(min(self.lookahead, len(self.pending)))]
+        for i, seg in enumerate(batch):
+            path = FIRST_PATH + i
+            last = i == len(batch) - 1
+            nxt = None if last else batch[i + 1]
+            # Blend only when the axis keeps its direction; a reversal has to pass through zero
+            overlap = nxt is not None and seg.steps * nxt.steps > 0
+            ok = self.controller.configure_pr_path(
+                self.motor_key, path, seg.steps, seg.velocity, seg.acceleration, seg.deceleration,
+                relative=True, overlap=overlap, jump_path=None if last else path + 1)
+            if not ok:
+                return self._cut_batch(batch, i)
+            if overlap:
+                self.blended += 1
+        return len(batch)
+
+    def _cut_batch(self, batch, i):
+        """
+        Ends the chain at path FIRST_PATH + i - 1 and puts the unsent tail back so nothing is
+        lost. If the end cannot be rewritten either, the whole batch is requeued (returns 0).
+        """
+        # Blends counted for the written paths; the last one no longer blends once it is cut
+        counted = [batch[j].steps * batch[j + 1].steps > 0 for j in range(i)]
+        if i > 0:
+            prev = batch[i - 1]
+            if self.controller.configure_pr_path(
+                    self.motor_key, FIRST_PATH + i - 1, prev.steps, prev.velocity, prev.acceleration,
+                    prev.deceleration, relative=True, overlap=False, jump_path=None):
+                self.blended -= counted[-1]
+                self.pending.extendleft(reversed(batch[i:]))
+                return i
+        self.blended -= sum(counted)
+        self.pending.extendleft(reversed(batch))
+        return 0
+
+    def _wait_done(self, timeout=BATCH_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.controller.check_pr(self.motor_key):
+                return True
+            time.sleep(POLL_PERIOD)
+        log.error("[%s] PR chain did not complete within %s s.", self.motor_key, timeout, extra={"motor": self.motor_key})
+        return False
+
+    def flush(self):
+        """
+        Runs every queued segment on this axis. Returns False if a batch failed.
+        """
+        return flush_group([self])
+
+    def stats(self):
+        rate = self.segments_done / self.busy_s if self.busy_s else 0.0
+        return {
+            "segments": self.segments_done,
+            "batches": self.batches,
+            "blended": self.blended,
+            "segments_per_s": rate,
+        }
+
+
+def flush_group(queues):
+    """
+    Executes all queued segments of several axes in lock-step batches: every axis loads its
+    next window, then all chains are started with one trigger_group() on the first path.
+    """
+    queues = [q for q in queues if len(q)]
+    if not queues:
+        return True
+    controller = queues[0].controller
+    while any(len(q) for q in queues):
+        active = []
+        t0 = time.monotonic()
+        for q in queues:
+            if not len(q):
+                continue
+            loaded = q.load_batch()
+            if loaded == 0:
+                log.error("[%s] Could not load PR chain.", q.motor_key, extra={"motor": q.motor_key})
+                return False
+            active.append((q, loaded))
+        if not controller.trigger_group([q.motor_key for q, _ in active], PR_TRIGGER_START + FIRST_PATH):
+            return False
+        # The drive needs a moment to clear the previous completion flag
+        time.sleep(POLL_PERIOD)
+        ok = all(q._wait_done() for q, _ in active)
+        elapsed = time.monotonic() - t0
+        for q, loaded in active:
+            q.segments_done += loaded
+            q.batches += 1
+            q.busy_s += elapsed
+        if not ok:
+            return False
+    return True
@@ -1,11 +1,30 @@
 from pycparser.c_ast import Break
 
 from driver import *
+import sys
 import time
 from myCSV import *
+from calibration import calibrate_limits
+from scheduler import scheduler_from_settings
+from cycle_journal import CycleJournal
+from telemetry import PollPlan, AlarmMonitor, IOEdgeDetector
+from health import HealthWatchdog
+from metrics_store import MetricsStore
+from drift import DriftAnalyzer
+from hw_trigger import HardwareTrigger
+from async_log import get_logger, log_stats
+from status_board import StatusBoard
+
+log = get_logger("multix")
 
 DEFAULT_ACCEL = 200
 DEFAULT_DECEL = 200
+SETTLE_TIME = 1.0  # dwell at the end position (s)
+DERATE_SPEED = 0.5  # speed factor while the health watchdog asks to derate
+FOLLOWING_ERROR_PERIOD = 0.1  # s between following-error samples of the test drive
+HARDWARE_TRIGGER = False  # True when the fixture starts each move through the drive's trigger input
+TRIGGER_TIMEOUT = 300  # s to wait for the fixture edge plus the move
+CSV_UPDATE_INTERVAL = 1.0  # CC_COMPLETE is mirrored to the CSV at most this often, the journal has every cycle
 start_pos = int(START_POS)  # Convert to int for motor control
 end_pos = int(END_POS)  # Convert to int for motor control
 speed = int(SPEED)  # Convert to int for motor control
@@ -23,6 +42,96 @@ controller = ServoController(SERIAL_PORT, BAUDRATE, MOTOR_ADDRESSES)
 # Initialize PR mode
 controller.write_register(MOTOR_KEY, 0x6000, 0x0)
 
+# Background reads (alarms, ...) share the idle time of the motion loop
+poll_plan = PollPlan(controller)
+alarm_monitor = AlarmMonitor(poll_plan)
+
+
+# Per-cycle extremes for the metrics store, reset at the start of every cycle
+cycle_alarms = set()
+cycle_following_error = {"max": None}
+
+
+def on_alarm(event):
+    """
+    Alarm transitions only: a raised alarm on the test drive pauses the run.
+    """
+    if event.raised:
+        cycle_alarms.update(event.raised)
+        log.warning("[%s] Alarm raised: %s", event.motor_key, ", ".join(sorted(event.raised)),
+                    extra={"motor": event.motor_key, "alarms": sorted(event.raised)})
+        log.warning("%s", alarm_monitor.describe(event.motor_key), extra={"motor": event.motor_key})
+        if event.motor_key == MOTOR_KEY:
+            update_csv("R_STATUS", "pause", "multix_data.csv")
+    if event.cleared:
+        log.info("[%s] Alarm cleared: %s", event.motor_key, ", ".join(sorted(event.cleared)),
+                 extra={"motor": event.motor_key, "alarms": sorted(event.cleared)})
+
+
+alarm_monitor.subscribe(on_alarm)
+health = HealthWatchdog(poll_plan, [MOTOR_KEY])
+
+
+def on_health(event):
+    log.warning("[%s] Health %s -> %s (current %.2f A, temperature %.1f C)", event.motor_key,
+                event.previous, event.level, event.current_a, event.temperature_c,
+                extra={"motor": event.motor_key, "health": event.level})
+    if event.level == "pause":
+        update_csv("R_STATUS", "pause", "multix_data.csv")
+
+
+health.subscribe(on_health)
+
+
+def on_following_error(motor_key, values, time_ns):
+    if values is None:
+        return
+    error = abs(combine_words(values[0], values[1]))
+    if cycle_following_error["max"] is None or error > cycle_following_error["max"]:
+        cycle_following_error["max"] = error
+
+
+poll_plan.add("following_error", REG_FOLLOWING_ERROR, 2, FOLLOWING_ERROR_PERIOD, [MOTOR_KEY], on_following_error)
+
+
+# Fed by the IO snapshots wait_for_pr_completion() already reads, no extra polls
+io_edges = IOEdgeDetector(controller, motor_keys=[MOTOR_KEY])
+
+
+def on_io_edge(event):
+    if event.signal in ("pot", "not") and event.edge == "rising":
+        log.warning("[%s] %s limit switch hit.", event.motor_key, event.signal.upper(),
+                    extra={"motor": event.motor_key})
+
+
+io_edges.subscribe(on_io_edge)
+
+# Live state for local viewers and the web app, from reads the loop does anyway
+status_board = StatusBoard.create(MOTOR_ADDRESSES)
+status_board.attach(controller, poll_plan)
+drift = DriftAnalyzer()
+
+
+def on_drift(status):
+    if status.degraded:
+        log.warning("Test degraded at cycle %d: %s", status.cycle, "; ".join(status.reasons),
+                    extra={"cycle": status.cycle})
+    else:
+        log.info("Positioning back within limits at cycle %d.", status.cycle, extra={"cycle": status.cycle})
+
+
+drift.subscribe(on_drift)
+
+
+def record_metrics(store, index, start_ns, enc_start, enc_end, result="ok"):
+    store.record(JOINT, index, start_ns,
+                 duration_s=(time.time_ns() - start_ns) / 1e9,
+                 peak_current=health.cycle_peak(MOTOR_KEY),
+                 rms_current=health.end_cycle()[MOTOR_KEY],
+                 enc_start=enc_start, enc_end=enc_end,
+                 max_following_error=cycle_following_error["max"],
+                 alarms=cycle_alarms, result=result)
+
 
 def wait_for_pr_completion(motor_key, timeout=30):
     """
@@ -41,68 +150,94 @@ def wait_for_pr_completion(motor_key, timeout=30):
         pr_status = controller.check_pr(motor_key)
 
         if pr_status == 2:  # PR is completed
-            print(f"PR complete. Position: {controller.read_encoder(motor_key)}")
+            position = controller.read_encoder(motor_key)
+            log.info("PR complete. Position: %s", position, extra={"motor": motor_key, "encoder": position})
             return True
 
-        # Short sleep to prevent CPU overload
-        time.sleep(0.1)
+        # Short wait to prevent CPU overload; due telemetry polls use it
+        poll_plan.wait(0.1)
 
-    print(f"PR completion timed out after {timeout} seconds!")
+    log.error("PR completion timed out after %s seconds!", timeout, extra={"motor": motor_key})
     return False
 
 
-def sett():
-    controller.reset_encoder("right")
-    while True:
-
-        # en1=controller.read_encoder("right")
-        controller.move_incremental("right", 400, 400, 200, 100000)
-        time.sleep(1)
-        val1 = controller.read_register("right", 0x0B11)
-        data1 = val1 & 0x0001
-
-        if data1 == 0:
-            controller.reset_encoder("right")
-            time.sleep(2)
-            en1 = controller.read_encoder("right")
-            print(en1)
-            time.sleep(2)
-
-            while True:
-                # print("inside another while true")
-                controller.move_incremental("right", 400, 400, 200, -100000)
-                time.sleep(1)
-                val2 = controller.read_register("right", 0x0B11)
-                data2 = val2 & 0x0002
-                en3 = controller.read_encoder("right")
-                print(en3)
-                if data2 == 0:
-                    en2 = controller.read_encoder("right")
-                    print(en1, en2)
-                    update_csv("START_POS", en1, "multix_data.csv")
-                    update_csv("END_POS", en2, "multix_data.csv")
-                    break
-
-            break
+def run_move(steps, speed, hw_trigger=None):
+    """
+    One incremental move of the test drive. With a hardware trigger the move is only staged and
+    armed; the input edge starts it and the S-code end code confirms completion.
+    """
+    if hw_trigger is None:
+        controller.move_incremental(MOTOR_KEY, speed, DEFAULT_ACCEL, DEFAULT_DECEL, steps)
+        position = controller.read_encoder(MOTOR_KEY)
+        log.info("Encoder: %s", position, extra={"motor": MOTOR_KEY, "encoder": position})
+        return wait_for_pr_completion(MOTOR_KEY)
+    if not controller.stage_pr_move(MOTOR_KEY, speed, DEFAULT_ACCEL, DEFAULT_DECEL, steps, "INC"):
+        return False
+    if hw_trigger.arm() is None:
+        return False
+    log.info("Armed, waiting for the trigger input...")
+    return hw_trigger.wait_done(TRIGGER_TIMEOUT, idle=poll_plan.wait) is not None
+
+
+def sett(force=False):
+    """
+    Find the travel limits (velocity-mode approach, back-off, creep) and store them in
+    multix_data.csv. Skipped when the cached result still matches the drive parameters.
+    """
+    return calibrate_limits(controller, MOTOR_KEY, force=force)
 
 
-def main():
+def main(new_run=False):
     controller.reset_alarm(MOTOR_KEY)
     controller.reset_history_alarm(MOTOR_KEY)
     controller.reset_encoder(MOTOR_KEY)
     controller.reset_encoder(MOTOR_KEY)
     controller.reset_encoder(MOTOR_KEY)
-    print("encoder reset to 0")
+    log.info("encoder reset to 0")
 
-    print(controller.read_encoder("right"))
+    position = controller.read_encoder("right")
+    log.info("Encoder: %s", position, extra={"motor": "right", "encoder": position})
     time.sleep(2)
-    completion_count = CC_COMPLETE
+    # The journal is the durable cycle count; the CSV value is only a mirror for the dashboard
+    journal = CycleJournal(JOINT)
+    if new_run:
+        journal.rotate()
+    journaled = journal.recover()
+    csv_count = int(CC_COMPLETE)
+    # The CSV mirror trails the journal by at most CSV_UPDATE_INTERVAL after a crash. A count
+    # further below it was reset from the web app: the journal belongs to the previous test.
+    if csv_count < journaled - journal.recent(CSV_UPDATE_INTERVAL):
+        log.info("CC_COMPLETE %d is below the journaled %d cycles, starting a new journal.", csv_count, journaled)
+        journal.rotate()
+        journaled = journal.recover()
+    completion_count = max(csv_count, journaled)
+    finished = False
+    log.info("Resuming at cycle %d", completion_count, extra={"cycle": completion_count})
+    status_board.publish(MOTOR_KEY, cycle=completion_count)
+    last_csv_update = 0.0
+    metrics = MetricsStore()
+    hw_trigger = None
+    if HARDWARE_TRIGGER:
+        hw_trigger = HardwareTrigger(controller, [MOTOR_KEY])
+        if not hw_trigger.configure():
+            log.warning("Trigger input could not be configured, moves are started by the host.")
+            hw_trigger.restore()
+            hw_trigger = None
+    # Task timing fields are read fresh here, the names imported from myCSV are import-time copies
+    scheduler = scheduler_from_settings(
+        read_number('CYCLE_COUNT', 'multix_data.csv'),
+        read_number('RUN_TIME', 'multix_data.csv'),
+        read_number('REST_TIME', 'multix_data.csv'),
+        read_number('TOTAL_RUN_TIME', 'multix_data.csv'),
+        settle_s=SETTLE_TIME,
+    )
+    scheduler.start()
+    scheduler.pause()
     try:
         while True:
             # Reload CSV settings to get current values
             reloadCSV()
             status = read_setting('R_STATUS', 'multix_data.csv')
-            print(status)
             c_complete = CC_COMPLETE
             c2complete = C2COMPLETE
             speed1 = int(SPEED)
@@ -110,69 +245,120 @@ def main():
             pos2 = int(END_POS)
 
             # Print current status for debugging
-            print(f"Status: {status}, Completion: {c_complete}/{c2complete}")
+            log.info("Status: %s, Completion: %s/%s", status, c_complete, c2complete,
+                     extra={"status": status, "completed": c_complete, "required": c2complete})
 
             # Process based on status
             if status.lower() == "stop":
-                print("Stop command received. Waiting for 'running' status...")
-                time.sleep(0.5)
+                scheduler.pause()
+                log.info("Stop command received. Waiting for 'running' status...")
+                poll_plan.wait(0.5)
 
             elif status.lower() == "pause":
-                print("Paused. Waiting to resume...")
-                time.sleep(0.2)
+                scheduler.pause()
+                log.info("Paused. Waiting to resume...")
+                poll_plan.wait(0.2)
 
             elif status.lower() == "running":
+                if alarm_monitor.alarms(MOTOR_KEY):
+                    scheduler.pause()
+                    log.warning("Drive alarm active: %s", ", ".join(sorted(alarm_monitor.alarms(MOTOR_KEY))),
+                                extra={"motor": MOTOR_KEY})
+                    update_csv("R_STATUS", "pause", "multix_data.csv")
+                    continue
+                if health.level(MOTOR_KEY) == "pause":
+                    scheduler.pause()
+                    log.warning("Drive health limit reached. Pausing.", extra={"motor": MOTOR_KEY})
+                    update_csv("R_STATUS", "pause", "multix_data.csv")
+                    continue
+                if health.level(MOTOR_KEY) == "derate":
+                    speed1 = max(1, int(speed1 * DERATE_SPEED))
+                scheduler.resume()
                 # Check if we've completed the required cycles
                 if c_complete >= c2complete:
-                    print(f"Completed required {c2complete} cycles. Stopping.")
+                    log.info("Completed required %s cycles. Stopping.", c2complete)
+                    update_csv("R_STATUS", "stop", "multix_data.csv")
+                    finished = True
+                    break
+                if scheduler.budget_spent():
+                    log.info("Total run time budget spent. Stopping.")
                     update_csv("R_STATUS", "stop", "multix_data.csv")
                     break
 
-                print(f"Moving to end position: {end_pos}")
-                # Move to end position
-                controller.move_incremental("right", speed1, DEFAULT_ACCEL, DEFAULT_DECEL, -1*(end_pos))
-                print(controller.read_encoder("right"))
-
-                # Wait for PR to complete before proceeding
-                if not wait_for_pr_completion(MOTOR_KEY):
-                    print("PR did not complete for forward motion. Stopping cycle.")
+                scheduler.begin_cycle()
+                health.begin_cycle()
+                cycle_alarms.clear()
+                cycle_alarms.update(alarm_monitor.alarms(MOTOR_KEY))
+                cycle_following_error["max"] = None
+                cycle_start_ns = time.time_ns()
+                log.info("Moving to end position: %d", end_pos)
+                # Move to end position and wait for the PR to complete before proceeding
+                if not run_move(-1*(end_pos), speed1, hw_trigger):
+                    log.error("PR did not complete for forward motion. Stopping cycle and pausing.",
+                              extra={"cycle": completion_count + 1})
+                    journal.append(completion_count + 1, cycle_start_ns, time.time_ns(), None, None, "fail")
+                    record_metrics(metrics, completion_count + 1, cycle_start_ns, None, None, "fail")
+                    # Close the cycle and wait for the operator instead of retrying at once
+                    scheduler.abort_cycle()
+                    update_csv("R_STATUS", "pause", "multix_data.csv")
                     continue
-                controller.read_encoder("right")
-                print("Reached end position. Waiting 1 second...")
-                time.sleep(1)  # Wait a moment at the end position
-
-                print(f"Moving back to start position: {start_pos}")
-                # Move back to start position
-                controller.move_incremental("right", speed1, DEFAULT_ACCEL, DEFAULT_DECEL, -1000000)
-
-                # Wait for PR to complete before proceeding
-                if not wait_for_pr_completion(MOTOR_KEY):
-                    print("PR did not complete for reverse motion. Stopping cycle.")
+                scheduler.mark_phase("out")
+                enc_end = controller.read_encoder("right")
+                out_pair = controller.read_position_pair(MOTOR_KEY)
+                log.info("Reached end position. Waiting %s second...", SETTLE_TIME, extra={"encoder": enc_end})
+                scheduler.dwell(SETTLE_TIME, after="out")  # bus and print time is part of the dwell
+
+                log.info("Moving back to start position: %d", start_pos)
+                # Move back to start position and wait for the PR to complete before proceeding
+                if not run_move(-1000000, speed1, hw_trigger):
+                    log.error("PR did not complete for reverse motion. Stopping cycle and pausing.",
+                              extra={"cycle": completion_count + 1})
+                    journal.append(completion_count + 1, cycle_start_ns, time.time_ns(), None, enc_end, "fail")
+                    record_metrics(metrics, completion_count + 1, cycle_start_ns, None, enc_end, "fail")
+                    # Close the cycle and wait for the operator instead of retrying at once
+                    scheduler.abort_cycle()
+                    update_csv("R_STATUS", "pause", "multix_data.csv")
                     continue
-                controller.read_encoder("right")
-                print(controller.read_encoder("right"))
-                print("Reached start position. Cycle completed.")
-
-                # Increment completion count and update CSV
+                scheduler.mark_phase("back")
+                enc_start = controller.read_encoder("right")
+                back_pair = controller.read_position_pair(MOTOR_KEY)
+                log.info("Reached start position. Cycle completed.", extra={"encoder": enc_start})
+                rms = health.end_cycle()[MOTOR_KEY]
+                if rms is not None:
+                    log.info("RMS current: %.2f A", rms, extra={"motor": MOTOR_KEY, "rms_a": rms})
+
+                # Increment completion count, journal it and mirror it to the CSV
                 completion_count += 1
-                update_csv("CC_COMPLETE", str(completion_count), "multix_data.csv")
-
-                print(f"Completed cycles: {completion_count}/{c2complete}")
+                status_board.publish(MOTOR_KEY, cycle=completion_count)
+                journal.append(completion_count, cycle_start_ns, time.time_ns(), enc_start, enc_end)
+                record_metrics(metrics, completion_count, cycle_start_ns, enc_start, enc_end)
+                drift.add(completion_count, out_pair, back_pair)
+                if time.monotonic() - last_csv_update >= CSV_UPDATE_INTERVAL or completion_count >= c2complete:
+                    update_csv("CC_COMPLETE", str(completion_count), "multix_data.csv")
+                    last_csv_update = time.monotonic()
+
+                log.info("Completed cycles: %d/%s", completion_count, c2complete,
+                         extra={"cycle": completion_count, "required": c2complete})
                 if completion_count >= c2complete:
-                    print(f"Completed required {c2complete} cycles. Stopping.")
+                    log.info("Completed required %s cycles. Stopping.", c2complete)
                     update_csv("R_STATUS", "stop", "multix_data.csv")
+                    finished = True
                     break
 
-                time.sleep(1)
+                # Waits for the next cycle slot (or settle dwell) and applies block rests
+                if not scheduler.end_cycle():
+                    log.info("Total run time budget spent. Stopping.")
+                    update_csv("R_STATUS", "stop", "multix_data.csv")
+                    break
 
             else:
-                print(f"Unknown status: {status}. Waiting for valid status...")
+                log.warning("Unknown status: %s. Waiting for valid status...", status)
                 time.sleep(0.5)
 
     except KeyboardInterrupt:
-        print("\nProgram interrupted by user. Stopping motors and exiting...")
+        log.warning("Program interrupted by user. Stopping motors and exiting...")
     except Exception as e:
-        print(f"Error in main loop: {e}")
+        log.exception("Error in main loop: %s", e)
     finally:
         # Ensure motors are stopped
         try:
@@ -182,11 +368,27 @@ def main():
         except:
             pass
 
-        print("Program terminated.")
+        if hw_trigger is not None:
+            hw_trigger.restore()
+        if finished:
+            # The test is done: the next run of this joint starts a fresh journal
+            journal.rotate()
+        else:
+            journal.close()
+        metrics.close()
+        status_board.close()
+        update_csv("CC_COMPLETE", str(completion_count), "multix_data.csv")
+        log.info("Cycle timing: %s", scheduler.summary())
+        log.info("Drive health: %s", health.summary())
+        log.info("Positioning: %s", drift.summary())
+        log.info("Bus outages: %d, %.1f s in total", len(controller.outages), controller.outage_s)
+        log.info("Retries: %s", controller.retry_stats.summary())
+        log.info("Logging: %s", log_stats())
+        log.info("Program terminated.")
 
 
 if __name__ == "__main__":
     sett()
     time.sleep(2)
 
-    main()
\ No newline at end of file
+    main(new_run="--new-run" in sys.argv)
\ No newline at end of file
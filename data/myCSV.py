@@ -1,4 +1,5 @@
 import csv
+from program_loader import PROGRAMS
 
 def read_setting(setting_name, csv_file):
     try:
@@ -13,55 +14,52 @@ def read_setting(setting_name, csv_file):
         print(f"Error reading setting '{setting_name}': {e}")
     return None
 
+def read_number(setting_name, csv_file, default=0.0):
+    """
+    Numeric setting that may be missing from older CSV files.
+    """
+    value = read_setting(setting_name, csv_file)
+    try:
+        return float(value) if value not in (None, "") else default
+    except ValueError:
+        return default
+
 def readByIndex(csv_file, index):
+    """
+    Raw (mag, dir, unit, mid, vel, lmn, lmx, ldt) cells of program line `index` (0-based).
+    The program is parsed once by program_loader and only reloaded when the file changes.
+    """
     try:
-        with open(csv_file, 'r', newline='') as file:
-            reader = csv.reader(file)
-            # Skip the header
-            next(reader, None)
-            for idx, row in enumerate(reader):
-                if idx == index:
-                    try:
-                        # Assuming `mag`, `dir`, `unit` are at specific column indices
-                        mag = row[1]
-                        dir = row[2]
-                        unit = row[3]
-                        mid = row[4]
-                        vel = row[5]
-                        lmn = row[6]
-                        lmx = row[7]
-                        ldt = row[8]
-                        return mag, dir, unit, mid, vel, lmn, lmx, ldt
-                    except IndexError as e:
-                        print(f"Error reading row at index {index}: {e}")
-                        return None, None, None, None, None, None, None, None
+        table = PROGRAMS.get(csv_file)
+        if 0 <= index < len(table):
+            return table.raw[index]
+        print(f"Error reading row at index {index}: out of range")
     except FileNotFoundError as e:
         print(f"File not found: {e}")
     except Exception as e:
         print(f"An error occurred while reading the CSV file: {e}")
     return None, None, None, None, None, None, None, None
 
+def readStep(csv_file, index):
+    """
+    Typed, validated step (program_loader.Step) at `index`, or None.
+    """
+    try:
+        return PROGRAMS.get(csv_file).step(index)
+    except Exception as e:
+        print(f"Error reading step {index} of {csv_file}: {e}")
+        return None
+
 def lastIndex(csv_file):
     try:
-        with open(csv_file, 'r', newline='') as file:
-            reader = csv.reader(file)
-            next(reader, None)  # Skip the header
-            row_count = sum(1 for row in reader)  # Summing the total number of rows
-        return row_count   # Return the last index (0-based)
+        return len(PROGRAMS.get(csv_file))  # Number of program lines
     except Exception as e:
         print(f"An error occurred while counting rows: {e}")
         return None
 
 def checkSeq(csv_file):
     try:
-        with open(csv_file, 'r', newline='') as file:
-            reader = csv.DictReader(file)
-            expected_id = 1  # Start counting from 1
-            for row in reader:
-                if int(row['id']) != expected_id:
-                    return False
-                expected_id += 1  # Increment expected ID for the next row
-        return True  # If all IDs were as expected, return True
+        return PROGRAMS.get(csv_file).sequential  # ids run 1, 2, 3, ... (checked at load)
     except Exception as e:
         print(f"Error checking sequence: {e}")
         return False
@@ -84,34 +82,38 @@ def update_csv(setting, new_value, csv_file):
     except Exception as e:
         print(f"Error updating CSV: {e}")
 
-def read_program_state(csv_file):
+def write_settings(settings, csv_file):
+    """
+    Updates several settings in one rewrite of the file; settings that are missing are appended.
+    """
     try:
-        with open(csv_file, 'r', newline='') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                program = row.get('program', '').strip()  # Get and strip whitespace
-                line = row.get('line', '').strip()  # Get and strip whitespace
+        with open(csv_file, 'r') as file:
+            rows = list(csv.DictReader(file))
+        pending = {name: str(value) for name, value in settings.items()}
+        for row in rows:
+            if row['Setting'] in pending:
+                row['Value'] = pending.pop(row['Setting'])
+        rows.extend({'Setting': name, 'Value': value} for name, value in pending.items())
 
-                if program and line.isdigit():  # Check if program is not empty and line is a valid integer
-                    return program, int(line)
+        with open(csv_file, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=['Setting', 'Value'])
+            writer.writeheader()
+            writer.writerows(rows)
+        return True
+    except Exception as e:
+        print(f"Error writing settings to {csv_file}: {e}")
+        return False
+
+def read_program_state(csv_file):
+    try:
+        return PROGRAMS.read_state(csv_file)
     except Exception as e:
         print(f"Error reading program state: {e}")
     return None, None  # Return None if no valid data is found
 
 def update_program_state(program, line, csv_file):
     try:
-        with open(csv_file, 'r', newline='') as file:
-            reader = list(csv.DictReader(file))
-
-        if reader:
-            reader[0]['program'] = program
-            reader[0]['line'] = line
-
-        with open(csv_file, 'w', newline='') as file:
-            fieldnames = ['program', 'line']
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
-            writer.writeheader()
-            writer.writerows(reader)
+        PROGRAMS.write_state(program, line, csv_file)
     except Exception as e:
         print(f"Error updating program state: {e}")
 RIGHT_MOTOR = int(read_setting('RIGHT_MOTOR', 'Hardware.csv'))
@@ -162,6 +164,10 @@ END_POS = int(read_setting('END_POS', 'multix_data.csv'))
 R_STATUS = read_setting('R_STATUS', 'multix_data.csv')
 C2COMPLETE = float(read_setting('C2COMPLETE', 'multix_data.csv'))
 CC_COMPLETE = float(read_setting('CC_COMPLETE', 'multix_data.csv'))
+CYCLE_COUNT = read_number('CYCLE_COUNT', 'multix_data.csv')
+RUN_TIME = read_number('RUN_TIME', 'multix_data.csv')
+REST_TIME = read_number('REST_TIME', 'multix_data.csv')
+TOTAL_RUN_TIME = read_number('TOTAL_RUN_TIME', 'multix_data.csv')
 def reloadCSV():
     try:
         global RIGHT_MOTOR, LEFT_MOTOR, BAUDRATE, SERIAL_PORT, RADIUS, WHEEL_DIA, PPR, BOTTOM_CAM
@@ -170,6 +176,7 @@ def reloadCSV():
         global ARUDIND, ARUANGSTP, CAMTOCENTRE, DSHOW, HYPTHRESHOLD, CONTROLUNIT, PORTNO,TOLANG
         global LIFT_MOTOR,DRAG_MOTOR,ACC_PORT,LIFT_GEAR,DRAG_GEAR
         global JOINT,SPEED,START_POS,END_POS,R_STATUS,C2COMPLETE,CC_COMPLETE
+        global CYCLE_COUNT,RUN_TIME,REST_TIME,TOTAL_RUN_TIME
 
         LIFT_MOTOR = int(read_setting('LIFT_MOTOR', 'Hardware.csv'))
         DRAG_MOTOR = int(read_setting('DRAG_MOTOR', 'Hardware.csv'))
@@ -217,6 +224,10 @@ def reloadCSV():
         R_STATUS = read_setting('R_STATUS', 'multix_data.csv')
         C2COMPLETE = float(read_setting('C2COMPLETE', 'multix_data.csv'))
         CC_COMPLETE = float(read_setting('CC_COMPLETE', 'multix_data.csv'))
+        CYCLE_COUNT = read_number('CYCLE_COUNT', 'multix_data.csv')
+        RUN_TIME = read_number('RUN_TIME', 'multix_data.csv')
+        REST_TIME = read_number('REST_TIME', 'multix_data.csv')
+        TOTAL_RUN_TIME = read_number('TOTAL_RUN_TIME', 'multix_data.csv')
     except Exception as e:
         print(f"Error reloading CSV: {e}")
 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Indexed Program Loader
+----------------------
+Parses a program CSV (id, mag, dir, unit, mid, vel, lmn, lmx, ldt) once into column arrays so
+the interpreter can step through it with O(1) indexed access instead of re-opening and scanning
+the file for every line.
+
+A loaded program is re-validated only when the file changes (mtime/size). If the file only grew
+(new lines appended) just the new lines are parsed; any other edit triggers a full reload.
+
+Missing cells: float columns hold NaN, integer columns (id, mid, lmn, lmx) a validity bit in
+`valid`, so every integer (including -1) is a usable value. Blank lines keep their index, as the
+old line-by-line readByIndex() counted them, but are left out of the id sequence check.
+
+The program-state checkpoint (program, line) lives in the same store, cached in memory and
+written atomically, so read_program_state() does not touch the disk between updates.
+"""
+
+import csv
+import io
+import os
+import zlib
+from array import array
+from collections import namedtuple
+
+from async_log import get_logger
+
+log = get_logger("program_loader")
+
+Step = namedtuple("Step", "id mag dir unit mid vel lmn lmx ldt")
+
+UNITS = ("mm", "cm", "m", "inch", "feet", "deg", "rad")
+NAN = float("nan")
+
+# Bits of ProgramTable.valid: the integer cell of that column was present
+VALID_ID  = 0x01
+VALID_MID = 0x02
+VALID_LMN = 0x04
+VALID_LMX = 0x08
+
+
+def _num(text, cast, name, errors, line_no):
+    text = text.strip()
+    if text == "":
+        return None
+    try:
+        return cast(text)
+    except ValueError:
+        try:
+            # ints written as "10.0" by spreadsheets
+            if cast is int:
+                value = float(text)
+                if value.is_integer():
+                    return int(value)
+        except ValueError:
+            pass
+        errors.append(f"line {line_no}: {name}={text!r} is not a number")
+        return None
+
+
+class ProgramTable:
+    """
+    Column-oriented, validated copy of one program file.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.errors = []
+        self._reset()
+
+    def _reset(self):
+        self.ids = array("l")
+        self.mag = array("d")
+        self.vel = array("d")
+        self.mid = array("l")
+        self.lmn = array("l")
+        self.lmx = array("l")
+        self.ldt = array("d")
+        self.valid = array("B")  # VALID_* bits per line
+        self.dir = []
+        self.unit = []
+        self.raw = []            # original cells, for readByIndex compatibility
+        self.sequential = True
+        self.steps = 0           # non-blank lines, the id each new step is expected to carry
+        self.errors = []
+        self._stat = None
+        self._size = 0
+        self._crc = 0
+
+    def __len__(self):
+        return len(self.raw)
+
+    # --- Loading ---
+    def _parse_rows(self, text, first_line_no, has_header):
+        reader = csv.reader(io.StringIO(text))
+        line_no = first_line_no
+        if has_header:
+            next(reader, None)
+            line_no += 1
+        for row in reader:
+            line_no += 1
+            if not row:
+                # Blank line: keeps its index, readByIndex() returned Nones for it
+                self._append(None, None, None, None, None, None, None, "", "")
+                self.raw.append((None,) * 8)
+                continue
+            short = len(row) < 9
+            if short:
+                self.errors.append(f"line {line_no}: expected 9 columns, got {len(row)}")
+                row = row + [""] * (9 - len(row))
+            errors = self.errors
+            step_id = _num(row[0], int, "id", errors, line_no)
+            unit = row[3].strip()
+            if unit and unit.lower() not in UNITS:
+                errors.append(f"line {line_no}: unknown unit {unit!r}")
+            mag = _num(row[1], float, "mag", errors, line_no)
+            vel = _num(row[5], float, "vel", errors, line_no)
+            mid = _num(row[4], int, "mid", errors, line_no)
+            lmn = _num(row[6], int, "lmn", errors, line_no)
+            lmx = _num(row[7], int, "lmx", errors, line_no)
+            ldt = _num(row[8], float, "ldt", errors, line_no)
+
+            self.steps += 1
+            if step_id != self.steps:
+                self.sequential = False
+            self._append(step_id, mag, vel, mid, lmn, lmx, ldt, row[2].strip(), unit)
+            # readByIndex() gave Nones for a short row (the padding is only for the typed columns)
+            self.raw.append((None,) * 8 if short else tuple(row[1:9]))
+
+    def _append(self, step_id, mag, vel, mid, lmn, lmx, ldt, direction, unit):
+        valid = 0
+        for bit, value in ((VALID_ID, step_id), (VALID_MID, mid), (VALID_LMN, lmn), (VALID_LMX, lmx)):
+            if value is not None:
+                valid |= bit
+        self.valid.append(valid)
+        self.ids.append(step_id or 0)
+        self.mag.append(NAN if mag is None else mag)
+        self.vel.append(NAN if vel is None else vel)
+        self.mid.append(mid or 0)
+        self.lmn.append(lmn or 0)
+        self.lmx.append(lmx or 0)
+        self.ldt.append(NAN if ldt is None else ldt)
+        self.dir.append(direction)
+        self.unit.append(unit)
+
+    def load(self):
+        """
+        (Re)loads the file if it changed since the last load. Returns True if anything was parsed.
+        """
+        st = os.stat(self.path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        if stamp == self._stat:
+            return False
+        with open(self.path, "rb") as f:
+            data = f.read()
+
+        old = self._size
+        reported = len(self.errors)
+        if self._stat is not None and len(data) > old and zlib.crc32(data[:old]) == self._crc \
+                and data[old - 1:old] == b"\n":
+            # Append-only change: parse the new tail only
+            tail = data[old:].decode("utf-8-sig" if old == 0 else "utf-8")
+            self._parse_rows(tail, data[:old].count(b"\n"), has_header=False)
+        else:
+            self._reset()
+            reported = 0
+            self._parse_rows(data.decode("utf-8-sig"), 0, has_header=True)
+
+        self._size = len(data)
+        self._crc = zlib.crc32(data)
+        self._stat = stamp
+        for err in self.errors[reported:]:
+            log.warning("%s: %s", self.path, err)
+        return True
+
+    # --- Access ---
+    def step(self, index):
+        """
+        Typed step at 0-based index (None for blank fields). Raises IndexError.
+        """
+        valid = self.valid[index]
+
+        def num(v):
+            return None if v != v else v
+
+        def opt(column, bit):
+            return column[index] if valid & bit else None
+        return Step(
+            opt(self.ids, VALID_ID),
+            num(self.mag[index]),
+            self.dir[index],
+            self.unit[index],
+            opt(self.mid, VALID_MID),
+            num(self.vel[index]),
+            opt(self.lmn, VALID_LMN),
+            opt(self.lmx, VALID_LMX),
+            num(self.ldt[index]),
+        )
+
+
+class ProgramStore:
+    """
+    Cache of loaded programs plus the (program, line) checkpoint.
+    """
+
+    def __init__(self):
+        self.programs = {}
+        self._state = {}         # state file -> (stamp, (program, line))
+
+    def get(self, path):
+        table = self.programs.get(path)
+        if table is None:
+            table = ProgramTable(path)
+            self.programs[path] = table
+        table.load()
+        return table
+
+    # --- Checkpoint ---
+    def read_state(self, csv_file):
+        st = os.stat(csv_file)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = self._state.get(csv_file)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        state = (None, None)
+        with open(csv_file, "r", newline="") as file:
+            for row in csv.DictReader(file):
+                program = (row.get("program") or "").strip()
+                line = (row.get("line") or "").strip()
+                if program and line.isdigit():
+                    state = (program, int(line))
+                    break
+        self._state[csv_file] = (stamp, state)
+        return state
+
+    def write_state(self, program, line, csv_file):
+        """
+        Sets program/line in the first row; any further rows and columns are kept as they are.
+        """
+        rows = []
+        fieldnames = ["program", "line"]
+        if os.path.exists(csv_file):
+            with open(csv_file, "r", newline="") as file:
+                reader = csv.DictReader(file)
+                rows = [{k: v for k, v in row.items() if k is not None} for row in reader]
+                fieldnames += [f for f in reader.fieldnames or () if f not in fieldnames]
+        if rows:
+            rows[0]["program"] = program
+            rows[0]["line"] = line
+        else:
+            rows = [{"program": program, "line": line}]
+        tmp = csv_file + ".tmp"
+        with open(tmp, "w", newline="") as file:
+            writer = csv.DictWriter(file, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(rows)
+        os.replace(tmp, csv_file)
+        st = os.stat(csv_file)
+        line = int(line) if str(line).isdigit() else line
+        self._state[csv_file] = ((st.st_mtime_ns, st.st_size), (program, line))
+
+
+PROGRAMS = ProgramStore()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Deadline-Based Cycle Scheduler
+------------------------------
+Paces endurance cycles against time.monotonic_ns() deadlines instead of fixed sleeps.
+
+Task timing fields (as entered on the Task page, stored in multix_data.csv):
+    CYCLE_COUNT     cycles per run block
+    RUN_TIME        hours allowed for one block   -> planned cycle period = RUN_TIME / CYCLE_COUNT
+    REST_TIME       minutes of rest between blocks
+    TOTAL_RUN_TIME  hours for the whole test       -> hard budget
+
+Cycle starts are anchored to block_origin + n * period, so time spent on bus I/O and CSV
+updates is absorbed by the wait instead of adding up as drift. Dwells inside a cycle are
+measured from the moment the previous phase was seen complete (mark_phase), not from the
+moment the sleep is called.
+
+Per-cycle start lateness (actual - planned) is kept for jitter statistics.
+"""
+
+import math
+import time
+from array import array
+
+from async_log import get_logger
+
+log = get_logger("scheduler")
+
+NS_PER_S = 1_000_000_000
+SPIN_NS = 1_500_000  # the last 1.5 ms of a wait is spun instead of slept
+
+
+def sleep_until(deadline_ns):
+    """
+    Sleeps until time.monotonic_ns() >= deadline_ns. Coarse sleep first, short spin at the end.
+    Returns how late (ns) the wake-up was.
+    """
+    while True:
+        remaining = deadline_ns - time.monotonic_ns()
+        if remaining <= 0:
+            return -remaining
+        if remaining > SPIN_NS:
+            time.sleep((remaining - SPIN_NS) / NS_PER_S)
+
+
+class CycleScheduler:
+    def __init__(self, period_s=None, settle_s=1.0, cycles_per_block=0, block_budget_s=0,
+                 rest_s=0, total_budget_s=0, elapsed_offset_s=0):
+        """
+        period_s: planned cycle period, None to run cycles back to back (settle dwell only)
+        settle_s: dwell at the end of a cycle when no period is planned
+        cycles_per_block / block_budget_s: a block ends after this many cycles or seconds (0 = never)
+        rest_s: rest between blocks
+        total_budget_s: stop the test once this much run time is spent (0 = unlimited)
+        elapsed_offset_s: run time already spent in earlier sessions of the same test
+        """
+        self.period_ns = int(period_s * NS_PER_S) if period_s else None
+        self.settle_ns = int(settle_s * NS_PER_S)
+        self.cycles_per_block = int(cycles_per_block or 0)
+        self.block_budget_ns = int((block_budget_s or 0) * NS_PER_S)
+        self.rest_ns = int((rest_s or 0) * NS_PER_S)
+        self.total_budget_ns = int((total_budget_s or 0) * NS_PER_S)
+        self.elapsed_offset_ns = int((elapsed_offset_s or 0) * NS_PER_S)
+
+        self.started_ns = None
+        self.block_origin_ns = None
+        self.block_cycles = 0
+        self.cycle_start_ns = None
+        self.phase_marks = {}
+        self.resting_ns = 0          # time spent resting/paused, not counted against budgets
+        self.paused_at_ns = None
+
+        self.cycles = 0
+        self.aborted = 0
+        self.overruns = 0
+        self.lateness_ns = array("q")
+        self.durations_ns = array("q")
+
+    # --- Lifecycle ---
+    def start(self):
+        now = time.monotonic_ns()
+        self.started_ns = now
+        self.block_origin_ns = now
+        self.block_cycles = 0
+        return now
+
+    def pause(self):
+        """
+        Call when the runner stops cycling (pause/stop status). Paused time is not run time.
+        """
+        if self.paused_at_ns is None:
+            self.paused_at_ns = time.monotonic_ns()
+
+    def resume(self):
+        """
+        Re-anchors the schedule so the cycles missed while paused are not caught up.
+        """
+        if self.paused_at_ns is None:
+            return
+        now = time.monotonic_ns()
+        self.resting_ns += now - self.paused_at_ns
+        self.paused_at_ns = None
+        self.block_origin_ns = now
+        self.block_cycles = 0
+
+    # --- Budgets ---
+    def run_time_ns(self):
+        """
+        Active run time of the test so far, including earlier sessions.
+        """
+        if self.started_ns is None:
+            return self.elapsed_offset_ns
+        now = self.paused_at_ns if self.paused_at_ns is not None else time.monotonic_ns()
+        return self.elapsed_offset_ns + now - self.started_ns - self.resting_ns
+
+    def budget_spent(self):
+        return bool(self.total_budget_ns) and self.run_time_ns() >= self.total_budget_ns
+
+    def _block_done(self):
+        if self.cycles_per_block and self.block_cycles >= self.cycles_per_block:
+            return True
+        if self.block_budget_ns and time.monotonic_ns() - self.block_origin_ns >= self.block_budget_ns:
+            return True
+        return False
+
+    # --- Cycle Phases ---
+    def begin_cycle(self):
+        """
+        Waits for the planned start of the next cycle and records its lateness.
+        Returns the cycle start timestamp (ns).
+        """
+        if self.started_ns is None:
+            self.start()
+        if self.period_ns:
+            planned = self.block_origin_ns + self.block_cycles * self.period_ns
+            late = sleep_until(planned)
+            if late > self.period_ns:
+                # More than a whole period behind: re-anchor instead of running cycles back to back
+                self.overruns += 1
+                self.block_origin_ns += late - late % self.period_ns
+        else:
+            late = 0
+        self.cycle_start_ns = time.monotonic_ns()
+        self.phase_marks = {}
+        self.lateness_ns.append(late)
+        return self.cycle_start_ns
+
+    def mark_phase(self, name):
+        """
+        Records when a phase (e.g. a move) was seen complete; dwells are measured from here.
+        """
+        now = time.monotonic_ns()
+        self.phase_marks[name] = now
+        return now
+
+    def dwell(self, seconds, after=None):
+        """
+        Dwells until `seconds` after the given phase mark (default: the latest mark), so any
+        I/O done since the mark is part of the dwell.
+        """
+        if after is not None:
+            ref = self.phase_marks.get(after, time.monotonic_ns())
+        elif self.phase_marks:
+            ref = max(self.phase_marks.values())
+        else:
+            ref = time.monotonic_ns()
+        return sleep_until(ref + int(seconds * NS_PER_S))
+
+    def end_cycle(self):
+        """
+        Closes the cycle. Without a planned period the settle dwell is applied here; with a
+        period the next begin_cycle() waits for its slot. Rests between blocks are applied here.
+        Returns False once the total run time budget is spent.
+        """
+        now = time.monotonic_ns()
+        self.durations_ns.append(now - self.cycle_start_ns)
+        self.cycles += 1
+        self.block_cycles += 1
+
+        if self._block_done():
+            if self.period_ns:
+                # The last cycle of a block still owns its whole slot
+                sleep_until(self.block_origin_ns + self.block_cycles * self.period_ns)
+            if self.rest_ns:
+                log.info("Block of %d cycles done, resting %.1f min.", self.block_cycles, self.rest_ns / NS_PER_S / 60)
+                rest_start = time.monotonic_ns()
+                sleep_until(rest_start + self.rest_ns)
+                self.resting_ns += time.monotonic_ns() - rest_start
+            self.block_origin_ns = time.monotonic_ns()
+            self.block_cycles = 0
+        elif not self.period_ns:
+            self.dwell(self.settle_ns / NS_PER_S)
+        return not self.budget_spent()
+
+    def abort_cycle(self):
+        """
+        Closes a cycle that failed (e.g. a move that did not complete) without counting it as
+        run. The scheduler is paused, so the time until the runner resumes is neither run time
+        nor a missed slot; resume() re-anchors the schedule.
+        """
+        self.aborted += 1
+        self.phase_marks = {}
+        self.pause()
+
+    # --- Statistics ---
+    def jitter_stats(self):
+        """
+        Start lateness statistics in microseconds (mean, std, max, p99) and cycle-rate error.
+        """
+        n = len(self.lateness_ns)
+        if n == 0:
+            return {"cycles": 0}
+        lat = sorted(self.lateness_ns)
+        mean = sum(lat) / n
+        var = sum((x - mean) ** 2 for x in lat) / n
+        stats = {
+            "cycles": self.cycles,
+            "aborted": self.aborted,
+            "overruns": self.overruns,
+            "lateness_mean_us": mean / 1000,
+            "lateness_std_us": math.sqrt(var) / 1000,
+            "lateness_max_us": lat[-1] / 1000,
+            "lateness_p99_us": lat[min(n - 1, int(n * 0.99))] / 1000,
+        }
+        if self.durations_ns:
+            stats["cycle_mean_s"] = sum(self.durations_ns) / len(self.durations_ns) / NS_PER_S
+        if self.period_ns and self.cycles > 1:
+            # Average achieved start-to-start period vs the plan, over the whole run
+            achieved = (self.cycle_start_ns - self.started_ns - self.resting_ns) / (self.cycles - 1)
+            stats["period_error_ppm"] = (achieved - self.period_ns) / self.period_ns * 1e6
+        return stats
+
+    def summary(self):
+        s = self.jitter_stats()
+        if not s.get("cycles"):
+            return "No cycles run."
+        text = (f"{s['cycles']} cycles, start lateness mean {s['lateness_mean_us']:.0f} us, "
+                f"std {s['lateness_std_us']:.0f} us, p99 {s['lateness_p99_us']:.0f} us, "
+                f"max {s['lateness_max_us']:.0f} us, overruns {s['overruns']}, aborted {s['aborted']}")
+        if "period_error_ppm" in s:
+            text += f", period error {s['period_error_ppm']:.0f} ppm"
+        return text
+
+
+def scheduler_from_settings(cycle_count, run_time_hr, rest_time_min, total_run_time_hr, settle_s=1.0):
+    """
+    Builds a scheduler from the Task timing fields (units as entered on the Task page).
+    """
+    period_s = None
+    if cycle_count and run_time_hr:
+        period_s = run_time_hr * 3600.0 / cycle_count
+    return CycleScheduler(
+        period_s=period_s,
+        settle_s=settle_s,
+        cycles_per_block=cycle_count,
+        block_budget_s=run_time_hr * 3600.0,
+        rest_s=rest_time_min * 60.0,
+        total_budget_s=total_run_time_hr * 3600.0,
+    )
@@ -25,14 +25,15 @@ import tkinter as tk
 from tkinter import simpledialog
 from driver import *
 from myCSV import *
+from status_board import StatusBoard
 # Define your configuration
 SERIAL_PORT = SERIAL_PORT  # Update with your actual serial port
 BAUDRATE = BAUDRATE  # Update as needed
 MOTOR_ADDRESSES = {
-    "right": 1,
-    "left": 2,
-    "lift": 3,
-    "drag": 4
+    "right": RIGHT_MOTOR,
+    "left": LEFT_MOTOR,
+    "lift": LIFT_MOTOR,
+    "drag": DRAG_MOTOR
 }
 
 # Default movement parameters
@@ -47,6 +48,7 @@ controller = ServoController(SERIAL_PORT, BAUDRATE, MOTOR_ADDRESSES)
 controller.write_register("right", 0x0003, 6)  # Setting in PR mode
 controller.write_register("right", 0x6000, 0x0)
 print("Controller initialized successfully!")
+status_board = StatusBoard.open()
 
 # Function to get numeric input from user
 def get_numeric_input(title, prompt):
@@ -66,9 +68,14 @@ def get_numeric_input(title, prompt):
     return None
 
 
-# Print status information
+# Print status information; while another process owns the bus (e.g. the runner) its status
+# board is read instead of polling the drive
 def print_status():
     try:
+        status = status_board.fresh("right") if status_board is not None else None
+        if status is not None and status.encoder is not None:
+            print(f"Right motor encoder: {status.encoder} (cycle {status.cycle})")
+            return
         encoder_value = controller.read_encoder("right")
         print(f"Right motor encoder: {encoder_value}")
     except Exception as e:
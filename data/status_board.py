@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+"""
+Shared-Memory Status Board
+--------------------------
+The process that owns the bus publishes the latest state of every drive (encoder, status word,
+inputs, alarm code, cycle count, timestamp) into a fixed-layout memory-mapped file. Any number of
+local readers (viewers, standalone.py, the HTTP bridge for the web app) read it at memory speed
+without sending a single frame.
+
+Only values the owner already reads are published: IO snapshots (io_listeners), encoder reads
+(encoder_listeners) and the alarm poll of the telemetry plan. Publishing adds no bus traffic.
+
+Layout (little-endian, never resized, so readers can stay mapped across writer restarts):
+    header   64 bytes   magic "SVBD", version, drives in use, writer pid (0 = no writer),
+                        board start (ns)
+    slot n   64 bytes   seq, motor key (8 bytes), time (ns since epoch), encoder, cycle,
+                        status word, inputs, alarm code, valid bits
+
+Every slot is protected by a seqlock: the single writer makes seq odd, writes the payload and
+makes it even again; a reader copies the payload and retries if seq was odd or changed meanwhile.
+Readers never block the writer.
+
+Usage:
+    python status_board.py                  print the board once
+    python status_board.py --serve [port]   HTTP JSON bridge (GET /status) for the web app
+
+Dependencies:
+    - mmap, struct
+    - http.server (bridge only)
+    - async_log
+"""
+
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+import time
+from collections import namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from async_log import get_logger
+
+log = get_logger("status_board")
+
+BOARD_PATH      = os.path.join(tempfile.gettempdir(), "servo_status.board")
+BOARD_MAGIC     = b"SVBD"
+BOARD_VERSION   = 1
+MAX_DRIVES      = 8
+HEADER_SIZE     = 64
+SLOT_SIZE       = 64
+BOARD_SIZE      = HEADER_SIZE + MAX_DRIVES * SLOT_SIZE
+READ_SPINS      = 1000         # seqlock retries before a read gives up
+STALE_AFTER     = 5.0          # s without an update before readers treat a drive as stale
+BRIDGE_PORT     = 8010
+
+HEADER  = struct.Struct("<4sHHqq")     # magic, version, drives, writer pid, started (ns)
+SEQ     = struct.Struct("<Q")
+PAYLOAD = struct.Struct("<8sqqqHHHH")  # key, time (ns), encoder, cycle, status, inputs, alarm, valid
+
+VALID_ENCODER   = 0x01
+VALID_STATUS    = 0x02
+VALID_ALARM     = 0x04
+VALID_CYCLE     = 0x08
+
+DriveStatus = namedtuple("DriveStatus", "motor_key time_ns encoder status inputs alarm cycle")
+
+
+def _slot_offset(index):
+    return HEADER_SIZE + index * SLOT_SIZE
+
+
+class StatusBoard:
+    def __init__(self, board, writer):
+        self.board = board
+        self.writer = writer
+        self.offsets = {}
+        self.started_ns = None
+        self.lock = threading.Lock()
+        self.state = {}              # writer: last published values per drive
+        self.seq = {}
+
+    # --- Writer ---
+    @classmethod
+    def create(cls, motor_keys, path=BOARD_PATH):
+        """
+        Publishing side. Reuses an existing board file in place so mapped readers stay valid.
+        """
+        keys = list(motor_keys)
+        if len(keys) > MAX_DRIVES:
+            raise ValueError(f"The status board holds at most {MAX_DRIVES} drives.")
+        mode = "r+b" if os.path.exists(path) and os.path.getsize(path) == BOARD_SIZE else "w+b"
+        with open(path, mode) as f:
+            if mode == "w+b":
+                f.truncate(BOARD_SIZE)
+            board = mmap.mmap(f.fileno(), BOARD_SIZE)
+        self = cls(board, writer=True)
+        # Mark the board as being rebuilt, lay out the slots, then publish the header
+        HEADER.pack_into(board, 0, b"\0\0\0\0", BOARD_VERSION, 0, 0, 0)
+        for index, key in enumerate(keys):
+            offset = _slot_offset(index)
+            seq = SEQ.unpack_from(board, offset)[0]
+            seq += seq & 1           # a slot left odd by a crashed writer
+            SEQ.pack_into(board, offset, seq + 1)
+            PAYLOAD.pack_into(board, offset + SEQ.size, key.encode()[:8], 0, 0, 0, 0, 0, 0, 0)
+            SEQ.pack_into(board, offset, seq + 2)
+            self.offsets[key] = offset
+            self.seq[key] = seq + 2
+            self.state[key] = {"encoder": 0, "cycle": 0, "status": 0, "inputs": 0, "alarm": 0, "valid": 0}
+        self.started_ns = time.time_ns()
+        HEADER.pack_into(board, 0, BOARD_MAGIC, BOARD_VERSION, len(keys), os.getpid(), self.started_ns)
+        return self
+
+    def publish(self, motor_key, encoder=None, status=None, inputs=None, alarm=None, cycle=None):
+        """
+        Updates the given fields of one drive; fields left at None keep their last value.
+        """
+        offset = self.offsets.get(motor_key)
+        if offset is None:
+            return
+        with self.lock:
+            s = self.state[motor_key]
+            if encoder is not None:
+                s["encoder"] = int(encoder)
+                s["valid"] |= VALID_ENCODER
+            if status is not None:
+                s["status"] = status & 0xFFFF
+                s["valid"] |= VALID_STATUS
+            if inputs is not None:
+                s["inputs"] = inputs & 0xFFFF
+                s["valid"] |= VALID_STATUS
+            if alarm is not None:
+                s["alarm"] = alarm & 0xFFFF
+                s["valid"] |= VALID_ALARM
+            if cycle is not None:
+                s["cycle"] = int(cycle)
+                s["valid"] |= VALID_CYCLE
+            seq = self.seq[motor_key]
+            SEQ.pack_into(self.board, offset, seq + 1)
+            PAYLOAD.pack_into(self.board, offset + SEQ.size, motor_key.encode()[:8], time.time_ns(),
+                              s["encoder"], s["cycle"], s["status"], s["inputs"], s["alarm"], s["valid"])
+            SEQ.pack_into(self.board, offset, seq + 2)
+            self.seq[motor_key] = seq + 2
+
+    def attach(self, controller, plan=None):
+        """
+        Publishes what the owner reads anyway: IO snapshots, encoder reads and, with a telemetry
+        plan that has an "alarm" item (AlarmMonitor), the alarm code.
+        """
+        controller.io_listeners.append(lambda key, snap: self.publish(key, status=snap.motion, inputs=snap.inputs))
+        controller.encoder_listeners.append(lambda key, steps: self.publish(key, encoder=steps))
+        if plan is not None and "alarm" in plan.items:
+            plan.subscribe("alarm", lambda key, values, time_ns:
+                           values is not None and self.publish(key, alarm=values[0]))
+
+    # --- Reader ---
+    @classmethod
+    def open(cls, path=BOARD_PATH):
+        """
+        Reading side. None if no board has been published yet.
+        """
+        try:
+            with open(path, "rb") as f:
+                board = mmap.mmap(f.fileno(), BOARD_SIZE, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        self = cls(board, writer=False)
+        self._load_layout()
+        return self
+
+    def _load_layout(self):
+        magic, version, drives, pid, started_ns = HEADER.unpack_from(self.board, 0)
+        if magic != BOARD_MAGIC or version != BOARD_VERSION:
+            self.offsets = {}
+            self.started_ns = None
+            return
+        offsets = {}
+        for index in range(min(drives, MAX_DRIVES)):
+            key = PAYLOAD.unpack_from(self.board, _slot_offset(index) + SEQ.size)[0]
+            offsets[key.rstrip(b"\0").decode()] = _slot_offset(index)
+        self.offsets = offsets
+        self.started_ns = started_ns
+
+    @property
+    def writer_pid(self):
+        return HEADER.unpack_from(self.board, 0)[3]
+
+    def read(self, motor_key):
+        """
+        Consistent DriveStatus of one drive; None if it is not on the board or the writer kept
+        the slot busy for READ_SPINS retries. Fields never published are None.
+        """
+        if not self.writer and HEADER.unpack_from(self.board, 0)[4] != self.started_ns:
+            self._load_layout()      # the writer restarted, possibly with other drives
+        offset = self.offsets.get(motor_key)
+        if offset is None:
+            return None
+        for _ in range(READ_SPINS):
+            seq = SEQ.unpack_from(self.board, offset)[0]
+            if seq & 1:
+                continue
+            payload = PAYLOAD.unpack_from(self.board, offset + SEQ.size)
+            if SEQ.unpack_from(self.board, offset)[0] == seq:
+                break
+        else:
+            return None
+        _, time_ns, encoder, cycle, status, inputs, alarm, valid = payload
+        if not valid:
+            return None
+        return DriveStatus(
+            motor_key, time_ns,
+            encoder if valid & VALID_ENCODER else None,
+            status if valid & VALID_STATUS else None,
+            inputs if valid & VALID_STATUS else None,
+            alarm if valid & VALID_ALARM else None,
+            cycle if valid & VALID_CYCLE else None,
+        )
+
+    def fresh(self, motor_key, max_age=STALE_AFTER):
+        """
+        Latest DriveStatus if a writer is running and updated it within max_age s, else None.
+        """
+        status = self.read(motor_key)
+        if status is None or not self.writer_pid or time.time_ns() - status.time_ns > max_age * 1e9:
+            return None
+        return status
+
+    def snapshot(self):
+        if not self.writer and HEADER.unpack_from(self.board, 0)[4] != self.started_ns:
+            self._load_layout()
+        return {key: self.read(key) for key in list(self.offsets)}
+
+    def close(self):
+        if self.writer:
+            # Readers see the board without a writer; the file stays for the next owner
+            struct.pack_into("<q", self.board, 8, 0)
+        self.board.close()
+
+
+# --- HTTP Bridge ---
+def board_json(board):
+    now = time.time_ns()
+    drives = {}
+    for key, status in board.snapshot().items():
+        if status is None:
+            drives[key] = None
+            continue
+        entry = status._asdict()
+        entry["age_s"] = (now - status.time_ns) / 1e9
+        entry["stale"] = entry["age_s"] > STALE_AFTER
+        drives[key] = entry
+    return {"writer_pid": board.writer_pid, "drives": drives}
+
+
+def serve(port=BRIDGE_PORT, host="127.0.0.1", path=BOARD_PATH):
+    """
+    Serves GET /status (all drives) and GET /status/<motor_key> as JSON for the web app.
+    """
+    class Handler(BaseHTTPRequestHandler):
+        board = None
+
+        def do_GET(self):
+            if Handler.board is None:
+                Handler.board = StatusBoard.open(path)
+            parts = self.path.strip("/").split("/")
+            if Handler.board is None or parts[0] != "status":
+                self.send_error(404 if Handler.board is not None else 503)
+                return
+            data = board_json(Handler.board)
+            if len(parts) > 1:
+                if parts[1] not in data["drives"]:
+                    self.send_error(404)
+                    return
+                data = data["drives"][parts[1]]
+            body = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    log.info("Status bridge on http://%s:%s/status", host, port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    if "--serve" in args:
+        rest = args[args.index("--serve") + 1:]
+        serve(int(rest[0]) if rest else BRIDGE_PORT)
+    else:
+        board = StatusBoard.open()
+        if board is None:
+            print(f"No status board at {BOARD_PATH}.")
+        else:
+            print(json.dumps(board_json(board), indent=2))
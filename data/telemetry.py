@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+"""
+Shared Telemetry Poll Plan
+--------------------------
+One schedule for every background register read on the bus, so monitors do not each add their
+own poll to the motion loop.
+
+Consumers register (register, count, period) items with a PollPlan and subscribe handlers to
+them. Items asking for the same register are merged and polled at the fastest requested rate.
+The plan never owns the bus: the runner calls service()/wait() in time it would otherwise spend
+sleeping (e.g. while waiting for a PR to finish), so polls only ever use idle bus time.
+
+AlarmMonitor is the first consumer: it watches REG_CURRENT_ALARM and REG_ALARM_STATUS of every
+drive at a low rate and publishes only transitions (alarms raised or cleared) to subscribers.
+
+IOEdgeDetector turns IO snapshots (ServoController.io_snapshot, and optionally a poll item of
+its own) into rising/falling events of named signals, delivered to callbacks or asyncio queues.
+
+Dependencies:
+    - driver (ServoController.read_registers)
+    - alarms
+"""
+
+import asyncio
+import time
+from collections import namedtuple
+
+from driver import *
+from alarms import decode_alarm, describe_alarm, NO_ALARMS
+from scheduler import sleep_until
+
+NS_PER_S = 1_000_000_000
+ALARM_PERIOD = 1.0           # s between alarm polls of one drive
+ALARM_STATUS = "Alarm status active"
+
+IO_PERIOD = 0.05             # s between IO polls when the detector polls on its own
+
+# signal: (word of the snapshot, bit, active when the bit is 0)
+IO_SIGNALS = {
+    "pot": ("inputs", IO_POT_BIT, True),
+    "not": ("inputs", IO_NOT_BIT, True),
+    "pr_done": ("motion", IO_PR_DONE_BIT, False),
+}
+
+AlarmEvent = namedtuple("AlarmEvent", "time_ns motor_key raised cleared value")
+IOEvent = namedtuple("IOEvent", "time_ns motor_key signal edge")
+
+
+class PollItem:
+    def __init__(self, name, reg, count, period_s, motor_keys):
+        self.name = name
+        self.reg = reg
+        self.count = count
+        self.period_ns = int(period_s * NS_PER_S)
+        self.motor_keys = list(motor_keys)
+        self.handlers = []
+        self.next_ns = 0
+        self.reads = 0
+        self.errors = 0
+        self.bus_ns = 0
+
+
+class PollPlan:
+    def __init__(self, controller):
+        self.controller = controller
+        self.items = {}
+        self.bus_ns = 0              # time spent in plan reads
+        self.started_ns = time.monotonic_ns()
+
+    def add(self, name, reg, count=1, period_s=1.0, motor_keys=None, handler=None):
+        """
+        Registers a poll item, or merges into an existing one with the same name.
+        handler(motor_key, values, time_ns) gets the register values (None on a failed read).
+        """
+        keys = motor_keys if motor_keys is not None else self.controller.motors.keys()
+        item = self.items.get(name)
+        if item is None:
+            item = PollItem(name, reg, count, period_s, keys)
+            self.items[name] = item
+        else:
+            if (item.reg, item.count) != (reg, count):
+                raise ValueError(f"Poll item {name!r} already reads 0x{item.reg:04X} x{item.count}.")
+            item.period_ns = min(item.period_ns, int(period_s * NS_PER_S))
+            item.motor_keys += [k for k in keys if k not in item.motor_keys]
+        if handler is not None:
+            item.handlers.append(handler)
+        return item
+
+    def subscribe(self, name, handler):
+        self.items[name].handlers.append(handler)
+
+    # --- Servicing ---
+    def _due(self, now_ns):
+        return sorted((i for i in self.items.values() if i.next_ns <= now_ns), key=lambda i: i.next_ns)
+
+    def service(self, deadline_ns=None):
+        """
+        Reads every due item once. Stops early when deadline_ns (monotonic) is reached.
+        Returns the number of reads done.
+        """
+        reads = 0
+        now = time.monotonic_ns()
+        for item in self._due(now):
+            for key in item.motor_keys:
+                if deadline_ns is not None and time.monotonic_ns() >= deadline_ns:
+                    return reads
+                t0 = time.monotonic_ns()
+                values = self.controller.read_registers(key, item.reg, item.count)
+                t1 = time.monotonic_ns()
+                self.bus_ns += t1 - t0
+                item.bus_ns += t1 - t0
+                reads += 1
+                item.reads += 1
+                if values is None:
+                    item.errors += 1
+                stamp = time.time_ns()
+                for handler in item.handlers:
+                    handler(key, values, stamp)
+            # Anchored to the previous slot so the rate does not drift with bus time
+            item.next_ns = max(item.next_ns + item.period_ns, now)
+        return reads
+
+    def wait(self, seconds):
+        """
+        Replacement for time.sleep(seconds) that polls due items in the meantime.
+        """
+        deadline = time.monotonic_ns() + int(seconds * NS_PER_S)
+        while True:
+            self.service(deadline)
+            now = time.monotonic_ns()
+            if now >= deadline:
+                return
+            upcoming = min((i.next_ns for i in self.items.values()), default=deadline)
+            sleep_until(min(max(upcoming, now), deadline))
+
+    def bus_fraction(self, names=None):
+        """
+        Share of wall time the plan (or only the named items) kept the bus busy.
+        """
+        elapsed = max(time.monotonic_ns() - self.started_ns, 1)
+        if names is None:
+            return self.bus_ns / elapsed
+        return sum(self.items[n].bus_ns for n in names if n in self.items) / elapsed
+
+    def stats(self):
+        return {
+            "items": {n: {"reads": i.reads, "errors": i.errors} for n, i in self.items.items()},
+            "bus_fraction": self.bus_fraction(),
+        }
+
+
+class AlarmMonitor:
+    """
+    Publishes alarm transitions of every drive: subscribers get AlarmEvent(time_ns, motor_key,
+    raised, cleared, value) only when the set of active alarms changes.
+    """
+
+    def __init__(self, plan, motor_keys=None, period_s=ALARM_PERIOD):
+        self.active = {}
+        self.subscribers = []
+        self.events = 0
+        plan.add("alarm", REG_CURRENT_ALARM, 1, period_s, motor_keys, self._on_alarm)
+        plan.add("alarm_status", REG_ALARM_STATUS, 1, period_s, motor_keys, self._on_status)
+        self._codes = {}
+        self._status = {}
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def alarms(self, motor_key):
+        return self.active.get(motor_key, NO_ALARMS)
+
+    def describe(self, motor_key):
+        return describe_alarm(self._codes.get(motor_key, 0))
+
+    def _on_alarm(self, motor_key, values, time_ns):
+        if values is None:
+            return
+        self._codes[motor_key] = values[0]
+        self._update(motor_key, time_ns)
+
+    def _on_status(self, motor_key, values, time_ns):
+        if values is None:
+            return
+        self._status[motor_key] = values[0]
+        self._update(motor_key, time_ns)
+
+    def _update(self, motor_key, time_ns):
+        current = decode_alarm(self._codes.get(motor_key, 0))
+        if self._status.get(motor_key, 0):
+            current = current | {ALARM_STATUS}
+        previous = self.active.get(motor_key, NO_ALARMS)
+        if current == previous:
+            return
+        self.active[motor_key] = current
+        event = AlarmEvent(time_ns, motor_key, current - previous, previous - current,
+                           self._codes.get(motor_key, 0))
+        self.events += 1
+        for callback in self.subscribers:
+            callback(event)
+
+
+class IOEdgeDetector:
+    """
+    Emits IOEvent(time_ns, motor_key, signal, edge) when a signal becomes active ("rising",
+    e.g. limit hit or PR done) or inactive ("falling"). Every snapshot the controller reads is
+    used, so check_pr() polls in a wait loop feed the detector without extra traffic; with a
+    plan the detector also polls 0x0B11-0x0B12 itself every period_s.
+    """
+
+    def __init__(self, controller, plan=None, motor_keys=None, period_s=IO_PERIOD, signals=None):
+        self.controller = controller
+        self.signals = signals or IO_SIGNALS
+        self.keys = set(motor_keys if motor_keys is not None else controller.motors.keys())
+        self.state = {}
+        self.subscribers = []
+        controller.io_listeners.append(self._on_snapshot)
+        if plan is not None:
+            plan.add("io", REG_IO_INPUTS, 2, period_s, list(self.keys), self._on_poll)
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+
+    def queue(self, loop=None):
+        """
+        asyncio.Queue receiving every event; safe to feed from the polling thread.
+        """
+        loop = loop or asyncio.get_event_loop()
+        q = asyncio.Queue()
+        self.subscribers.append(lambda event: loop.call_soon_threadsafe(q.put_nowait, event))
+        return q
+
+    def active(self, motor_key, signal):
+        return self.state.get((motor_key, signal), False)
+
+    def _on_poll(self, motor_key, values, time_ns):
+        if values is None:
+            return
+        snap = IOSnapshot(time.monotonic_ns(), values[0], values[1])
+        # Share the fresh read with check_pot/check_not/check_pr
+        self.controller.io_cache[motor_key] = snap
+        self._on_snapshot(motor_key, snap)
+
+    def _on_snapshot(self, motor_key, snap):
+        if motor_key not in self.keys:
+            return
+        stamp = time.time_ns()
+        for signal, (word, bit, active_low) in self.signals.items():
+            level = bool(getattr(snap, word) & bit) != active_low
+            key = (motor_key, signal)
+            previous = self.state.get(key)
+            self.state[key] = level
+            # The first snapshot only sets the baseline
+            if previous is None or previous == level:
+                continue
+            event = IOEvent(stamp, motor_key, signal, "rising" if level else "falling")
+            for callback in self.subscribers:
+                callback(event)
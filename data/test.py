@@ -4,12 +4,12 @@ import time
 from myCSV import *
 # Define your configuration parameters
 SERIAL_PORT ="COM17"    # Update with your actual serial port
-BAUDRATE =38400             # Update as needed
+BAUDRATE =BAUDRATE          # From Hardware.csv (baud_upgrade.py --write updates it)
 MOTOR_ADDRESSES = {
-    "right": 1,
-    "left": 2,
-    "lift": 3,
-    "drag": 4
+    "right": RIGHT_MOTOR,
+    "left": LEFT_MOTOR,
+    "lift": LIFT_MOTOR,
+    "drag": DRAG_MOTOR
 }
 
 # Create an instance of ServoController
@@ -0,0 +1,29 @@
+import numpy as np
+
+from drift import DriftAnalyzer, RunningFit
+
+
+def test_repeatability_at_real_position_offset():
+    # END_POS on the rig is about -7.68e8 steps; the statistics must not cancel there
+    rng = np.random.default_rng(1)
+    n = 5000
+    cycles = np.arange(1, n + 1)
+    noise = rng.normal(0.0, 2.0, n)
+    offset = DriftAnalyzer()
+    centred = DriftAnalyzer()
+    for start in range(0, n, 100):
+        block = slice(start, start + 100)
+        offset.add_many("out", cycles[block], np.full(100, -7.68e8), -7.68e8 + noise[block])
+        centred.add_many("out", cycles[block], np.zeros(100), noise[block])
+    assert abs(offset.repeatability("out") - centred.repeatability("out")) < 1e-6
+    assert 5.0 < offset.repeatability("out") < 7.0
+    assert offset.outliers["out"] == centred.outliers["out"] <= 2
+    assert not offset.check(n).degraded
+
+
+def test_running_fit_mean_and_slope_with_offset():
+    fit = RunningFit(forget=1.0)
+    x = np.arange(1000, dtype=np.float64)
+    fit.update(x, 7.68e8 + 0.5 * x)
+    assert abs(fit.mean() - (7.68e8 + 0.5 * x.mean())) < 1e-3
+    assert abs(fit.slope() - 0.5) < 1e-9
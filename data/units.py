@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Unit Conversion Engine
+----------------------
+Precomputed conversion factors between task units and drive units, built once per drive from
+PPR, gear ratio and wheel geometry, so planning a move costs a multiply and no bus reads.
+
+Position units follow the Prisma `Unit` enum (MM, CM, M, DEG, RAD) plus the inch/feet units
+accepted by the older wheelRatio(). Linear units are distance travelled by the wheel rim, angular
+units are rotation of the gearbox output shaft.
+
+Speed units follow the Prisma `SpeedUnit` enum and are converted to motor rpm, the unit of the
+PR velocity registers:
+    MS  metres per second at the wheel rim
+    DS  degrees per second at the gearbox output (the schema comment says per hour; the drive
+        cannot usefully run that slowly, so seconds are assumed)
+
+Scalar methods use plain floats; the *_array methods take whole NumPy arrays.
+
+Dependencies:
+    - numpy
+"""
+
+import math
+
+import numpy as np
+
+# Share of the arc length taken off an on-the-spot turn. Origin: the hard-coded 0.0655555555555556
+# that angle2Distance() subtracted ("Adjust with an offset if needed"); not a measured value.
+TURN_SLIP = 0.0655555555555556
+
+LINEAR_MM = {
+    "MM": 1.0,
+    "CM": 10.0,
+    "M": 1000.0,
+    "INCH": 25.4,
+    "FEET": 304.8,
+}
+ANGULAR_DEG = {
+    "DEG": 1.0,
+    "RAD": 180.0 / math.pi,
+}
+
+
+class UnitConverter:
+    def __init__(self, ppr, gear=1.0, wheel_dia=None):
+        """
+        ppr: encoder pulses per motor revolution
+        gear: motor revolutions per output revolution
+        wheel_dia: wheel diameter in mm, None for axes without a wheel (angular units only)
+        """
+        self.ppr = float(ppr)
+        self.gear = float(gear)
+        self.wheel_dia = wheel_dia
+        steps_per_output_rev = self.ppr * self.gear
+
+        self.steps_per_unit = {}
+        if wheel_dia:
+            circumference = math.pi * float(wheel_dia)
+            for unit, mm in LINEAR_MM.items():
+                self.steps_per_unit[unit] = steps_per_output_rev * mm / circumference
+        for unit, deg in ANGULAR_DEG.items():
+            self.steps_per_unit[unit] = steps_per_output_rev * deg / 360.0
+
+        # Motor rpm per unit of speed
+        self.rpm_per_speed_unit = {"DS": self.gear * 60.0 / 360.0}
+        if wheel_dia:
+            self.rpm_per_speed_unit["MS"] = self.gear * 60.0 * 1000.0 / (math.pi * float(wheel_dia))
+
+    # --- Lookup ---
+    def factor(self, unit):
+        try:
+            return self.steps_per_unit[unit.upper()]
+        except KeyError:
+            raise ValueError(f"Unsupported unit {unit!r}. Choose from {sorted(self.steps_per_unit)}.")
+
+    def speed_factor(self, speed_unit):
+        try:
+            return self.rpm_per_speed_unit[speed_unit.upper()]
+        except KeyError:
+            raise ValueError(f"Unsupported speed unit {speed_unit!r}. Choose from {sorted(self.rpm_per_speed_unit)}.")
+
+    # --- Scalar ---
+    def to_steps(self, value, unit):
+        """
+        Position in `unit` to drive steps (truncated towards zero, like the old toSteps()).
+        """
+        return int(value * self.factor(unit))
+
+    def from_steps(self, steps, unit):
+        return steps / self.factor(unit)
+
+    def speed_to_rpm(self, value, speed_unit):
+        return value * self.speed_factor(speed_unit)
+
+    def rpm_to_speed(self, rpm, speed_unit):
+        return rpm / self.speed_factor(speed_unit)
+
+    # --- Vectorised ---
+    def to_steps_array(self, values, unit):
+        return np.trunc(np.asarray(values, dtype=np.float64) * self.factor(unit)).astype(np.int64)
+
+    def from_steps_array(self, steps, unit):
+        return np.asarray(steps, dtype=np.float64) / self.factor(unit)
+
+    def speed_to_rpm_array(self, values, speed_unit):
+        return np.asarray(values, dtype=np.float64) * self.speed_factor(speed_unit)
+
+
+def turn_arc(angle_deg, radius, slip=TURN_SLIP):
+    """
+    Wheel travel (same unit as radius) for an on-the-spot turn of angle_deg, slip-compensated.
+    Works on scalars and NumPy arrays.
+    """
+    return angle_deg * (2.0 * math.pi * radius / 360.0) * (1.0 - slip)
+
+
+def build_converters(ppr, gears, wheel_dia):
+    """
+    One converter per drive: gears is a dict {motor_key: gear_ratio}.
+    """
+    return {key: UnitConverter(ppr, gear, wheel_dia) for key, gear in gears.items()}
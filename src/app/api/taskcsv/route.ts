@@ -12,7 +12,7 @@ const ensureFileExists = () => {
   }
 
   if (!fs.existsSync(csvFilePath)) {
-    const defaultContent = `Setting,Value\nJOINT,Part 1\nSPEED,0\nSTART_POS,0\nEND_POS,0\nR_STATUS,STOP\nC2COMPLETE,0\nCC_COMPLETE,0\nJogging,0\n`;
+    const defaultContent = `Setting,Value\nJOINT,Part 1\nSPEED,0\nSTART_POS,0\nEND_POS,0\nR_STATUS,STOP\nC2COMPLETE,0\nCC_COMPLETE,0\nJogging,0\nCYCLE_COUNT,0\nRUN_TIME,0\nREST_TIME,0\nTOTAL_RUN_TIME,0\n`;
     fs.writeFileSync(csvFilePath, defaultContent);
   }
 };
@@ -45,6 +45,10 @@ export async function POST(req: NextRequest) {
     csvContent += `C2COMPLETE,${task.totalCycle || '0'}\n`;
     csvContent += `CC_COMPLETE,${task.currentCycle || '0'}\n`;
     csvContent += `Jogging,${task.jogging || '0'}\n`;
+    csvContent += `CYCLE_COUNT,${task.cycleCount || '0'}\n`;
+    csvContent += `RUN_TIME,${task.runTime || '0'}\n`;
+    csvContent += `REST_TIME,${task.restTime || '0'}\n`;
+    csvContent += `TOTAL_RUN_TIME,${task.totalRunTime || '0'}\n`;
 
     await fs.promises.writeFile(csvFilePath, csvContent);
     status = action === 'running' ? 'RUNNING' : 'STOPPED';
@@ -18,6 +18,9 @@ interface Task {
   pos2?: string;
   totalCycle?: string;
   currentCycle?: string;
+  runTime?: string;
+  restTime?: string;
+  totalRunTime?: string;
 }
 
 function HomePage() {
@@ -134,6 +137,10 @@ function HomePage() {
           pos1: task.pos1 || "0",
           pos2: task.pos2 || "0",
           totalCycle: task.cycleCount || "0",
+          cycleCount: task.cycleCount || "0",
+          runTime: task.runTime || "0",
+          restTime: task.restTime || "0",
+          totalRunTime: task.totalRunTime || "0",
           currentCycle: "0",
           jogging: joggingClick || "0",
         },
@@ -157,6 +164,10 @@ function HomePage() {
           pos1: selectedTask?.pos1 || "0",
           pos2: selectedTask?.pos2 || "0",
           totalCycle: selectedTask?.cycleCount || "0",
+          cycleCount: selectedTask?.cycleCount || "0",
+          runTime: selectedTask?.runTime || "0",
+          restTime: selectedTask?.restTime || "0",
+          totalRunTime: selectedTask?.totalRunTime || "0",
           currentCycle: "0",
           jogging: joggingClick,
         },
@@ -180,6 +191,10 @@ function HomePage() {
           pos1: selectedTask?.pos1 || "0",
           pos2: selectedTask?.pos2 || "0",
           totalCycle: selectedTask?.cycleCount || "0",
+          cycleCount: selectedTask?.cycleCount || "0",
+          runTime: selectedTask?.runTime || "0",
+          restTime: selectedTask?.restTime || "0",
+          totalRunTime: selectedTask?.totalRunTime || "0",
           currentCycle: "0",
           jogging: joggingClick,
         },
@@ -205,6 +220,10 @@ function HomePage() {
         pos1: selectedTask?.pos1 || "0",
         pos2: selectedTask?.pos2 || "0",
         totalCycle: selectedTask?.cycleCount || "0",
+        cycleCount: selectedTask?.cycleCount || "0",
+        runTime: selectedTask?.runTime || "0",
+        restTime: selectedTask?.restTime || "0",
+        totalRunTime: selectedTask?.totalRunTime || "0",
         currentCycle: "0", // Use the current cycle value
         jogging: joggingClick,
       },
@@ -228,6 +247,10 @@ function HomePage() {
           pos1: selectedTask?.pos1 || "0",
           pos2: selectedTask?.pos2 || "0",
           totalCycle: selectedTask?.cycleCount || "0",
+          cycleCount: selectedTask?.cycleCount || "0",
+          runTime: selectedTask?.runTime || "0",
+          restTime: selectedTask?.restTime || "0",
+          totalRunTime: selectedTask?.totalRunTime || "0",
           currentCycle: "0",
           jogging: direction || "0",
         },